@@ -5,6 +5,8 @@ Author: Jie Xiao
 
 import pandas as pd
 from gurobipy import Model, GRB, quicksum
+import pesp_diagnosis
+import run_archive
 
 # ============================================================
 # 1. Read Data
@@ -236,8 +238,15 @@ for i, a in enumerate(activities):
 
 model.setObjective(quicksum(obj_terms), GRB.MINIMIZE)
 
+# Fast combinatorial feasibility check (cycle periodicity + negative cycles) before the MIP
+precheck = pesp_diagnosis.quick_check(events, activities, T, {fixed_event: 9})
+print(f"\nFeasibility pre-check: {precheck['status']} ({precheck['runtime'] * 1000:.1f} ms)")
+
 # Solve
-model.optimize()
+if precheck['status'] == 'infeasible':
+    pesp_diagnosis.print_conflict(precheck, activities)
+else:
+    model.optimize()
 
 # ============================================================
 # 5. Output Results (with the help of Calude)
@@ -247,6 +256,14 @@ if model.status == GRB.OPTIMAL:
     print("OPTIMAL TIMETABLE FOUND")
     print("=" * 60)
     print(f"Objective value (total dwell + transfer time): {model.objVal:.0f} minutes")
+
+    # Archive the run (later scripts compare against it instead of hard-coded results)
+    archive = run_archive.RunArchive()
+    run = archive.append("exercise_1.1e",
+                         run_archive.fingerprint({'T': T, 'events': events, 'activities': activities,
+                                                  'fixed': {fixed_event: 9}}),
+                         {e: int(round(pi[e].X)) % T for e in events},
+                         metrics={'objective': model.objVal, 'runtime': model.Runtime})
     
     # Output timetable by line and direction
     print("\n" + "-" * 60)
@@ -309,4 +326,6 @@ if model.status == GRB.OPTIMAL:
             print(f"           {times_str}")
 
 else:
-    print(f"No optimal solution found. Status: {model.status}")
\ No newline at end of file
+    print(f"No optimal solution found. Status: {model.status}")
+    if model.status in [GRB.INFEASIBLE, GRB.INF_OR_UNBD] or precheck['status'] == 'infeasible':
+        pesp_diagnosis.diagnose(model, x, activities)
\ No newline at end of file
@@ -5,6 +5,8 @@ Synchronization is relaxed using PESP framework with appropriate bounds.
 
 import pandas as pd
 from gurobipy import Model, GRB, quicksum
+import pesp_diagnosis
+import run_archive
 
 # ============================================================
 # 1. Read Data
@@ -256,8 +258,15 @@ for i, a in enumerate(activities):
 
 model.setObjective(quicksum(dwell_terms), GRB.MINIMIZE)
 
+# Fast combinatorial feasibility check (cycle periodicity + negative cycles) before the MIP
+precheck = pesp_diagnosis.quick_check(events, activities, T, {fixed_event: 9})
+print(f"\nFeasibility pre-check: {precheck['status']} ({precheck['runtime'] * 1000:.1f} ms)")
+
 # Solve
-model.optimize()
+if precheck['status'] == 'infeasible':
+    pesp_diagnosis.print_conflict(precheck, activities)
+else:
+    model.optimize()
 
 # ============================================================
 # 5. Output Results
@@ -271,6 +280,14 @@ if model.status == GRB.OPTIMAL:
     total_dwell = sum(x[i].X for i, a in enumerate(activities) if a['type'] == 'dwell')
     
     print(f"Objective value (total dwell time): {model.objVal:.0f} minutes")
+
+    # Archive the run (later scripts compare against it instead of hard-coded results)
+    archive = run_archive.RunArchive()
+    run = archive.append("exercise_1.2b",
+                         run_archive.fingerprint({'T': T, 'events': events, 'activities': activities,
+                                                  'fixed': {fixed_event: 9}}),
+                         {e: int(round(pi[e].X)) % T for e in events},
+                         metrics={'objective': model.objVal, 'runtime': model.Runtime})
     
     # Show relaxed sync intervals
     print("\nRelaxed Synchronization Intervals (6 trains/hour sections):")
@@ -350,9 +367,17 @@ if model.status == GRB.OPTIMAL:
     print("\n" + "=" * 60)
     print("COMPARISON WITH BASIC MODEL (1.1.e)")
     print("=" * 60)
-    print(f"Basic model objective (dwell + transfer): 60 minutes")
+    basic = archive.latest("exercise_1.1e")
+    if basic is None:
+        print("No archived run of the basic model (run Exercise_1.1e.py first)")
+    else:
+        print(f"Basic model objective (dwell + transfer): {archive.metrics(basic)['objective']:.0f} minutes")
     print(f"High-frequency model objective (dwell only): {model.objVal:.0f} minutes")
     print(f"Note: Transfer constraints are dropped in high-frequency model")
+    if basic is not None:
+        run_archive.print_diff(archive, archive.diff(basic, run))
 
 else:
-    print(f"No optimal solution found. Status: {model.status}")
\ No newline at end of file
+    print(f"No optimal solution found. Status: {model.status}")
+    if model.status in [GRB.INFEASIBLE, GRB.INF_OR_UNBD] or precheck['status'] == 'infeasible':
+        pesp_diagnosis.diagnose(model, x, activities)
\ No newline at end of file
@@ -0,0 +1,287 @@
+"""
+A2 Command Line: one entry point for timetabling, rolling stock, data validation and benchmarks
+pandas and gurobipy are only imported by the subcommands that solve (validate reads the xlsx
+files with openpyxl and checks instances combinatorially), and every command reports its
+startup, import and run time. The subcommands are importable functions returning dicts
+
+Usage:  a2 validate
+        a2 timetable --variant extended --method sat
+        a2 rolling-stock --model composition --symmetry aggregate --scale 10
+        a2 benchmark pesp --time-limit 30
+"""
+
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import importlib.util
+import os
+import sys
+
+DATA_FILES = ['a2_part1.xlsx', 'a2_part2.xlsx']
+
+
+# ============================================================
+# 1. Light Data Access (openpyxl only)
+# ============================================================
+def read_rows(path, sheet):
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        return [row for row in workbook[sheet].iter_rows(values_only=True)
+                if any(v is not None for v in row)]
+    finally:
+        workbook.close()
+
+
+def read_sheet_names(path):
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def data_path(data_dir, name):
+    return os.path.join(data_dir, name)
+
+
+# ============================================================
+# 2. Validate
+# ============================================================
+# Workbook structure, travel times and seat demand for every line, a combinatorial PESP
+# check per variant and a composition for every cross-section train
+def validate(data_dir='.'):
+    import pesp
+    import pesp_diagnosis
+    import rolling_stock as rs
+
+    problems = []
+    report = {'problems': problems, 'instances': {}}
+    missing = [f for f in DATA_FILES if not os.path.exists(data_path(data_dir, f))]
+    if missing:
+        problems += [f"Missing data file: {f}" for f in missing]
+        return report
+
+    part1, part2 = data_path(data_dir, DATA_FILES[0]), data_path(data_dir, DATA_FILES[1])
+    for path, sheets in [(part1, ['Stations', 'Travel Times']), (part2, ['Timetable', 'Seats'])]:
+        names = read_sheet_names(path)
+        problems += [f"{os.path.basename(path)}: missing sheet '{s}'" for s in sheets if s not in names]
+    if problems:
+        return report
+
+    stations = {row[0] for row in read_rows(part1, 'Stations')[1:]}
+    travel_time = {}
+    for a, b, minutes in (row[:3] for row in read_rows(part1, 'Travel Times')[1:]):
+        if not isinstance(minutes, (int, float)) or minutes <= 0:
+            problems.append(f"Travel time {a}-{b}: invalid value {minutes!r}")
+            continue
+        problems += [f"Travel time {a}-{b}: unknown station {s}" for s in (a, b) if s not in stations]
+        travel_time[(a, b)] = travel_time[(b, a)] = minutes
+
+    for variant, lines in [('basic', pesp.lines_basic), ('extended', pesp.lines_extended)]:
+        gaps = [(a, b) for stops in lines.values() for a, b in zip(stops, stops[1:]) if (a, b) not in travel_time]
+        if gaps:
+            problems += [f"{variant}: no travel time for section {a}-{b}" for a, b in gaps]
+            continue
+        instance = pesp.build_instance(variant, travel_time)
+        check = pesp_diagnosis.quick_check(instance['events'], instance['activities'],
+                                           instance['T'], instance['fixed'])
+        report['instances'][variant] = {'events': len(instance['events']),
+                                        'activities': len(instance['activities']),
+                                        'check': check['status']}
+        if check['status'] == 'infeasible':
+            problems.append(f"{variant}: infeasible ({check['reason']})")
+
+    seat_demand = {}
+    for row in read_rows(part2, 'Seats')[2:]:
+        line, south, north = row[:3]
+        seat_demand[(int(line), 'South')], seat_demand[(int(line), 'North')] = south, north
+    for key in rs.cross_section:
+        if not isinstance(seat_demand.get(key), (int, float)):
+            problems.append(f"Seats: no seat demand for line {key[0]} {key[1]}")
+    if not any(p.startswith("Seats") for p in problems):
+        trains, train_info = rs.create_trains(rs.cross_section, seat_demand)
+        empty = [t for t in trains if not rs.generate_compositions(train_info[t]['max_length'],
+                                                                   train_info[t]['seat_demand'])]
+        problems += [f"Train {t}: no composition meets seats and length" for t in empty]
+        report['trains'] = len(trains)
+
+    timetable_rows = read_rows(part2, 'Timetable')[1:]
+    bad = [row for row in timetable_rows if str(row[3]).strip() not in ('arr', 'dep')
+           or not isinstance(row[4], (int, float))]
+    problems += [f"Timetable: invalid row {row[:5]}" for row in bad]
+    report['timetable_rows'] = len(timetable_rows)
+    return report
+
+
+# ============================================================
+# 3. Timetable and Rolling Stock
+# ============================================================
+def timetable(variant='basic', method='mip', time_limit=None, data_dir='.', archive=None):
+    import pesp
+    instance = pesp.build_instance(variant, pesp.read_travel_times(data_path(data_dir, DATA_FILES[0])))
+    result = pesp.solve(instance, time_limit, method=method)
+    result.pop('model', None)
+    if archive is not None and result['times'] is not None:
+        import run_archive
+        store = run_archive.RunArchive(archive)
+        result['run'] = store.append(f"pesp_{variant}_{method}", run_archive.fingerprint(instance),
+                                     result['times'], metrics={'objective': result['objective'],
+                                                               'runtime': result['runtime']})
+    return instance, result
+
+
+def rolling_stock(model='composition', balance=1.25, symmetry=None, scale=1, time_limit=None,
+                  data_dir='.', archive=None):
+    import rolling_stock as rs
+    seat_demand = rs.read_seat_demand(data_path(data_dir, DATA_FILES[1]))
+    trains, train_info = rs.create_trains(rs.scale_cross_section(rs.cross_section, scale), seat_demand)
+    start = time.time()
+    if model == 'basic':
+        mip, N = rs.build_basic_model(trains, train_info, balance)
+    else:
+        mip, X, train_compositions = rs.build_composition_model(trains, train_info, balance, symmetry)
+    if time_limit is not None:
+        mip.setParam('TimeLimit', time_limit)
+    mip.optimize()
+    result = {'status': mip.status, 'trains': len(trains), 'cost': None, 'assignment': None}
+    if mip.SolCount > 0:
+        result['cost'] = mip.objVal
+        if model == 'basic':
+            result['assignment'] = {t: (int(round(N['PL3', t].X)), int(round(N['PL4', t].X))) for t in trains}
+        else:
+            result['assignment'] = rs.chosen_compositions(X, trains, train_compositions,
+                                                          getattr(mip, '_orbits', None))
+    result['runtime'] = time.time() - start
+    if archive is not None and result['assignment'] is not None:
+        import run_archive
+        result['run'] = run_archive.RunArchive(archive).append(
+            f"rolling_stock_{model}", run_archive.rolling_stock_fingerprint(train_info, balance),
+            assignment=result['assignment'],
+            metrics={'objective': result['cost'], 'runtime': result['runtime']})
+    return result
+
+
+# ============================================================
+# 4. Benchmark
+# ============================================================
+def benchmark(problem='pesp', time_limit=60, data_dir='.'):
+    rows = []
+    if problem == 'pesp':
+        methods = ['mip'] + (['sat'] if importlib.util.find_spec('pysat') is not None else [])
+        for variant in ['basic', 'extended']:
+            for method in methods:
+                _, result = timetable(variant, method, time_limit, data_dir)
+                rows.append({'case': f"{variant} / {method}", 'status': result['status'],
+                             'objective': result['objective'], 'runtime': result['runtime']})
+    else:
+        for scale in [1, 10]:
+            for symmetry in [None, 'lex', 'aggregate']:
+                result = rolling_stock('composition', symmetry=symmetry, scale=scale,
+                                       time_limit=time_limit, data_dir=data_dir)
+                rows.append({'case': f"x{scale} / {symmetry or 'none'}", 'status': result['status'],
+                             'objective': result['cost'], 'runtime': result['runtime']})
+    return rows
+
+
+# ============================================================
+# 5. Command Line
+# ============================================================
+def print_validation(report):
+    for variant, info in report['instances'].items():
+        print(f"PESP {variant:<9} {info['events']} events, {info['activities']} activities, "
+              f"quick check: {info['check']}")
+    if 'trains' in report:
+        print(f"Rolling stock: {report['trains']} cross-section trains")
+    if 'timetable_rows' in report:
+        print(f"Timetable sheet: {report['timetable_rows']} rows")
+    print(f"{len(report['problems'])} problem(s)")
+    for p in report['problems']:
+        print(f"  {p}")
+
+
+def parser():
+    # Shared options, accepted before or after the subcommand
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--data-dir', default=argparse.SUPPRESS,
+                        help="Directory with a2_part1.xlsx and a2_part2.xlsx")
+    common.add_argument('--time-limit', type=float, default=argparse.SUPPRESS)
+
+    parser = argparse.ArgumentParser(prog='a2', description="A2-corridor timetabling and rolling stock",
+                                     parents=[common])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('validate', parents=[common], help="Check the data files and instances without solving")
+
+    p = sub.add_parser('timetable', parents=[common], help="Solve the PESP timetable")
+    p.add_argument('--variant', choices=['basic', 'extended'], default='basic')
+    p.add_argument('--method', choices=['mip', 'sat'], default='mip')
+    p.add_argument('--archive', default=None, help="Run archive directory to record the result")
+
+    p = sub.add_parser('rolling-stock', parents=[common], help="Solve the rolling stock assignment")
+    p.add_argument('--model', choices=['basic', 'composition'], default='composition')
+    p.add_argument('--balance', type=float, default=1.25)
+    p.add_argument('--no-balance', action='store_true')
+    p.add_argument('--symmetry', choices=['lex', 'aggregate', 'orbital'], default=None)
+    p.add_argument('--scale', type=int, default=1)
+    p.add_argument('--archive', default=None, help="Run archive directory to record the result")
+
+    p = sub.add_parser('benchmark', parents=[common], help="Compare solve methods")
+    p.add_argument('problem', choices=['pesp', 'rolling-stock'])
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    args.data_dir = getattr(args, 'data_dir', '.')
+    args.time_limit = getattr(args, 'time_limit', None)
+    ready = time.perf_counter()
+    modules = set(sys.modules)
+    code = 0
+
+    if args.command == 'validate':
+        report = validate(args.data_dir)
+        print_validation(report)
+        code = 1 if report['problems'] else 0
+    elif args.command == 'timetable':
+        import pesp
+        instance, result = timetable(args.variant, args.method, args.time_limit, args.data_dir, args.archive)
+        print(f"Status {result['status']}, objective {result['objective']}, {result['runtime']:.3f} s"
+              + (f", archived as run {result['run']}" if 'run' in result else ""))
+        if result['times'] is not None:
+            pesp.print_timetable(instance, result['times'])
+        code = 0 if result['times'] is not None else 1
+    elif args.command == 'rolling-stock':
+        balance = None if args.no_balance else args.balance
+        result = rolling_stock(args.model, balance, args.symmetry, args.scale, args.time_limit,
+                               args.data_dir, args.archive)
+        if result['cost'] is None:
+            print(f"No assignment. Status: {result['status']}")
+            code = 1
+        else:
+            print(f"{result['trains']} trains, cost €{result['cost']:,.0f}, {result['runtime']:.3f} s"
+                  + (f", archived as run {result['run']}" if 'run' in result else ""))
+            counts = {}
+            for comp in result['assignment'].values():
+                counts[comp] = counts.get(comp, 0) + 1
+            for (n3, n4), n in sorted(counts.items()):
+                print(f"  {n3}xPL3 + {n4}xPL4: {n} trains")
+    elif args.command == 'benchmark':
+        problem = 'pesp' if args.problem == 'pesp' else 'rolling_stock'
+        rows = benchmark(problem, args.time_limit if args.time_limit is not None else 60, args.data_dir)
+        print(f"{'Case':<24} {'Status':>6} {'Objective':>14} {'Time (s)':>9}")
+        for r in rows:
+            objective = '-' if r['objective'] is None else f"{r['objective']:,.0f}"
+            print(f"{r['case']:<24} {r['status']:>6} {objective:>14} {r['runtime']:>9.3f}")
+
+    heavy = sorted(m for m in set(sys.modules) - modules if m in ('pandas', 'gurobipy', 'numpy', 'pysat'))
+    print(f"[startup {(ready - STARTED) * 1000:.0f} ms, command {time.perf_counter() - ready:.3f} s, "
+          f"heavy imports: {', '.join(heavy) or 'none'}]", file=sys.stderr)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""
+Rolling Stock Circulation: unit flow over a cyclic service day with depot balance
+Trips from the Timetable sheet are expanded over the day and linked in a time-expanded
+network per terminal; units of each type flow through it with coupling/uncoupling at terminals
+Seat demand can follow a time-of-day profile, so off-peak trips run shorter compositions
+"""
+
+import math
+import time
+from gurobipy import Model, GRB, quicksum
+import rolling_stock as rs
+
+DAY = 1440  # Minutes in the cyclic day
+
+# Time bands (start hour, end hour, share of the Seats sheet demand, which is the peak demand)
+DEMAND_PROFILE = [
+    (6, 7, 0.6),
+    (7, 9, 1.0),    # Morning peak
+    (9, 16, 0.5),
+    (16, 19, 1.0),  # Evening peak
+    (19, 24, 0.4)
+]
+
+
+# ============================================================
+# 1. Expand Periodic Trips over the Service Day
+# ============================================================
+# Band of a departure; a band's share is a factor or a dict per (line, direction)
+def band_of(dep, profile):
+    hour = (dep % DAY) / 60
+    for b, (start, end, _) in enumerate(profile):
+        if start <= hour < end:
+            return b
+    return None
+
+
+def band_demand(seat_demand, line, direction, dep, profile):
+    if profile is None:
+        return seat_demand[(line, direction)], None
+    b = band_of(dep, profile)
+    if b is None:
+        return seat_demand[(line, direction)], None
+    share = profile[b][2]
+    if isinstance(share, dict):
+        return share[(line, direction)], b
+    return math.ceil(share * seat_demand[(line, direction)]), b
+
+
+def expand_trips(first_dep, durations, seat_demand, start_hour=6, end_hour=24, profile=None):
+    trips = []
+    start, end = start_hour * 60, end_hour * 60
+    for (line, direction), route in rs.iter_routes():
+        if (line, direction) not in first_dep:
+            continue
+        dep = start + (first_dep[(line, direction)] - start) % rs.T
+        while dep < end:
+            demand, band = band_demand(seat_demand, line, direction, dep, profile)
+            trips.append({
+                'id': f"{line}_{direction}_{dep // 60:02d}{dep % 60:02d}",
+                'line': line,
+                'direction': direction,
+                'origin': route[0],
+                'destination': route[-1],
+                'dep': dep,
+                'arr': dep + durations[(line, direction)],
+                'seat_demand': demand,
+                'band': band,
+                'max_length': rs.max_length(line)
+            })
+            dep += rs.T
+    return trips
+
+
+# ============================================================
+# 2. Time-Expanded Network with Event Compression
+# ============================================================
+# Per terminal, a maximal block of arrivals followed by a block of departures becomes one
+# node: stock only has to be counted just before departures, so a station with n turns
+# gets at most n + 1 nodes instead of one node per event.
+def build_network(trips, turnaround=10):
+    events_at = {}
+    for k, trip in enumerate(trips):
+        ready = trip['arr'] + turnaround  # Unit is available again after turning
+        events_at.setdefault(trip['destination'], []).append((ready % DAY, 0, k))
+        events_at.setdefault(trip['origin'], []).append((trip['dep'] % DAY, 1, k))
+
+    nodes = []
+    dep_node = {}
+    arr_node = {}
+    inventory = []  # (from node, to node, crosses midnight)
+    for station in sorted(events_at):
+        station_events = sorted(events_at[station])
+        first = len(nodes)
+        current = None
+        last_kind = None
+        for t, kind, k in station_events:
+            if current is None or (kind == 0 and last_kind == 1):
+                current = len(nodes)
+                nodes.append({'station': station, 'time': t, 'arrivals': [], 'departures': []})
+            if kind == 0:
+                nodes[current]['arrivals'].append(k)
+                arr_node[k] = current
+            else:
+                nodes[current]['departures'].append(k)
+                dep_node[k] = current
+            last_kind = kind
+
+        # Inventory (parking) arcs; the last one wraps around midnight (depot balance)
+        for n in range(first, len(nodes) - 1):
+            inventory.append((n, n + 1, False))
+        inventory.append((len(nodes) - 1, first, True))
+
+    # Number of midnights each trip (including its turnaround) spans
+    crossings = {}
+    for k, trip in enumerate(trips):
+        crossings[k] = (trip['arr'] + turnaround) // DAY - trip['dep'] // DAY
+
+    return {
+        'nodes': nodes,
+        'dep_node': dep_node,
+        'arr_node': arr_node,
+        'inventory': inventory,
+        'crossings': crossings,
+        'turnaround': turnaround
+    }
+
+
+# Terminals where arrivals and departures over the day do not match
+def station_imbalance(trips):
+    balance = {}
+    for trip in trips:
+        balance[trip['destination']] = balance.get(trip['destination'], 0) + 1
+        balance[trip['origin']] = balance.get(trip['origin'], 0) - 1
+    return {s: b for s, b in balance.items() if b != 0}
+
+
+# ============================================================
+# 3. Multi-Commodity Unit Flow Model
+# ============================================================
+# Composition classes: trips with the same (max length, seat demand) share one list of
+# feasible compositions, generated once per class instead of once per trip
+def composition_classes(trips):
+    classes = {}
+    class_of = {}
+    for k, trip in enumerate(trips):
+        key = (trip['max_length'], trip['seat_demand'])
+        if key not in classes:
+            classes[key] = rs.generate_compositions(*key)
+        class_of[k] = key
+    return classes, class_of
+
+
+# night_penalty: cost per unit moved empty between terminals overnight (None = not allowed)
+# coupling_penalty: cost per unit coupled or uncoupled at a terminal node (trips run
+# terminal to terminal, so compositions only change there)
+# encoding: 'units' (integer units per trip) or 'compositions' (one composition per trip
+# from its class; N is then fixed by the choice)
+def build_circulation_model(trips, network, balance=1.25, coupling_penalty=0,
+                            night_penalty=1000, encoding='units'):
+    nodes = network['nodes']
+    model = Model("RollingStock_Circulation")
+    model.setParam('OutputFlag', 0)
+
+    # N[u,k] = number of units of type u on trip k
+    N = {}
+    vtype = GRB.INTEGER if encoding == 'units' else GRB.CONTINUOUS
+    for u in rs.U:
+        for k, trip in enumerate(trips):
+            N[u, k] = model.addVar(vtype=vtype, lb=0, name=f"N_{u}_{trip['id']}")
+
+    if encoding == 'compositions':
+        classes, class_of = composition_classes(trips)
+        X = {}
+        for k, trip in enumerate(trips):
+            options = classes[class_of[k]]
+            for c, comp in enumerate(options):
+                X[k, c] = model.addVar(vtype=GRB.BINARY, name=f"X_{trip['id']}_{comp['id']}")
+            model.addConstr(quicksum(X[k, c] for c in range(len(options))) == 1,
+                            name=f"choose_{trip['id']}")
+            for u in rs.U:
+                model.addConstr(N[u, k] == quicksum(comp[f"n_{u}"] * X[k, c]
+                                                    for c, comp in enumerate(options)),
+                                name=f"units_{u}_{trip['id']}")
+
+    # I[u,a] = units of type u parked on inventory arc a
+    I = {}
+    for u in rs.U:
+        for a in range(len(network['inventory'])):
+            I[u, a] = model.addVar(lb=0, name=f"I_{u}_{a}")
+
+    # Overnight empty moves between terminals (last node of one station to first of another)
+    night_arcs = []
+    if night_penalty is not None:
+        last_of = {}
+        first_of = {}
+        for n, node in enumerate(nodes):
+            first_of.setdefault(node['station'], n)
+            last_of[node['station']] = n
+        for s1 in last_of:
+            for s2 in first_of:
+                if s1 != s2:
+                    night_arcs.append((last_of[s1], first_of[s2]))
+    E = {}
+    for u in rs.U:
+        for a in range(len(night_arcs)):
+            E[u, a] = model.addVar(lb=0, name=f"E_{u}_{a}")
+
+    fleet = {u: model.addVar(lb=0, name=f"fleet_{u}") for u in rs.U}
+    model.update()
+
+    # Seat requirement and length limit per trip (built into the composition lists otherwise)
+    if encoding == 'units':
+        for k, trip in enumerate(trips):
+            model.addConstr(
+                quicksum(rs.capacity[u] * N[u, k] for u in rs.U) >= trip['seat_demand'],
+                name=f"seats_{trip['id']}"
+            )
+            model.addConstr(
+                quicksum(rs.length[u] * N[u, k] for u in rs.U) <= trip['max_length'],
+                name=f"length_{trip['id']}"
+            )
+
+    # Flow conservation per node and unit type
+    inflow = {n: [] for n in range(len(nodes))}
+    outflow = {n: [] for n in range(len(nodes))}
+    for a, (n_from, n_to, _) in enumerate(network['inventory']):
+        outflow[n_from].append(('I', a))
+        inflow[n_to].append(('I', a))
+    for a, (n_from, n_to) in enumerate(night_arcs):
+        outflow[n_from].append(('E', a))
+        inflow[n_to].append(('E', a))
+    flow = {'I': I, 'E': E}
+
+    coupling = {}
+    for n, node in enumerate(nodes):
+        for u in rs.U:
+            arriving = quicksum(N[u, k] for k in node['arrivals'])
+            departing = quicksum(N[u, k] for k in node['departures'])
+            model.addConstr(
+                arriving + quicksum(flow[kind][u, a] for kind, a in inflow[n]) ==
+                departing + quicksum(flow[kind][u, a] for kind, a in outflow[n]),
+                name=f"flow_{u}_{n}"
+            )
+            if coupling_penalty > 0 and node['arrivals'] and node['departures']:
+                coupling[u, n] = model.addVar(lb=0, name=f"couple_{u}_{n}")
+                model.addConstr(coupling[u, n] >= arriving - departing)
+                model.addConstr(coupling[u, n] >= departing - arriving)
+
+    # Fleet size = units crossing the midnight cut (parked, overnight moves or on a trip)
+    for u in rs.U:
+        model.addConstr(
+            fleet[u] ==
+            quicksum(I[u, a] for a, (_, _, wraps) in enumerate(network['inventory']) if wraps) +
+            quicksum(E[u, a] for a in range(len(night_arcs))) +
+            quicksum(network['crossings'][k] * N[u, k] for k in range(len(trips))
+                     if network['crossings'][k] > 0),
+            name=f"fleet_{u}"
+        )
+
+    if balance is not None:
+        model.addConstr(fleet['PL3'] <= balance * fleet['PL4'], name="balance_PL3")
+        model.addConstr(fleet['PL4'] <= balance * fleet['PL3'], name="balance_PL4")
+
+    model.setObjective(
+        quicksum(rs.cost[u] * fleet[u] for u in rs.U) +
+        coupling_penalty * quicksum(coupling.values()) +
+        (night_penalty or 0) * quicksum(E.values()),
+        GRB.MINIMIZE
+    )
+
+    return model, N, fleet, night_arcs
+
+
+# Units that stay on (turn around) at each terminal versus units coupled/uncoupled
+def turnaround_summary(trips, network, N):
+    summary = {}
+    for node in network['nodes']:
+        s = summary.setdefault(node['station'], {'turns': 0, 'coupled': 0, 'uncoupled': 0})
+        arriving = sum(N[u, k].X for u in rs.U for k in node['arrivals'])
+        departing = sum(N[u, k].X for u in rs.U for k in node['departures'])
+        s['turns'] += min(arriving, departing)
+        s['coupled'] += max(0, departing - arriving)
+        s['uncoupled'] += max(0, arriving - departing)
+    return summary
+
+
+# Average units and seats offered per time band against the band demand
+def band_summary(trips, N, profile):
+    summary = {}
+    for k, trip in enumerate(trips):
+        s = summary.setdefault(trip['band'], {'trips': 0, 'units': 0, 'seats': 0, 'demand': 0})
+        s['trips'] += 1
+        s['units'] += sum(N[u, k].X for u in rs.U)
+        s['seats'] += sum(rs.capacity[u] * N[u, k].X for u in rs.U)
+        s['demand'] += trip['seat_demand']
+    rows = []
+    for b, s in sorted(summary.items(), key=lambda z: -1 if z[0] is None else z[0]):
+        label = 'all day' if b is None else f"{profile[b][0]:02d}-{profile[b][1]:02d}h"
+        rows.append((label, s['trips'], s['units'] / s['trips'], s['seats'] / s['trips'],
+                     s['demand'] / s['trips']))
+    return rows
+
+
+def solve_circulation(trips, turnaround=10, balance=1.25, coupling_penalty=0, night_penalty=1000,
+                      encoding='units'):
+    start = time.time()
+    network = build_network(trips, turnaround)
+    build_time = time.time() - start
+    model, N, fleet, night_arcs = build_circulation_model(trips, network, balance,
+                                                          coupling_penalty, night_penalty, encoding)
+    model.optimize()
+    return {
+        'model': model,
+        'network': network,
+        'N': N,
+        'fleet': fleet,
+        'night_arcs': night_arcs,
+        'build_time': build_time,
+        'runtime': time.time() - start
+    }
+
+
+# ============================================================
+# 4. Run on the A2 Instance
+# ============================================================
+if __name__ == "__main__":
+    seat_demand = rs.read_seat_demand()
+    timetable_df = rs.read_timetable()
+    first_dep = rs.first_departures(timetable_df)
+
+    trips = expand_trips(first_dep, rs.durations, seat_demand)
+    print(f"Total trips over the day: {len(trips)}")
+    imbalance = station_imbalance(trips)
+    if imbalance:
+        print("Terminal imbalance (arrivals - departures):", imbalance)
+
+    result = solve_circulation(trips)
+    network = result['network']
+    print(f"Events: {2 * len(trips)}, compressed nodes: {len(network['nodes'])}")
+    print(f"Network build time: {result['build_time'] * 1000:.1f} ms")
+
+    model = result['model']
+    if model.status == GRB.OPTIMAL:
+        print("\n" + "=" * 70)
+        print("OPTIMAL CIRCULATION FOUND")
+        print("=" * 70)
+        print(f"Optimal annual cost: €{model.objVal:,.0f}")
+        print(f"Runtime: {result['runtime']:.4f} seconds")
+        for u in rs.U:
+            print(f"Fleet {u}: {result['fleet'][u].X:.0f} units")
+
+        print("\n" + "-" * 70)
+        print("TURNAROUNDS PER TERMINAL")
+        print("-" * 70)
+        print(f"{'Station':<10} {'Turns':<10} {'Coupled':<10} {'Uncoupled':<10}")
+        summary = turnaround_summary(trips, network, result['N'])
+        for station, s in sorted(summary.items()):
+            print(f"{station:<10} {s['turns']:<10.0f} {s['coupled']:<10.0f} {s['uncoupled']:<10.0f}")
+    else:
+        print(f"No optimal solution found. Status: {model.status}")
+
+    # Time-of-day demand: peak compositions only in the peak bands, coupling penalized
+    print("\n" + "=" * 70)
+    print("TIME-OF-DAY DEMAND PROFILE")
+    print("=" * 70)
+    print(f"{'Encoding':<14} {'Cost':<18} {'PL3':<6} {'PL4':<6} {'Runtime (s)':<12}")
+    profile_trips = expand_trips(first_dep, rs.durations, seat_demand, profile=DEMAND_PROFILE)
+    solved = {}
+    for encoding in ['units', 'compositions']:
+        result = solve_circulation(profile_trips, coupling_penalty=5000, encoding=encoding)
+        model = result['model']
+        if model.SolCount == 0:
+            print(f"{encoding:<14} no solution (status {model.status})")
+            continue
+        solved[encoding] = result
+        fleet = result['fleet']
+        print(f"{encoding:<14} €{model.objVal:<17,.0f} {fleet['PL3'].X:<6.0f} {fleet['PL4'].X:<6.0f} "
+              f"{result['runtime']:<12.4f}")
+
+    # Band table of the units encoding (the compositions encoding if only that one solved)
+    encoding = next((e for e in ['units', 'compositions'] if e in solved), None)
+    if encoding is None:
+        print("\nNo band summary: no encoding found a solution")
+    else:
+        print(f"\n{'Band':<10} {'Trips':<8} {'Units/trip':<12} {'Seats/trip':<12} {'Demand/trip':<12}  ({encoding})")
+        for label, n, units, seats, demand in band_summary(profile_trips, solved[encoding]['N'], DEMAND_PROFILE):
+            print(f"{label:<10} {n:<8} {units:<12.2f} {seats:<12.0f} {demand:<12.0f}")
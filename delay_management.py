@@ -0,0 +1,292 @@
+"""
+Delay Management: propagate source delays through the event-activity network of a planned
+timetable and decide which transfers wait, within a latency budget
+The periodic timetable is unrolled over a few periods into an aperiodic network once (with a
+topological order by planned time); each disruption is then a single pass over that order
+(wait/no-wait heuristic), optionally improved by a small MIP on the affected events only
+"""
+
+import heapq
+import time
+from gurobipy import Model, GRB, quicksum
+import pesp
+
+# Activities that always hold in operations (minimum duration = lower bound l);
+# transfers are the wait/no-wait decisions, sync activities only matter for planning
+OPERATIONAL = ['driving', 'dwell', 'headway', 'platform']
+
+
+# ============================================================
+# 1. Aperiodic Network (precomputed once per timetable)
+# ============================================================
+# Event (e, k) = periodic event e in period k, planned at times[e] + k*T; an activity instance
+# from (e, k) ends at the period its planned duration reaches
+def build_network(instance, times, n_periods=8):
+    T = instance['T']
+    durations = pesp.activity_durations(instance, times)
+    events = [(e, k) for k in range(n_periods) for e in instance['events']]
+    index = {ev: i for i, ev in enumerate(events)}
+    planned = [times[e] + k * T for e, k in events]
+
+    activities = []
+
+    def add(kind, e_from, e_to, k, duration, minimum):
+        t_to = times[e_from] + k * T + duration
+        k_to = (t_to - times[e_to]) // T
+        if 0 <= k_to < n_periods:
+            activities.append({'type': kind, 'from': index[(e_from, k)], 'to': index[(e_to, k_to)],
+                               'min': min(minimum, duration), 'planned': duration})
+
+    for a, d in zip(instance['activities'], durations):
+        if a['type'] not in OPERATIONAL and a['type'] != 'transfer':
+            continue
+        for k in range(n_periods):
+            add(a['type'], a['from'], a['to'], k, d, a['l'])
+            if a['type'] == 'headway':  # Fixed order: the next train of the other line follows too
+                add(a['type'], a['to'], a['from'], k, T - d, a['l'])
+
+    out = [[] for _ in events]
+    incoming = [0] * len(events)
+    for j, a in enumerate(activities):
+        out[a['from']].append(j)
+        incoming[a['to']] += 1
+
+    # Topological order (Kahn, ties by planned time)
+    heap = [(planned[i], i) for i in range(len(events)) if incoming[i] == 0]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        _, i = heapq.heappop(heap)
+        order.append(i)
+        for j in out[i]:
+            v = activities[j]['to']
+            incoming[v] -= 1
+            if incoming[v] == 0:
+                heapq.heappush(heap, (planned[v], v))
+
+    # Arrivals further along the same train (driving/dwell chain), the cost weight of holding it
+    is_arr = [e[3] == 'arr' for e, _ in events]
+    downstream = [0] * len(events)
+    for i in reversed(order):
+        for j in out[i]:
+            a = activities[j]
+            if a['type'] in ['driving', 'dwell']:
+                downstream[i] += is_arr[a['to']] + downstream[a['to']]
+
+    return {
+        'T': T,
+        'events': events,
+        'index': index,
+        'planned': planned,
+        'activities': activities,
+        'out': out,
+        'order': order,
+        'cyclic': len(order) < len(events),
+        'is_arr': is_arr,
+        'downstream': downstream,
+        'transfers': [j for j, a in enumerate(activities) if a['type'] == 'transfer']
+    }
+
+
+# Delays given per periodic event (period 0) or per (event, period)
+def source_delays(network, delays):
+    source = [0] * len(network['events'])
+    for key, minutes in delays.items():
+        ev = key if len(key) == 2 and isinstance(key[0], tuple) else (key, 0)
+        source[network['index'][ev]] += minutes
+    return source
+
+
+# ============================================================
+# 2. Propagation and Cost
+# ============================================================
+def propagate(network, source, wait):
+    actual = [t + d for t, d in zip(network['planned'], source)]
+    activities = network['activities']
+    for i in network['order']:
+        for j in network['out'][i]:
+            a = activities[j]
+            if a['type'] == 'transfer' and not wait[j]:
+                continue
+            ready = actual[i] + a['min']
+            if ready > actual[a['to']]:
+                actual[a['to']] = ready
+    return actual
+
+
+# Missed transfer: the passengers wait one period for the next train
+def missed_transfers(network, actual):
+    missed = []
+    for j in network['transfers']:
+        a = network['activities'][j]
+        if actual[a['to']] - actual[a['from']] < a['min']:
+            missed.append(j)
+    return missed
+
+
+def total_cost(network, actual, arrival_weight=1, transfer_weight=10):
+    delay = sum(t - p for t, p, arr in zip(actual, network['planned'], network['is_arr']) if arr)
+    missed = missed_transfers(network, actual)
+    return arrival_weight * delay + transfer_weight * network['T'] * len(missed), delay, missed
+
+
+# ============================================================
+# 3. Wait/No-Wait Heuristic (one pass over the topological order)
+# ============================================================
+# rule: 'no_wait', 'always_wait' or 'greedy' (wait when the extra delay on the connecting
+# train and its later arrivals costs less than the missed transfer, and at most max_wait minutes)
+def decide_waits(network, source, rule='greedy', max_wait=5, arrival_weight=1, transfer_weight=10):
+    activities = network['activities']
+    actual = [t + d for t, d in zip(network['planned'], source)]
+    pending = [[] for _ in actual]
+    wait = [False] * len(activities)
+
+    for i in network['order']:
+        for j, ready in sorted(pending[i], key=lambda z: z[1]):
+            extra = ready - actual[i]
+            if extra <= 0:
+                continue  # Connection holds without waiting
+            if rule == 'always_wait':
+                hold = True
+            elif rule == 'no_wait':
+                hold = False
+            else:
+                cost = arrival_weight * extra * (network['is_arr'][i] + network['downstream'][i])
+                hold = extra <= max_wait and cost <= transfer_weight * network['T']
+            if hold:
+                wait[j] = True
+                actual[i] = ready
+        for j in network['out'][i]:
+            a = activities[j]
+            ready = actual[i] + a['min']
+            if a['type'] == 'transfer':
+                pending[a['to']].append((j, ready))
+            elif ready > actual[a['to']]:
+                actual[a['to']] = ready
+    return wait, actual
+
+
+# ============================================================
+# 4. Delay Management MIP on the Affected Events
+# ============================================================
+# Only events reachable from a source delay can change; the rest stay at their planned times
+def affected_events(network, source):
+    seen = {i for i, d in enumerate(source) if d > 0}
+    stack = list(seen)
+    while stack:
+        i = stack.pop()
+        for j in network['out'][i]:
+            v = network['activities'][j]['to']
+            if v not in seen:
+                seen.add(v)
+                stack.append(v)
+    return seen
+
+
+def solve_mip(network, source, start_wait, time_limit, arrival_weight=1, transfer_weight=10):
+    activities = network['activities']
+    planned = network['planned']
+    affected = affected_events(network, source)
+    big_m = max(source) + 1
+
+    model = Model("Delay_Management")
+    model.setParam('OutputFlag', 0)
+    model.setParam('TimeLimit', max(time_limit, 0.01))
+    t = {}
+    for i in affected:
+        t[i] = model.addVar(lb=planned[i] + source[i], ub=planned[i] + big_m, name=f"t_{i}")
+
+    def time_of(i):
+        return t[i] if i in t else planned[i]
+
+    drop = {}
+    for j, a in enumerate(activities):
+        if a['to'] not in affected:
+            continue
+        if a['type'] == 'transfer':
+            drop[j] = model.addVar(vtype=GRB.BINARY, name=f"drop_{j}")
+            drop[j].Start = 0 if start_wait[j] else 1
+            model.addConstr(time_of(a['to']) - time_of(a['from']) + big_m * drop[j] >= a['min'],
+                            name=f"transfer_{j}")
+        else:
+            model.addConstr(time_of(a['to']) - time_of(a['from']) >= a['min'], name=f"activity_{j}")
+
+    model.setObjective(
+        arrival_weight * quicksum(t[i] - planned[i] for i in affected if network['is_arr'][i])
+        + transfer_weight * network['T'] * quicksum(drop.values()),
+        GRB.MINIMIZE
+    )
+    model.optimize()
+    if model.SolCount == 0:
+        return None, model.status
+
+    wait = list(start_wait)
+    for j, var in drop.items():
+        wait[j] = var.X < 0.5
+    return wait, model.status
+
+
+# ============================================================
+# 5. Disruption Response within a Latency Budget
+# ============================================================
+def manage(network, delays, budget=0.5, use_mip=True, rule='greedy', max_wait=5,
+           arrival_weight=1, transfer_weight=10):
+    start = time.time()
+    source = source_delays(network, delays)
+    wait, _ = decide_waits(network, source, rule, max_wait, arrival_weight, transfer_weight)
+    actual = propagate(network, source, wait)
+    cost, delay, missed = total_cost(network, actual, arrival_weight, transfer_weight)
+    result = {'method': rule, 'wait': wait, 'actual': actual, 'cost': cost, 'delay': delay,
+              'missed': missed, 'heuristic_time': time.time() - start}
+
+    remaining = budget - (time.time() - start)
+    if use_mip and network['transfers'] and remaining > 0:
+        mip_wait, status = solve_mip(network, source, wait, remaining, arrival_weight, transfer_weight)
+        result['mip_status'] = status
+        if mip_wait is not None:
+            mip_actual = propagate(network, source, mip_wait)
+            mip_cost, mip_delay, mip_missed = total_cost(network, mip_actual, arrival_weight,
+                                                         transfer_weight)
+            if mip_cost < cost:
+                result.update({'method': 'mip', 'wait': mip_wait, 'actual': mip_actual,
+                               'cost': mip_cost, 'delay': mip_delay, 'missed': mip_missed})
+    result['runtime'] = time.time() - start
+    result['within_budget'] = result['runtime'] <= budget
+    return result
+
+
+def print_decisions(network, result):
+    events = network['events']
+    print(f"Method: {result['method']}, cost: {result['cost']}, arrival delay: {result['delay']} min, "
+          f"missed transfers: {len(result['missed'])}, runtime: {result['runtime'] * 1000:.1f} ms")
+    for j in network['transfers']:
+        a = network['activities'][j]
+        (feeder, k1), (connection, k2) = events[a['from']], events[a['to']]
+        hold = result['actual'][a['to']] - network['planned'][a['to']]
+        if result['actual'][a['from']] > network['planned'][a['from']]:
+            decision = 'missed' if j in result['missed'] else ('wait' if result['wait'][j] else 'holds')
+            print(f"  {feeder} [{k1}] -> {connection} [{k2}]: {decision} (connection +{hold} min)")
+    delayed = [(network['planned'][i], i) for i in range(len(events))
+               if result['actual'][i] > network['planned'][i] and network['is_arr'][i]]
+    for planned, i in sorted(delayed):
+        print(f"  {events[i][0]} [{events[i][1]}]: +{result['actual'][i] - planned} min")
+
+
+# ============================================================
+# 6. Run on the A2 Instance
+# ============================================================
+if __name__ == "__main__":
+    instance = pesp.build_instance('basic')
+    plan = pesp.solve(instance)
+    if plan['times'] is None:
+        print(f"No planned timetable. Status: {plan['status']}")
+    else:
+        network = build_network(instance, plan['times'])
+        print(f"Network: {len(network['events'])} events, {len(network['activities'])} activities, "
+              f"{len(network['transfers'])} transfers")
+        delays = {((3500, 'South', 'Shl', 'dep'), 1): 7}
+        for rule in ['no_wait', 'always_wait', 'greedy']:
+            print("\n" + "=" * 60)
+            print(f"DELAY MANAGEMENT: 3500 +7 min at Shl ({rule})")
+            print("=" * 60)
+            print_decisions(network, manage(network, delays, rule=rule, use_mip=(rule == 'greedy')))
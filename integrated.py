@@ -0,0 +1,171 @@
+"""
+Integrated Timetabling and Rolling Stock: iterative feedback between PESP and composition model
+Each iteration derives trip durations and cross-section trains from pi, re-solves the rolling
+stock model, and prices the trains in circulation back into the PESP objective
+"""
+
+import time
+from gurobipy import GRB, quicksum
+import pesp
+import rolling_stock as rs
+
+
+# ============================================================
+# 1. From Timetable to Cross-Section Trains
+# ============================================================
+# Driving and dwell activities along each line/direction, in route order
+def line_chains(instance):
+    chains = {}
+    for i, a in enumerate(instance['activities']):
+        if a['type'] in ['driving', 'dwell']:
+            line, direction = a['from'][0], a['from'][1]
+            chains.setdefault((line, direction), []).append(i)
+    return chains
+
+
+def trip_durations(instance, times, chains=None):
+    chains = chains or line_chains(instance)
+    x = pesp.activity_durations(instance, times)
+    return {key: sum(x[i] for i in chain) for key, chain in chains.items()}
+
+
+# Trains of a line/direction in progress at the cross-section moment t0 (mod T).
+# Equals the number of period wraps (sum of p) along the route, as used in the PESP model.
+def cross_section_from_times(instance, times, t0=0, chains=None):
+    T = instance['T']
+    durations = trip_durations(instance, times, chains)
+    cross_section = {}
+    for line in instance['lines']:
+        for direction in pesp.DIRECTIONS:
+            route = pesp.route_of(instance['lines'], line, direction)
+            d = times[(line, direction, route[0], 'dep')]
+            D = durations[(line, direction)]
+            cross_section[(line, direction)] = (t0 - d) // T - (t0 - d - D) // T
+    return cross_section
+
+
+# ============================================================
+# 2. Incremental Rolling Stock Stage
+# ============================================================
+# Aggregated composition model built once (one integer per class and composition); a new
+# cross-section only changes the RHS of the class constraints and the variable bounds
+def build_rolling_stock_stage(seat_demand, lines, balance=1.25):
+    one_each = {(line, direction): 1 for line in lines for direction in pesp.DIRECTIONS}
+    trains, train_info = rs.create_trains(one_each, seat_demand)
+    model, X, train_compositions = rs.build_composition_model(trains, train_info, balance,
+                                                              symmetry='aggregate')
+    model.update()
+    members = {}
+    for rep, cls in model._orbits.items():
+        members[rep] = [(train_info[t]['line'], train_info[t]['direction']) for t in cls]
+    return {
+        'model': model,
+        'X': X,
+        'compositions': train_compositions,
+        'members': members,
+        'constraints': {rep: model.getConstrByName(f"one_comp_{rep}") for rep in members}
+    }
+
+
+def solve_rolling_stock_stage(stage, cross_section):
+    size = {}
+    for rep, keys in stage['members'].items():
+        size[rep] = sum(cross_section[key] for key in keys)
+        stage['constraints'][rep].RHS = size[rep]
+        for p in stage['compositions'][rep]:
+            stage['X'][rep, p['id']].UB = size[rep]
+    stage['model'].optimize()
+
+    # Cost per train of every line/direction (class average, or cheapest composition if unused)
+    train_cost = {}
+    for rep, keys in stage['members'].items():
+        comps = stage['compositions'][rep]
+        if stage['model'].status == GRB.OPTIMAL and size[rep] > 0:
+            per_train = sum(p['cost'] * stage['X'][rep, p['id']].X for p in comps) / size[rep]
+        else:
+            per_train = min(p['cost'] for p in comps)
+        for key in keys:
+            train_cost[key] = per_train
+    return stage['model'].status, train_cost
+
+
+# ============================================================
+# 3. Feedback Loop
+# ============================================================
+# euro_per_minute: annual value of one minute of dwell/transfer time per period, which
+# sets the exchange rate between timetable minutes and rolling stock cost
+def solve_integrated(instance, seat_demand, euro_per_minute=20000, max_iter=10, balance=1.25):
+    start = time.time()
+    model, pi, x, p = pesp.build_model(instance, name="PESP_Integrated")
+    chains = line_chains(instance)
+    stage = build_rolling_stock_stage(seat_demand, instance['lines'], balance)
+
+    base = quicksum(x[i] for i, a in enumerate(instance['activities'])
+                    if a['type'] in instance['objective'])
+    trains_in_circulation = {key: quicksum(p[i] for i in chain) for key, chain in chains.items()}
+    weights = {key: 0 for key in chains}
+
+    history = []
+    best = None
+    previous_cs = None
+    for iteration in range(max_iter):
+        # Timetable stage with the current price per train in circulation (warm started)
+        model.setObjective(base + quicksum(weights[key] * trains_in_circulation[key] for key in chains),
+                           GRB.MINIMIZE)
+        model.optimize()
+        if model.SolCount == 0:
+            break
+        times = pesp.event_times(pi, instance['T'])
+        for var in list(pi.values()) + list(p.values()):
+            var.Start = var.X
+
+        # Rolling stock stage on the cross-section implied by this timetable
+        cross_section = cross_section_from_times(instance, times, chains=chains)
+        status, train_cost = solve_rolling_stock_stage(stage, cross_section)
+        if status != GRB.OPTIMAL:
+            break
+
+        minutes = pesp.objective_value(instance, times)
+        fleet_cost = stage['model'].objVal
+        combined = euro_per_minute * minutes + fleet_cost
+        history.append({
+            'iteration': iteration,
+            'minutes': minutes,
+            'cross_section': sum(cross_section.values()),
+            'fleet_cost': fleet_cost,
+            'combined': combined,
+            'runtime': time.time() - start
+        })
+        if best is None or combined < best['combined']:
+            best = {'combined': combined, 'minutes': minutes, 'fleet_cost': fleet_cost,
+                    'times': times, 'cross_section': cross_section}
+
+        if cross_section == previous_cs:
+            break
+        previous_cs = cross_section
+        weights = {key: train_cost[key] / euro_per_minute for key in chains}
+
+    return {'best': best, 'history': history, 'runtime': time.time() - start}
+
+
+# ============================================================
+# 4. Run on the A2 Instance
+# ============================================================
+if __name__ == "__main__":
+    instance = pesp.build_instance('basic')
+    seat_demand = rs.read_seat_demand()
+    result = solve_integrated(instance, seat_demand)
+
+    print("\n" + "=" * 70)
+    print("INTEGRATED TIMETABLING AND ROLLING STOCK")
+    print("=" * 70)
+    print(f"{'Iter':<6} {'Minutes':<10} {'Trains':<8} {'Fleet cost':<16} {'Combined':<16} {'Time (s)':<10}")
+    print("-" * 70)
+    for h in result['history']:
+        print(f"{h['iteration']:<6} {h['minutes']:<10} {h['cross_section']:<8} "
+              f"€{h['fleet_cost']:<15,.0f} €{h['combined']:<15,.0f} {h['runtime']:<10.3f}")
+
+    best = result['best']
+    if best is not None:
+        print(f"\nBest: {best['minutes']} minutes dwell/transfer, fleet cost €{best['fleet_cost']:,.0f}")
+        pesp.print_timetable(instance, best['times'])
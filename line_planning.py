@@ -0,0 +1,339 @@
+"""
+Line Planning: choose lines (paths in the station graph) and frequencies that carry the seat
+demand on every track section at minimum rolling-stock cost, by column generation
+The master LP only holds generated line/frequency columns; new lines are priced with the
+section duals by a labelling search over simple paths, pruned on reduced cost and dominance.
+The integer plan (price-and-branch) is returned as a `lines` dict with sync sections for
+pesp.build_instance('generic')
+"""
+
+import heapq
+import math
+import time
+from gurobipy import Model, GRB, quicksum
+import pesp
+import rolling_stock as rs
+
+FREQUENCIES = [1, 2]                    # Trains per period (T = 30: every 30 / 15 minutes)
+TRAIN = {'seats': 1200, 'cost': 770000}  # Standard train: 2 x PL4 (annual cost per train set)
+TURNAROUND = 10                         # Minutes at each terminal
+DWELL = 2                               # Minutes per intermediate stop
+
+
+# ============================================================
+# 1. Station Graph and Section Demand
+# ============================================================
+def station_graph(travel_time):
+    graph = {}
+    for (a, b), minutes in travel_time.items():
+        graph.setdefault(a, {})[b] = minutes
+    return graph
+
+
+def section(a, b):
+    return (a, b) if a < b else (b, a)
+
+
+# Seats per period on each section (both directions, the larger one counts): each current
+# line runs one train per period sized for its seat demand
+def section_demand_from_lines(lines, seat_demand):
+    load = {}
+    for line in lines:
+        for direction in pesp.DIRECTIONS:
+            route = pesp.route_of(lines, line, direction)
+            for a, b in zip(route, route[1:]):
+                load[(a, b)] = load.get((a, b), 0) + seat_demand[(line, direction)]
+    demand = {}
+    for (a, b), seats in load.items():
+        demand[section(a, b)] = max(demand.get(section(a, b), 0), seats)
+    return demand
+
+
+# OD matrix (seats per period between station pairs) routed along fastest paths
+def section_demand_from_od(graph, od):
+    demand = {}
+    for (origin, destination), seats in od.items():
+        dist, pred = {origin: 0}, {}
+        heap = [(0, origin)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            for w, minutes in graph[v].items():
+                if d + minutes < dist.get(w, math.inf):
+                    dist[w] = d + minutes
+                    pred[w] = v
+                    heapq.heappush(heap, (d + minutes, w))
+        v = destination
+        while v != origin:
+            key = section(pred[v], v)
+            demand[key] = demand.get(key, 0) + seats
+            v = pred[v]
+    return demand
+
+
+# ============================================================
+# 2. Line Columns
+# ============================================================
+# Cost of a line at frequency f: train sets needed for one circulation (both directions plus
+# turnarounds) at f trains per period
+def line_minutes(path, graph):
+    running = sum(graph[a][b] for a, b in zip(path, path[1:]))
+    return running + DWELL * (len(path) - 2)
+
+
+def line_cost(path, graph, f, T=pesp.T):
+    return cost_for_minutes(line_minutes(path, graph), f, T)
+
+
+def cost_for_minutes(minutes, f, T=pesp.T):
+    return math.ceil(f * (2 * minutes + 2 * TURNAROUND) / T) * TRAIN['cost']
+
+
+def make_column(path, graph, f):
+    if path[0] > path[-1]:
+        path = path[::-1]
+    return {'path': list(path), 'f': f, 'cost': line_cost(path, graph, f),
+            'sections': [section(a, b) for a, b in zip(path, path[1:])]}
+
+
+def initial_columns(graph, lines):
+    columns = []
+    paths = [list(stops) for stops in lines.values()]
+    paths += [[a, b] for a in graph for b in graph[a] if a < b]  # Single sections keep the LP feasible
+    for path in paths:
+        for f in FREQUENCIES:
+            columns.append(make_column(path, graph, f))
+    return columns
+
+
+# ============================================================
+# 3. Restricted Master LP
+# ============================================================
+# Cover the section demand, at most max_trains trains per period on a section, one frequency per line
+def build_master(columns, demand, graph, max_trains=4, integer=False):
+    model = Model("Line_Planning")
+    model.setParam('OutputFlag', 0)
+    vtype = GRB.BINARY if integer else GRB.CONTINUOUS
+    y = [model.addVar(vtype=vtype, lb=0, ub=1, name=f"y_{k}") for k in range(len(columns))]
+
+    sections = {section(a, b) for a in graph for b in graph[a]}
+    cover, cap = {}, {}
+    for s in sections:
+        using = [k for k, c in enumerate(columns) if s in c['sections']]
+        cover[s] = model.addConstr(
+            quicksum(columns[k]['f'] * TRAIN['seats'] * y[k] for k in using) >= demand.get(s, 0),
+            name=f"demand_{s[0]}_{s[1]}")
+        cap[s] = model.addConstr(quicksum(columns[k]['f'] * y[k] for k in using) <= max_trains,
+                                 name=f"capacity_{s[0]}_{s[1]}")
+
+    by_path = {}
+    for k, c in enumerate(columns):
+        by_path.setdefault(tuple(c['path']), []).append(k)
+    for path, ks in by_path.items():
+        if len(ks) > 1:
+            model.addConstr(quicksum(y[k] for k in ks) <= 1, name=f"frequency_{'_'.join(path)}")
+
+    model.setObjective(quicksum(c['cost'] * y[k] for k, c in enumerate(columns)), GRB.MINIMIZE)
+    return model, y, cover, cap
+
+
+# ============================================================
+# 4. Pricing: Labelling over Simple Paths
+# ============================================================
+# Reduced cost of path P at frequency f: cost(P, f) - f * sum_e (seats * mu_e + nu_e). Labels
+# (minutes, gain, path) grow from every start station; each carries a lower bound on the reduced
+# cost of any line it can still become, taking the further gain as at most the positive section
+# gains not yet used and at most the best gain per minute over the minutes left (against the
+# linear lower bound of the cost). Labels are expanded best bound first, so the search stops
+# once no label can beat the max_columns-th column found. With dominance, a label is also
+# dropped when one with the same start, station and visited stations needs no more minutes and
+# collects at least the gain. A dominating label may only extend to known columns, so an empty
+# answer is only final after a pass with dominance=False
+def price(graph, duals, max_minutes=200, max_columns=10, known=None, dominance=True):
+    mu, nu = duals
+    known = known or set()
+    bit = {v: 1 << k for k, v in enumerate(graph)}
+    gain = {section(a, b): TRAIN['seats'] * mu.get(section(a, b), 0.0) + nu.get(section(a, b), 0.0)
+            for a in graph for b in graph[a]}
+    rate = max([gain[section(a, b)] / t for a in graph for b, t in graph[a].items()] + [0.0])
+
+    def bound(minutes, total_gain, unused, single):
+        best = math.inf
+        for f in FREQUENCIES:
+            per_minute = 2 * f * TRAIN['cost'] / pesp.T
+            linear = per_minute * (minutes + TURNAROUND) - f * total_gain
+            cost = 0 if single else cost_for_minutes(minutes, f)
+            best = min(best, max(min(linear, linear + (per_minute - f * rate) * (max_minutes - minutes)),
+                                 cost - f * (total_gain + unused)))
+        return best
+
+    found = []    # Max-heap (-reduced) of the best max_columns columns so far
+    labels = {}   # (start, station, visited) -> non-dominated labels [minutes, gain, visited, alive]
+    positive = sum(max(g, 0.0) for g in gain.values())
+    heap = [(bound(0, 0.0, positive, True), k, [start], 0, 0.0, positive, [0, 0.0, bit[start], True])
+            for k, start in enumerate(graph)]
+    counter = len(heap)
+    heapq.heapify(heap)
+
+    while heap:
+        lower, _, path, minutes, total_gain, unused, label = heapq.heappop(heap)
+        threshold = -found[0][0] if len(found) == max_columns else -1e-6
+        if lower >= threshold:
+            break
+        if not label[3]:
+            continue
+        if len(path) > 1 and path[0] < path[-1]:
+            for f in FREQUENCIES:
+                reduced = cost_for_minutes(minutes, f) - f * total_gain
+                if reduced < threshold and (tuple(path), f) not in known:
+                    counter += 1
+                    heapq.heappush(found, (-reduced, counter, list(path), f))
+                    if len(found) > max_columns:
+                        heapq.heappop(found)
+                    threshold = -found[0][0] if len(found) == max_columns else -1e-6
+
+        last, visited = path[-1], label[2]
+        for w, t in graph[last].items():
+            new_minutes = minutes + t + (DWELL if len(path) > 1 else 0)
+            if visited & bit[w] or new_minutes > max_minutes:
+                continue
+            g = gain[section(last, w)]
+            new_gain, new_unused = total_gain + g, unused - max(g, 0.0)
+            new_lower = bound(new_minutes, new_gain, new_unused, False)
+            if new_lower >= threshold:
+                continue
+            new = [new_minutes, new_gain, visited | bit[w], True]
+            if dominance and not add_label(labels.setdefault((path[0], w, new[2]), []), new):
+                continue
+            counter += 1
+            heapq.heappush(heap, (new_lower, counter, path + [w], new_minutes, new_gain, new_unused, new))
+    return sorted((-neg, path, f) for neg, _, path, f in found)
+
+
+# Keeps `new` unless a stored label (same start, station and visited set) dominates it; stored
+# labels it dominates are retired
+def add_label(bucket, new):
+    minutes, total_gain = new[0], new[1]
+    for old in bucket:
+        if old[0] <= minutes and old[1] >= total_gain - 1e-9:
+            return False
+    kept = []
+    for old in bucket:
+        if minutes <= old[0] and total_gain >= old[1] - 1e-9:
+            old[3] = False
+        else:
+            kept.append(old)
+    kept.append(new)
+    bucket[:] = kept
+    return True
+
+
+# ============================================================
+# 5. Column Generation and Integer Plan
+# ============================================================
+def plan_lines(graph, demand, lines=None, max_trains=4, max_minutes=200, max_iter=50, time_limit=None):
+    start = time.time()
+    lines = lines if lines is not None else pesp.lines_basic
+    columns = initial_columns(graph, lines)
+    known = {(tuple(c['path']), c['f']) for c in columns}
+    history = []
+
+    for iteration in range(max_iter):
+        model, y, cover, cap = build_master(columns, demand, graph, max_trains)
+        model.optimize()
+        if model.status != GRB.OPTIMAL:
+            return {'status': model.status, 'history': history, 'runtime': time.time() - start}
+        mu = {s: c.Pi for s, c in cover.items()}
+        nu = {s: c.Pi for s, c in cap.items()}
+        new = price(graph, (mu, nu), max_minutes, known=known)
+        if not new:
+            new = price(graph, (mu, nu), max_minutes, known=known, dominance=False)
+        history.append({'iteration': iteration, 'lp_bound': model.objVal, 'columns': len(columns),
+                        'new': len(new)})
+        if not new:
+            break
+        for _, path, f in new:
+            columns.append(make_column(path, graph, f))
+            known.add((tuple(path), f))
+
+    lp_bound = history[-1]['lp_bound']
+    model, y, _, _ = build_master(columns, demand, graph, max_trains, integer=True)
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    model.optimize()
+    if model.SolCount == 0:
+        return {'status': model.status, 'history': history, 'runtime': time.time() - start}
+
+    chosen = [columns[k] for k in range(len(columns)) if y[k].X > 0.5]
+    return {
+        'status': model.status,
+        'cost': model.objVal,
+        'lp_bound': lp_bound,
+        'chosen': chosen,
+        'columns': len(columns),
+        'history': history,
+        'runtime': time.time() - start
+    }
+
+
+# ============================================================
+# 6. Output for PESP Instance Generation
+# ============================================================
+# Current line numbers are kept for unchanged routes; frequency 2 adds a copy (number + 1)
+# synchronized 15 minutes apart on its first section
+def to_pesp_lines(chosen, current=None):
+    current = current if current is not None else pesp.lines_basic
+    numbers = {tuple(stops): line for line, stops in current.items()}
+    numbers.update({tuple(stops[::-1]): line for line, stops in current.items()})
+    lines, sync = {}, []
+    next_number = 9000
+    for c in sorted(chosen, key=lambda c: c['path']):
+        number = numbers.get(tuple(c['path']))
+        if number is None:
+            number, next_number = next_number, next_number + 100
+        lines[number] = c['path']
+        if c['f'] == 2:
+            lines[number + 1] = c['path']
+            sync.append((c['path'][0], c['path'][1], number, number + 1))
+    return lines, sync
+
+
+def print_plan(result, demand):
+    print("\n" + "=" * 60)
+    print(f"LINE PLAN: cost €{result['cost']:,.0f} (LP bound €{result['lp_bound']:,.0f}), "
+          f"{result['columns']} columns, {result['runtime']:.3f} s")
+    print("=" * 60)
+    for h in result['history']:
+        print(f"  Iter {h['iteration']:<3} LP €{h['lp_bound']:>14,.0f}  columns {h['columns']:<5} new {h['new']}")
+    for c in result['chosen']:
+        print(f"  {' - '.join(c['path']):<40} {c['f']} per period   €{c['cost']:,.0f}")
+    supply = {}
+    for c in result['chosen']:
+        for s in c['sections']:
+            supply[s] = supply.get(s, 0) + c['f'] * TRAIN['seats']
+    print("\nSection       Demand   Seats")
+    for s in sorted(demand):
+        print(f"  {s[0]:>4}-{s[1]:<6} {demand[s]:>6}   {supply.get(s, 0):>6}")
+
+
+# ============================================================
+# 7. Run on the A2 Network
+# ============================================================
+if __name__ == "__main__":
+    travel_time = pesp.read_travel_times()
+    graph = station_graph(travel_time)
+    demand = section_demand_from_lines(pesp.lines_basic, rs.read_seat_demand())
+
+    result = plan_lines(graph, demand)
+    if 'chosen' not in result:
+        print(f"No line plan. Status: {result['status']}")
+    else:
+        print_plan(result, demand)
+        lines, sync = to_pesp_lines(result['chosen'])
+        instance = pesp.build_instance('generic', travel_time, lines=lines, sync=sync)
+        timetable = pesp.solve(instance)
+        print(f"\nPESP on the planned lines: {len(instance['events'])} events, "
+              f"objective {timetable['objective']}")
+        if timetable['times'] is not None:
+            pesp.print_timetable(instance, timetable['times'])
@@ -0,0 +1,364 @@
+"""
+PESP Timetabling: shared instance and model builders for the A2-corridor
+Same events, activities and model as Exercise 1.1e / 1.2b, importable as functions
+"""
+
+import time
+
+T = 30  # Period time
+
+DIRECTIONS = ['South', 'North']
+
+# Lines of the basic model (Exercise 1.1e)
+lines_basic = {
+    800: ['Amr', 'Asd', 'Ut', 'Ehv', 'Std', 'Mt'],
+    3000: ['Hdr', 'Amr', 'Asd', 'Ut', 'Nm'],
+    3100: ['Shl', 'Ut', 'Nm'],
+    3500: ['Shl', 'Ut', 'Ehv', 'Vl'],
+    3900: ['Ehv', 'Std', 'Hrl']
+}
+
+# Line 3900 extended to Amsterdam (Exercise 1.2b)
+lines_extended = dict(lines_basic)
+lines_extended[3900] = ['Asd', 'Ut', 'Ehv', 'Std', 'Hrl']
+
+# Synchronization sections (15 min) of the basic model
+sync_sections = [
+    ('Amr', 'Asd', 800, 3000),
+    ('Asd', 'Ut', 800, 3000),
+    ('Shl', 'Ut', 3100, 3500),
+    ('Ut', 'Nm', 3000, 3100),
+    ('Ut', 'Ehv', 800, 3500),
+    ('Ehv', 'Std', 800, 3900)
+]
+
+# 4 trains/hour sections of the extended model: exact 15-minute sync
+sync_sections_4trains = [
+    ('Shl', 'Ut', 3100, 3500),
+    ('Ut', 'Nm', 3000, 3100),
+]
+
+# 6 trains/hour sections of the extended model: two pairs ~10 min, one pair ~20 min
+sync_sections_6trains = [
+    ('Asd', 'Ut', [(800, 3000, 8, 12), (3000, 3900, 8, 12), (800, 3900, 18, 22)]),
+    ('Ut', 'Ehv', [(800, 3500, 8, 12), (3500, 3900, 8, 12), (800, 3900, 18, 22)]),
+]
+
+# Transfers at Eindhoven between 3500 and 3900 (basic model only)
+transfer_pairs = [
+    ((3900, 'North', 'Ehv', 'arr'), (3500, 'North', 'Ehv', 'dep')),
+    ((3500, 'South', 'Ehv', 'arr'), (3900, 'South', 'Ehv', 'dep'))
+]
+
+# Line 3500 departs Schiphol at .09
+fixed_events = {(3500, 'South', 'Shl', 'dep'): 9}
+
+
+# ============================================================
+# 1. Read Data
+# ============================================================
+# pandas and gurobipy are imported where used: building and checking instances needs neither
+def read_travel_times(path='a2_part1.xlsx'):
+    import pandas as pd
+    travel_times_df = pd.read_excel(path, sheet_name='Travel Times')
+    travel_time = {}
+    for _, row in travel_times_df.iterrows():
+        travel_time[(row['From'], row['To'])] = row['Travel Time']
+        travel_time[(row['To'], row['From'])] = row['Travel Time']
+    return travel_time
+
+
+def route_of(lines, line, direction):
+    return lines[line] if direction == 'South' else lines[line][::-1]
+
+
+# ============================================================
+# 2. Events
+# ============================================================
+# Origin: departure only, destination: arrival only, intermediate: arrival + departure
+def create_events(lines):
+    events = []
+    for line in lines:
+        for direction in DIRECTIONS:
+            route = route_of(lines, line, direction)
+            for i, station in enumerate(route):
+                if i > 0:
+                    events.append((line, direction, station, 'arr'))
+                if i < len(route) - 1:
+                    events.append((line, direction, station, 'dep'))
+    event_idx = {e: k for k, e in enumerate(events)}
+    return events, event_idx
+
+
+# ============================================================
+# 3. Activities
+# ============================================================
+def driving_activities(lines, travel_time):
+    activities = []
+    for line in lines:
+        for direction in DIRECTIONS:
+            route = route_of(lines, line, direction)
+            for i in range(len(route) - 1):
+                tt = travel_time.get((route[i], route[i + 1]))
+                if tt is None:
+                    print(f"Warning: No travel time for {route[i]} -> {route[i + 1]}")
+                    continue
+                activities.append({
+                    'type': 'driving',
+                    'from': (line, direction, route[i], 'dep'),
+                    'to': (line, direction, route[i + 1], 'arr'),
+                    'l': tt,
+                    'u': tt
+                })
+    return activities
+
+
+def dwell_activities(lines, l=2, u=8):
+    activities = []
+    for line in lines:
+        for direction in DIRECTIONS:
+            route = route_of(lines, line, direction)
+            for station in route[1:-1]:
+                activities.append({
+                    'type': 'dwell',
+                    'from': (line, direction, station, 'arr'),
+                    'to': (line, direction, station, 'dep'),
+                    'l': l,
+                    'u': u
+                })
+    return activities
+
+
+# Sync between the departures of two lines at the first station of the section (per direction)
+def sync_pair(lines, from_st, to_st, line1, line2, direction, l, u, kind):
+    dep_station = from_st if direction == 'South' else to_st
+    route1 = route_of(lines, line1, direction)
+    route2 = route_of(lines, line2, direction)
+    if dep_station in route1 and dep_station in route2:
+        if route1.index(dep_station) < len(route1) - 1 and route2.index(dep_station) < len(route2) - 1:
+            return {
+                'type': kind,
+                'from': (line1, direction, dep_station, 'dep'),
+                'to': (line2, direction, dep_station, 'dep'),
+                'l': l,
+                'u': u
+            }
+    return None
+
+
+def sync_activities(lines, sections, l=15, u=15):
+    activities = []
+    for from_st, to_st, line1, line2 in sections:
+        for direction in DIRECTIONS:
+            a = sync_pair(lines, from_st, to_st, line1, line2, direction, l, u, 'sync')
+            if a is not None:
+                activities.append(a)
+    return activities
+
+
+def relaxed_sync_activities(lines, sections):
+    activities = []
+    for from_st, to_st, line_pairs in sections:
+        for direction in DIRECTIONS:
+            for line1, line2, l_bound, u_bound in line_pairs:
+                a = sync_pair(lines, from_st, to_st, line1, line2, direction,
+                              l_bound, u_bound, 'relaxed_sync')
+                if a is not None:
+                    activities.append(a)
+    return activities
+
+
+# Headway at Utrecht between Shl lines and Asd lines (southbound arrivals, northbound departures)
+def headway_activities(shl_lines, asd_lines, h=3):
+    activities = []
+    for direction, kind in [('South', 'arr'), ('North', 'dep')]:
+        for shl_line in shl_lines:
+            for asd_line in asd_lines:
+                activities.append({
+                    'type': 'headway',
+                    'from': (shl_line, direction, 'Ut', kind),
+                    'to': (asd_line, direction, 'Ut', kind),
+                    'l': h,
+                    'u': T - h
+                })
+    return activities
+
+
+def transfer_activities(pairs, l=2, u=5):
+    return [{'type': 'transfer', 'from': e1, 'to': e2, 'l': l, 'u': u} for e1, e2 in pairs]
+
+
+# Headway between every pair of lines departing onto the same section (generic line plans)
+def section_headway_activities(lines, h=3):
+    departing = {}
+    for line in lines:
+        for direction in DIRECTIONS:
+            route = route_of(lines, line, direction)
+            for i in range(len(route) - 1):
+                departing.setdefault((route[i], route[i + 1]), []).append((line, direction))
+    activities = []
+    for (station, _), trains in departing.items():
+        for k, (line1, dir1) in enumerate(trains):
+            for line2, dir2 in trains[k + 1:]:
+                activities.append({
+                    'type': 'headway',
+                    'from': (line1, dir1, station, 'dep'),
+                    'to': (line2, dir2, station, 'dep'),
+                    'l': h,
+                    'u': T - h
+                })
+    return activities
+
+
+# ============================================================
+# 4. Instances
+# ============================================================
+# 'basic' = Exercise 1.1e, 'extended' = Exercise 1.2b (line 3900 to Asd, relaxed syncs),
+# 'generic' = any line plan: section headways plus the given sync sections
+def build_instance(variant='basic', travel_time=None, lines=None, sync=None):
+    travel_time = travel_time if travel_time is not None else read_travel_times()
+
+    if variant == 'basic':
+        lines = lines or lines_basic
+        activities = (driving_activities(lines, travel_time) +
+                      dwell_activities(lines) +
+                      sync_activities(lines, sync_sections) +
+                      headway_activities([3500, 3100], [800, 3000]) +
+                      transfer_activities(transfer_pairs))
+        objective = ['dwell', 'transfer']
+    elif variant == 'extended':
+        lines = lines or lines_extended
+        activities = (driving_activities(lines, travel_time) +
+                      dwell_activities(lines) +
+                      sync_activities(lines, sync_sections_4trains) +
+                      relaxed_sync_activities(lines, sync_sections_6trains) +
+                      headway_activities([3100, 3500], [800, 3000, 3900]))
+        objective = ['dwell']
+    elif variant == 'generic':
+        activities = (driving_activities(lines, travel_time) +
+                      dwell_activities(lines) +
+                      sync_activities(lines, sync or []) +
+                      section_headway_activities(lines))
+        objective = ['dwell']
+    else:
+        raise ValueError(f"Unknown PESP variant: {variant}")
+
+    events, event_idx = create_events(lines)
+    if variant == 'generic':
+        fixed = {events[0]: 0}  # Pin the global shift
+    else:
+        fixed = dict(fixed_events)
+    return {
+        'name': variant,
+        'lines': lines,
+        'events': events,
+        'event_idx': event_idx,
+        'activities': activities,
+        'T': T,
+        'fixed': fixed,
+        'objective': objective
+    }
+
+
+def activity_counts(activities):
+    counts = {}
+    for a in activities:
+        counts[a['type']] = counts.get(a['type'], 0) + 1
+    return counts
+
+
+# ============================================================
+# 5. Model
+# ============================================================
+def build_model(instance, name="PESP", env=None):
+    from gurobipy import Model, GRB, quicksum
+    T = instance['T']
+    activities = instance['activities']
+
+    model = Model(name, env=env)
+    model.setParam('OutputFlag', 0)
+
+    pi = {}  # Event times
+    for e in instance['events']:
+        pi[e] = model.addVar(lb=0, ub=T, name=f"pi_{e}")
+
+    x = {}  # Activity durations
+    p = {}  # Period variables
+    for i, a in enumerate(activities):
+        x[i] = model.addVar(lb=a['l'], ub=a['u'], name=f"x_{i}")
+        p[i] = model.addVar(vtype=GRB.INTEGER, lb=0, name=f"p_{i}")
+    model.update()
+
+    # Activity duration = pi_j - pi_i + T * p
+    for i, a in enumerate(activities):
+        model.addConstr(x[i] == pi[a['to']] - pi[a['from']] + T * p[i], name=f"activity_{i}")
+
+    for event, value in instance['fixed'].items():
+        model.addConstr(pi[event] == value, name=f"fixed_{event[0]}_{event[2]}")
+
+    model.setObjective(
+        quicksum(x[i] for i, a in enumerate(activities) if a['type'] in instance['objective']),
+        GRB.MINIMIZE
+    )
+    return model, pi, x, p
+
+
+# Event times (minutes mod T) of a solved model
+def event_times(pi, T):
+    return {e: int(round(var.X)) % T for e, var in pi.items()}
+
+
+# Durations implied by event times: the smallest value >= l in the right residue class
+def activity_durations(instance, times):
+    T = instance['T']
+    return [a['l'] + (times[a['to']] - times[a['from']] - a['l']) % T for a in instance['activities']]
+
+
+def objective_value(instance, times):
+    durations = activity_durations(instance, times)
+    return sum(d for d, a in zip(durations, instance['activities']) if a['type'] in instance['objective'])
+
+
+# method 'sat': order-encoded SAT with incremental objective bounds (pesp_sat, needs python-sat)
+def solve(instance, time_limit=None, method='mip'):
+    if method == 'sat':
+        import pesp_sat
+        return pesp_sat.solve(instance, time_limit)
+    start = time.time()
+    model, pi, x, p = build_model(instance)
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    model.optimize()
+    result = {
+        'status': model.status,
+        'objective': None,
+        'times': None,
+        'runtime': time.time() - start,
+        'model': model
+    }
+    if model.SolCount > 0:
+        result['objective'] = model.objVal
+        result['times'] = event_times(pi, instance['T'])
+    return result
+
+
+# ============================================================
+# 6. Output
+# ============================================================
+def print_timetable(instance, times):
+    lines = instance['lines']
+    for direction in DIRECTIONS:
+        print(f"\n{direction}bound Timetable:")
+        for line in sorted(lines):
+            route = route_of(lines, line, direction)
+            entries = []
+            for i, station in enumerate(route):
+                if i == 0:
+                    entries.append(f"d{times[(line, direction, station, 'dep')]:02d}")
+                elif i == len(route) - 1:
+                    entries.append(f"a{times[(line, direction, station, 'arr')]:02d}")
+                else:
+                    entries.append(f"a{times[(line, direction, station, 'arr')]:02d}/"
+                                   f"d{times[(line, direction, station, 'dep')]:02d}")
+            print(f"  Line {line}: {' - '.join(route)}")
+            print(f"           {' | '.join(entries)}")
@@ -0,0 +1,237 @@
+"""
+PESP Cutting Planes: cycle and change-cycle inequalities separated inside the Gurobi solve
+For an oriented cycle C (forward arcs C+, backward arcs C-) the periodic offset
+z_C = p(C+) - p(C-) is integer with ceil((l(C+) - u(C-)) / T) <= z_C <= floor((u(C+) - l(C-)) / T),
+and with slacks y = x - l and alpha = (l(C-) - l(C+)) mod T the change-cycle inequality
+(T - alpha) * y(C+) + alpha * y(C-) >= alpha * (T - alpha) holds (Nachtigall)
+"""
+
+import heapq
+import math
+import time
+from gurobipy import GRB, quicksum
+import pesp
+
+
+# ============================================================
+# 1. Shortest-Path Cycle Search
+# ============================================================
+# Undirected view of the event-activity network: node -> [(activity, neighbour, sign)]
+def activity_graph(instance):
+    adjacency = {e: [] for e in instance['events']}
+    for i, a in enumerate(instance['activities']):
+        if a['u'] - a['l'] >= instance['T']:
+            continue  # Never part of a violated inequality
+        adjacency[a['from']].append((i, a['to'], 1))
+        adjacency[a['to']].append((i, a['from'], -1))
+    return adjacency
+
+
+# Cheapest cycle through activity k (traversed forward), weights = LP slack of each activity
+def shortest_cycle(adjacency, activities, k, weight):
+    source, target = activities[k]['to'], activities[k]['from']
+    dist = {source: 0.0}
+    pred = {}
+    heap = [(0.0, 0, source)]
+    counter = 0
+    while heap:
+        d, _, v = heapq.heappop(heap)
+        if v == target:
+            break
+        if d > dist[v]:
+            continue
+        for i, w, sign in adjacency[v]:
+            if i == k:
+                continue
+            nd = d + weight[i]
+            if nd < dist.get(w, math.inf) - 1e-12:
+                dist[w] = nd
+                pred[w] = (v, i, sign)
+                counter += 1
+                heapq.heappush(heap, (nd, counter, w))
+    if target not in pred:
+        return None
+
+    path = []
+    v = target
+    while v != source:
+        u, i, sign = pred[v]
+        path.append((i, sign))
+        v = u
+    return [(k, 1)] + path[::-1]
+
+
+# ============================================================
+# 2. Inequalities for One Cycle
+# ============================================================
+# Returns violated cuts as (kind, {('p' or 'x', activity): coefficient}, sense, rhs, violation)
+def cycle_cuts(cycle, activities, T, xv, pv, eps=1e-4):
+    cuts = []
+    low = sum(activities[i]['l'] if s > 0 else -activities[i]['u'] for i, s in cycle)
+    high = sum(activities[i]['u'] if s > 0 else -activities[i]['l'] for i, s in cycle)
+    z = sum(s * pv[i] for i, s in cycle)
+    z_min, z_max = math.ceil(low / T - 1e-9), math.floor(high / T + 1e-9)
+    coeffs = {}
+    for i, s in cycle:
+        coeffs[('p', i)] = coeffs.get(('p', i), 0) + s
+    if z < z_min - eps:
+        cuts.append(('cycle', coeffs, GRB.GREATER_EQUAL, z_min, z_min - z))
+    if z > z_max + eps:
+        cuts.append(('cycle', coeffs, GRB.LESS_EQUAL, z_max, z - z_max))
+
+    # Change-cycle inequality (reversing the cycle gives the same inequality)
+    alpha = sum(-s * activities[i]['l'] for i, s in cycle) % T
+    if alpha != 0:
+        coeffs = {}
+        constant = 0.0
+        lhs = 0.0
+        for i, s in cycle:
+            c = (T - alpha) if s > 0 else alpha
+            coeffs[('x', i)] = coeffs.get(('x', i), 0) + c
+            constant += c * activities[i]['l']
+            lhs += c * (xv[i] - activities[i]['l'])
+        rhs = alpha * (T - alpha)
+        if lhs < rhs - eps:
+            cuts.append(('change_cycle', coeffs, GRB.GREATER_EQUAL, rhs + constant, rhs - lhs))
+    return cuts
+
+
+# ============================================================
+# 3. Separation Heuristic
+# ============================================================
+# Shortest cycles through the most fractional / least slack activities
+def separate(instance, adjacency, xv, pv, max_cuts=50, max_starts=200, eps=1e-4):
+    activities = instance['activities']
+    T = instance['T']
+    weight = {i: max(0.0, xv[i] - a['l']) for i, a in enumerate(activities)}
+
+    def fractionality(i):
+        return abs(pv[i] - round(pv[i]))
+    starts = sorted((i for i, a in enumerate(activities) if a['u'] - a['l'] < T),
+                    key=lambda i: (-fractionality(i), weight[i]))[:max_starts]
+
+    seen = set()
+    cuts = []
+    for k in starts:
+        cycle = shortest_cycle(adjacency, activities, k, weight)
+        if cycle is None:
+            continue
+        key = frozenset(i for i, _ in cycle)
+        if key in seen:
+            continue
+        seen.add(key)
+        cuts.extend(cycle_cuts(cycle, activities, T, xv, pv, eps))
+        if len(cuts) >= max_cuts:
+            break
+    return sorted(cuts, key=lambda c: -c[4])[:max_cuts]
+
+
+def linear_expression(coeffs, x, p):
+    return quicksum(c * (p[i] if kind == 'p' else x[i]) for (kind, i), c in coeffs.items())
+
+
+# ============================================================
+# 4. Branch-and-Cut Callback
+# ============================================================
+def make_callback(instance, x, p, stats, max_cuts=50, max_rounds=20):
+    adjacency = activity_graph(instance)
+    indices = list(x)
+    variables = [x[i] for i in indices] + [p[i] for i in indices]
+
+    def callback(model, where):
+        if where != GRB.Callback.MIPNODE:
+            return
+        if model.cbGet(GRB.Callback.MIPNODE_STATUS) != GRB.OPTIMAL:
+            return
+        node = model.cbGet(GRB.Callback.MIPNODE_NODCNT)
+        if node == 0:
+            stats['root_bound'] = model.cbGet(GRB.Callback.MIPNODE_OBJBND)
+        if stats['rounds'] >= max_rounds:
+            return
+
+        start = time.time()
+        values = model.cbGetNodeRel(variables)
+        xv = dict(zip(indices, values[:len(indices)]))
+        pv = dict(zip(indices, values[len(indices):]))
+        cuts = separate(instance, adjacency, xv, pv, max_cuts)
+        for kind, coeffs, sense, rhs, _ in cuts:
+            lhs = linear_expression(coeffs, x, p)
+            if sense == GRB.GREATER_EQUAL:
+                model.cbCut(lhs >= rhs)
+            else:
+                model.cbCut(lhs <= rhs)
+            stats['cuts'][kind] = stats['cuts'].get(kind, 0) + 1
+        stats['rounds'] += 1
+        stats['separation_time'] += time.time() - start
+
+    return callback
+
+
+def solve_with_cuts(instance, time_limit=None, max_cuts=50, max_rounds=20):
+    start = time.time()
+    model, pi, x, p = pesp.build_model(instance, name="PESP_Cuts")
+    model.setParam('PreCrush', 1)  # Required for user cuts
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+
+    stats = {'cuts': {}, 'rounds': 0, 'separation_time': 0.0, 'root_bound': None}
+    model.optimize(make_callback(instance, x, p, stats, max_cuts, max_rounds))
+    stats['runtime'] = time.time() - start
+    stats['status'] = model.status
+    stats['objective'] = model.objVal if model.SolCount > 0 else None
+    stats['bound'] = model.ObjBound
+    stats['nodes'] = model.NodeCount
+    return model, pi, stats
+
+
+# ============================================================
+# 5. Bound Improvement on the LP Relaxation
+# ============================================================
+# Pure cutting-plane loop on the LP relaxation: bound per round measures the strength of the cuts
+def lp_bound_rounds(instance, rounds=10, max_cuts=50):
+    model, pi, x, p = pesp.build_model(instance, name="PESP_LP")
+    model.update()
+    relaxed = model.relax()
+    xr = {i: relaxed.getVarByName(x[i].VarName) for i in x}
+    pr = {i: relaxed.getVarByName(p[i].VarName) for i in p}
+    adjacency = activity_graph(instance)
+
+    bounds = []
+    for r in range(rounds + 1):
+        relaxed.optimize()
+        if relaxed.status != GRB.OPTIMAL:
+            break
+        bounds.append(relaxed.objVal)
+        if r == rounds:
+            break
+        xv = {i: var.X for i, var in xr.items()}
+        pv = {i: var.X for i, var in pr.items()}
+        cuts = separate(instance, adjacency, xv, pv, max_cuts)
+        if not cuts:
+            break
+        for kind, coeffs, sense, rhs, _ in cuts:
+            lhs = linear_expression(coeffs, xr, pr)
+            if sense == GRB.GREATER_EQUAL:
+                relaxed.addConstr(lhs >= rhs, name=f"{kind}_{r}")
+            else:
+                relaxed.addConstr(lhs <= rhs, name=f"{kind}_{r}")
+    return bounds
+
+
+# ============================================================
+# 6. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    for variant in ['basic', 'extended']:
+        instance = pesp.build_instance(variant)
+        bounds = lp_bound_rounds(instance)
+        model, pi, stats = solve_with_cuts(instance)
+
+        print("\n" + "=" * 60)
+        print(f"CUTTING PLANES: {variant} instance")
+        print("=" * 60)
+        print("LP bound per separation round: " + ", ".join(f"{b:.2f}" for b in bounds))
+        print(f"Objective: {stats['objective']}, bound: {stats['bound']}, nodes: {stats['nodes']:.0f}")
+        print(f"Root bound after cuts: {stats['root_bound']}")
+        print(f"Cuts added: {stats['cuts']} in {stats['rounds']} rounds "
+              f"({stats['separation_time']:.3f} s separation, {stats['runtime']:.3f} s total)")
@@ -0,0 +1,266 @@
+"""
+PESP Corridor Decomposition: partition lines at weakly coupled hubs, solve sub-PESPs in
+parallel processes, and restore the coupling activities in a small master problem
+A sub-timetable stays feasible and keeps its objective when all its events are shifted by
+the same amount mod T. The master chooses one shift per corridor and re-optimizes the hub
+events (the ends of the coupling activities) with every other event fixed at its shifted
+sub-timetable time. If that is infeasible, the hub events are widened by one activity within
+their corridor at a time, while the master keeps at most max_free_share of the events; beyond
+that the two most coupled corridors are merged. This is a primal heuristic: the result is a
+feasible timetable with objective_gap against a lower bound (sub-PESP bounds plus the lower
+bounds of the coupling objective activities), not a proof of optimality
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from gurobipy import Model, GRB, quicksum
+import pesp
+
+
+# ============================================================
+# 1. Partition Lines into Corridors
+# ============================================================
+# Line graph weighted by the number of activities between events of two lines
+def line_coupling(instance):
+    weight = {}
+    for a in instance['activities']:
+        l1, l2 = a['from'][0], a['to'][0]
+        if l1 != l2:
+            key = (min(l1, l2), max(l1, l2))
+            weight[key] = weight.get(key, 0) + 1
+    return weight
+
+
+# Agglomerative clustering: merge the most strongly coupled corridors while keeping sizes balanced
+def partition_lines(instance, n_parts, balance=1.5):
+    events_per_line = {}
+    for e in instance['events']:
+        events_per_line[e[0]] = events_per_line.get(e[0], 0) + 1
+    max_size = balance * len(instance['events']) / n_parts
+
+    part_of = {line: k for k, line in enumerate(instance['lines'])}
+    parts = {k: [line] for k, line in enumerate(instance['lines'])}
+    weight = line_coupling(instance)
+
+    while len(parts) > n_parts:
+        between = {}
+        for (l1, l2), w in weight.items():
+            k1, k2 = part_of[l1], part_of[l2]
+            if k1 != k2:
+                key = (min(k1, k2), max(k1, k2))
+                between[key] = between.get(key, 0) + w
+        size = {k: sum(events_per_line[line] for line in lines) for k, lines in parts.items()}
+
+        candidates = [(w, key) for key, w in between.items() if size[key[0]] + size[key[1]] <= max_size]
+        if candidates:
+            _, (k1, k2) = max(candidates)
+        else:
+            # Nothing fits: merge the two smallest corridors
+            k1, k2 = sorted(parts, key=lambda k: size[k])[:2]
+        for line in parts[k2]:
+            part_of[line] = k1
+        parts[k1] += parts.pop(k2)
+
+    return [sorted(lines) for lines in parts.values()]
+
+
+def sub_instance(instance, lines):
+    lines = set(lines)
+    events = [e for e in instance['events'] if e[0] in lines]
+    activities = [a for a in instance['activities'] if a['from'][0] in lines and a['to'][0] in lines]
+    return {
+        'name': f"{instance['name']}_{'_'.join(str(line) for line in sorted(lines))}",
+        'lines': {line: stops for line, stops in instance['lines'].items() if line in lines},
+        'events': events,
+        'event_idx': {e: k for k, e in enumerate(events)},
+        'activities': activities,
+        'T': instance['T'],
+        'fixed': {e: v for e, v in instance['fixed'].items() if e[0] in lines},
+        'objective': instance['objective']
+    }
+
+
+# ============================================================
+# 2. Sub-PESP Solves (one process per corridor)
+# ============================================================
+def solve_part(args):
+    instance, time_limit, threads = args
+    start = time.time()
+    model, pi, x, p = pesp.build_model(instance, name=instance['name'])
+    model.setParam('Threads', threads)
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    model.optimize()
+    times = pesp.event_times(pi, instance['T']) if model.SolCount > 0 else None
+    return {'status': model.status, 'times': times, 'bound': model.ObjBound if model.SolCount > 0 else None,
+            'runtime': time.time() - start}
+
+
+# ============================================================
+# 3. Hub Master over the Coupling Activities
+# ============================================================
+def coupling_activities(instance, parts):
+    part_of = {line: k for k, lines in enumerate(parts) for line in lines}
+    return [(i, a) for i, a in enumerate(instance['activities'])
+            if part_of[a['from'][0]] != part_of[a['to'][0]]]
+
+
+def hub_events(coupling):
+    return {e for _, a in coupling for e in (a['from'], a['to'])}
+
+
+# Free events plus the events one activity away inside the same corridor
+def widen(instance, parts, free):
+    part_of = {line: k for k, lines in enumerate(parts) for line in lines}
+    wider = set(free)
+    for a in instance['activities']:
+        if part_of[a['from'][0]] == part_of[a['to'][0]] and (a['from'] in free or a['to'] in free):
+            wider.update((a['from'], a['to']))
+    return wider
+
+
+# Event time = pi_e for free events, sub-timetable time + corridor shift otherwise. Activities
+# between two non-free events of one corridor keep their duration and stay out of the model
+def solve_master(instance, parts, times, free, time_limit=None):
+    T = instance['T']
+    part_of = {line: k for k, lines in enumerate(parts) for line in lines}
+    activities = [(i, a) for i, a in enumerate(instance['activities'])
+                  if a['from'] in free or a['to'] in free or part_of[a['from'][0]] != part_of[a['to'][0]]]
+
+    model = Model("PESP_Master")
+    model.setParam('OutputFlag', 0)
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    fixed_parts = {part_of[e[0]] for e in instance['fixed'] if e not in free}
+    shift = {}
+    for k in range(len(parts)):
+        ub = 0 if k in fixed_parts else T - 1
+        shift[k] = model.addVar(vtype=GRB.INTEGER, lb=0, ub=ub, name=f"shift_{k}")
+    pi = {e: model.addVar(vtype=GRB.INTEGER, lb=0, ub=T - 1, name=f"pi_{e}") for e in free}
+    for e, value in instance['fixed'].items():
+        if e in free:
+            model.addConstr(pi[e] == value, name=f"fixed_{e[0]}_{e[2]}")
+
+    def time_of(e):
+        return pi[e] if e in free else times[e] + shift[part_of[e[0]]]
+
+    x = {}
+    for i, a in activities:
+        x[i] = model.addVar(lb=a['l'], ub=a['u'], name=f"x_{i}")
+        p = model.addVar(vtype=GRB.INTEGER, lb=-GRB.INFINITY, name=f"p_{i}")
+        model.addConstr(x[i] == time_of(a['to']) - time_of(a['from']) + T * p, name=f"activity_{i}")
+
+    model.setObjective(quicksum(x[i] for i, a in activities if a['type'] in instance['objective']),
+                       GRB.MINIMIZE)
+    model.optimize()
+
+    if model.SolCount == 0:
+        return None, len(activities)
+    shifts = {k: int(round(var.X)) for k, var in shift.items()}
+    return {e: (int(round(pi[e].X)) if e in free else t + shifts[part_of[e[0]]]) % T
+            for e, t in times.items()}, len(activities)
+
+
+# Every corridor's objective activities cost at least its sub-PESP bound and every coupling
+# objective activity at least its lower bound
+def lower_bound(instance, parts, solved, coupling):
+    return (sum(solved[tuple(lines)]['bound'] for lines in parts) +
+            sum(a['l'] for _, a in coupling if a['type'] in instance['objective']))
+
+
+# Pair of corridors sharing the most coupling activities
+def most_coupled(parts, coupling):
+    part_of = {line: k for k, lines in enumerate(parts) for line in lines}
+    count = {}
+    for _, a in coupling:
+        k1, k2 = part_of[a['from'][0]], part_of[a['to'][0]]
+        key = (min(k1, k2), max(k1, k2))
+        count[key] = count.get(key, 0) + 1
+    return max(count, key=count.get)
+
+
+# ============================================================
+# 4. Decomposition Loop
+# ============================================================
+# When no widening of the hub events up to max_radius (and max_free_share of the events)
+# restores the coupling activities, the two most coupled corridors are merged and re-solved
+# together; in the worst case this ends with the monolithic model
+def solve_decomposed(instance, n_parts=2, workers=None, time_limit=None, threads=1, max_radius=3,
+                     max_free_share=0.5):
+    start = time.time()
+    parts = partition_lines(instance, n_parts)
+    solved = {}
+    history = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            todo = [tuple(lines) for lines in parts if tuple(lines) not in solved]
+            jobs = [(sub_instance(instance, lines), time_limit, threads) for lines in todo]
+            for lines, result in zip(todo, pool.map(solve_part, jobs)):
+                solved[lines] = result
+
+            failed = [lines for lines in parts if solved[tuple(lines)]['times'] is None]
+            if failed:
+                return {'status': 'subproblem_failed', 'parts': parts, 'failed': failed,
+                        'history': history, 'runtime': time.time() - start}
+
+            times = {}
+            for lines in parts:
+                times.update(solved[tuple(lines)]['times'])
+            coupling = coupling_activities(instance, parts)
+            free = hub_events(coupling)
+            for radius in range(max_radius + 1):
+                if len(parts) > 1 and len(free) > max_free_share * len(instance['events']):
+                    break
+                master_times, size = solve_master(instance, parts, times, free, time_limit)
+                history.append({'parts': [list(lines) for lines in parts], 'coupling': len(coupling),
+                                'radius': radius, 'free': len(free), 'master_activities': size,
+                                'consistent': master_times is not None, 'runtime': time.time() - start})
+                if master_times is not None:
+                    objective = pesp.objective_value(instance, master_times)
+                    bound = lower_bound(instance, parts, solved, coupling)
+                    return {'status': 'feasible', 'times': master_times, 'parts': parts,
+                            'objective': objective, 'lower_bound': bound,
+                            'objective_gap': (objective - bound) / objective if objective > 0 else 0.0,
+                            'history': history, 'runtime': time.time() - start}
+                free = widen(instance, parts, free)
+
+            if len(parts) == 1:
+                return {'status': 'infeasible', 'parts': parts, 'history': history,
+                        'runtime': time.time() - start}
+            k1, k2 = most_coupled(parts, coupling)
+            merged = sorted(parts[k1] + parts[k2])
+            parts = [lines for k, lines in enumerate(parts) if k not in (k1, k2)] + [merged]
+
+
+# ============================================================
+# 5. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    for variant in ['basic', 'extended']:
+        instance = pesp.build_instance(variant)
+        full = pesp.solve(instance)
+        print("\n" + "=" * 60)
+        print(f"CORRIDOR DECOMPOSITION: {variant} instance ({len(instance['events'])} events, "
+              f"full MIP objective {full['objective']:.0f})")
+        print("=" * 60)
+        print(f"Line coupling: {line_coupling(instance)}")
+        for n_parts in [2, 3, 4]:
+            result = solve_decomposed(instance, n_parts=n_parts)
+            summary = f"\n{n_parts} corridors: {result['status']} ({result['runtime']:.3f} s)"
+            if result['status'] == 'feasible':
+                summary += (f", objective {result['objective']} minutes, lower bound {result['lower_bound']:.0f}, "
+                            f"gap {result['objective_gap']:.1%}")
+                if result['objective'] > full['objective'] + 1e-6:
+                    summary += f"  [WORSE than the full MIP by {result['objective'] - full['objective']:.0f}]"
+            print(summary)
+            for h in result['history']:
+                print(f"  Corridors {h['parts']}: {h['coupling']} coupling activities, radius {h['radius']}, "
+                      f"{h['free']} free events, {h['master_activities']} master activities, "
+                      f"consistent: {h['consistent']}")
+
+    instance = pesp.build_instance('basic')
+    result = solve_decomposed(instance, n_parts=2)
+    if result['status'] == 'feasible':
+        print(f"\nBasic instance, 2 corridors (objective {result['objective']} minutes):")
+        pesp.print_timetable(instance, result['times'])
@@ -0,0 +1,325 @@
+"""
+PESP Infeasibility Diagnosis: fast combinatorial check, IIS and minimal bound relaxation
+Works on the events/activities structures built in Exercise 1.x
+"""
+
+import math
+import time
+
+ORIGIN = 'origin'  # Virtual node with pi = 0, used to model fixed event times
+
+# Penalty per minute of widening an activity window (None = never relax)
+RELAX_WEIGHTS = {
+    'driving': None,
+    'dwell': 2,
+    'sync': 1,
+    'relaxed_sync': 1,
+    'headway': 10,
+    'transfer': 1
+}
+
+
+# ============================================================
+# 1. Fast Combinatorial Check (runs before the MIP)
+# ============================================================
+# Arcs are (from, to, l, u, label); label is the activity index or ('fixed', event)
+def build_arcs(activities, T, fixed=None):
+    arcs = []
+    for i, a in enumerate(activities):
+        if a['u'] - a['l'] >= T:
+            continue  # Window covers a full period: never restricts the timetable
+        arcs.append((a['from'], a['to'], a['l'], a['u'], i))
+    for event, value in (fixed or {}).items():
+        arcs.append((ORIGIN, event, value, value, ('fixed', event)))
+    return arcs
+
+
+# Breadth-first spanning forest; returns parent arc index and depth per node
+def spanning_forest(nodes, arcs):
+    adjacency = {v: [] for v in nodes}
+    for k, (i, j, _, _, _) in enumerate(arcs):
+        adjacency[i].append((k, j))
+        adjacency[j].append((k, i))
+
+    parent = {}
+    depth = {}
+    for root in nodes:
+        if root in depth:
+            continue
+        depth[root] = 0
+        parent[root] = None
+        queue = [root]
+        for v in queue:
+            for k, w in adjacency[v]:
+                if w not in depth:
+                    depth[w] = depth[v] + 1
+                    parent[w] = k
+                    queue.append(w)
+    return parent, depth
+
+
+# Fundamental cycle of co-tree arc k as a list of (arc index, sign), oriented along arc k
+def fundamental_cycle(k, arcs, parent, depth):
+    i, j = arcs[k][0], arcs[k][1]
+    cycle = [(k, 1)]
+
+    # Walk from j up to the common ancestor (traversing towards i)
+    up_from_j = []
+    up_from_i = []
+    a, b = j, i
+    while a != b:
+        if depth[a] >= depth[b]:
+            arc = parent[a]
+            up_from_j.append((arc, a))
+            a = arcs[arc][0] if arcs[arc][1] == a else arcs[arc][1]
+        else:
+            arc = parent[b]
+            up_from_i.append((arc, b))
+            b = arcs[arc][0] if arcs[arc][1] == b else arcs[arc][1]
+
+    # j -> ancestor: traverse each arc from child to parent
+    for arc, child in up_from_j:
+        cycle.append((arc, 1 if arcs[arc][0] == child else -1))
+    # ancestor -> i: traverse each arc from parent to child
+    for arc, child in reversed(up_from_i):
+        cycle.append((arc, 1 if arcs[arc][1] == child else -1))
+    return cycle
+
+
+def cycle_interval(cycle, arcs):
+    low = 0
+    high = 0
+    for k, sign in cycle:
+        l, u = arcs[k][2], arcs[k][3]
+        if sign > 0:
+            low += l
+            high += u
+        else:
+            low -= u
+            high -= l
+    return low, high
+
+
+def ceil_div(a, b):
+    return -((-a) // b)
+
+
+# Bellman-Ford on difference constraints; returns (distances, None) or (None, negative cycle arcs)
+def negative_cycle(nodes, edges):
+    dist = {v: 0 for v in nodes}
+    pred = {v: None for v in nodes}
+    changed = None
+    for _ in range(len(nodes)):
+        changed = None
+        for v_from, v_to, weight, k in edges:
+            if dist[v_from] + weight < dist[v_to] - 1e-9:
+                dist[v_to] = dist[v_from] + weight
+                pred[v_to] = (v_from, k)
+                changed = v_to
+        if changed is None:
+            return dist, None
+
+    # Walk back far enough to land on the cycle, then collect it
+    v = changed
+    for _ in range(len(nodes)):
+        v = pred[v][0]
+    cycle_arcs = []
+    u = v
+    while True:
+        v_from, k = pred[u]
+        cycle_arcs.append(k)
+        u = v_from
+        if u == v:
+            break
+    return None, cycle_arcs
+
+
+def quick_check(events, activities, T, fixed=None):
+    start = time.time()
+    arcs = build_arcs(activities, T, fixed)
+    nodes = list(events) + ([ORIGIN] if fixed else [])
+    parent, depth = spanning_forest(nodes, arcs)
+    tree_arcs = {k for k in parent.values() if k is not None}
+
+    # Every fundamental cycle must admit an integer period offset: ceil(L/T) <= p <= floor(U/T)
+    forced = {}
+    cycles = {}
+    conflicts = []
+    for k in range(len(arcs)):
+        if k in tree_arcs:
+            continue
+        cycle = fundamental_cycle(k, arcs, parent, depth)
+        low, high = cycle_interval(cycle, arcs)
+        p_min, p_max = ceil_div(low, T), high // T
+        cycles[k] = cycle
+        if p_min > p_max:
+            conflicts.append({'arcs': [c for c, _ in cycle], 'interval': (low, high)})
+        elif p_min == p_max:
+            forced[k] = p_min
+
+    if conflicts:
+        smallest = min(conflicts, key=lambda c: len(c['arcs']))
+        return make_result('infeasible', arcs, smallest['arcs'], start,
+                           reason=f"cycle tension must lie in [{smallest['interval'][0]}, "
+                                  f"{smallest['interval'][1]}], which contains no multiple of {T}",
+                           n_cycles=len(cycles), n_forced=len(forced))
+
+    # Tree arcs (p = 0) and forced co-tree arcs give a pure difference-constraint system
+    edges = []
+    for k, (i, j, l, u, _) in enumerate(arcs):
+        if k in tree_arcs or k in forced:
+            shift = T * forced.get(k, 0)
+            edges.append((i, j, u - shift, k))     # pi_j - pi_i <= u - T p
+            edges.append((j, i, shift - l, k))     # pi_i - pi_j <= T p - l
+    dist, cycle_arcs = negative_cycle(nodes, edges)
+
+    if cycle_arcs is not None:
+        # The forced offsets come from their fundamental cycles, so those belong to the conflict
+        conflict = set(cycle_arcs)
+        for k in cycle_arcs:
+            if k in forced:
+                conflict.update(c for c, _ in cycles[k])
+        return make_result('infeasible', arcs, sorted(conflict), start,
+                           reason="negative cycle in the difference constraints of forced periods",
+                           n_cycles=len(cycles), n_forced=len(forced))
+
+    if len(forced) == len(cycles):
+        offset = dist.get(ORIGIN, 0)
+        potentials = {e: (dist[e] - offset) % T for e in events}
+        return make_result('feasible', arcs, [], start, potentials=potentials,
+                           n_cycles=len(cycles), n_forced=len(forced))
+
+    return make_result('unknown', arcs, [], start,
+                       n_cycles=len(cycles), n_forced=len(forced))
+
+
+def make_result(status, arcs, conflict_arcs, start, **extra):
+    result = {
+        'status': status,
+        'conflict': sorted({arcs[k][4] for k in conflict_arcs if not isinstance(arcs[k][4], tuple)}),
+        'fixed_conflict': sorted({arcs[k][4][1] for k in conflict_arcs if isinstance(arcs[k][4], tuple)}),
+        'runtime': time.time() - start
+    }
+    result.update(extra)
+    return result
+
+
+# ============================================================
+# 2. Irreducible Infeasible Subsystem (after the MIP)
+# ============================================================
+# Expects constraint names activity_{i} as in the Exercise 1.x models
+def compute_iis(model, x, activities):
+    start = time.time()
+    model.computeIIS()
+
+    conflict = set()
+    other = []
+    for c in model.getConstrs():
+        if c.IISConstr:
+            if c.ConstrName.startswith('activity_'):
+                conflict.add(int(c.ConstrName.split('_')[1]))
+            else:
+                other.append(c.ConstrName)
+    for i in range(len(activities)):
+        if x[i].IISLB or x[i].IISUB:
+            conflict.add(i)
+
+    return {
+        'status': 'infeasible',
+        'conflict': sorted(conflict),
+        'other_constraints': other,
+        'runtime': time.time() - start
+    }
+
+
+# ============================================================
+# 3. Minimum-Cost Relaxation of Activity Windows
+# ============================================================
+def minimal_relaxation(model, x, activities, weights=None):
+    from gurobipy import GRB  # Only the relaxation needs gurobipy; quick_check is pure Python
+    weights = weights if weights is not None else RELAX_WEIGHTS
+    start = time.time()
+
+    relax = model.copy()
+    relax.setParam('OutputFlag', 0)
+    relax_vars = []
+    penalties = []
+    indices = []
+    for i, a in enumerate(activities):
+        w = weights.get(a['type'])
+        if w is None:
+            continue
+        relax_vars.append(relax.getVarByName(x[i].VarName))
+        penalties.append(w)
+        indices.append(i)
+
+    # Weighted sum of bound violations (relaxobjtype 0), no second phase on the original objective
+    relax.feasRelax(0, False, relax_vars, penalties, penalties, None, None)
+    relax.optimize()
+
+    if relax.status != GRB.OPTIMAL:
+        return {'status': 'no_relaxation', 'changes': [], 'cost': None,
+                'runtime': time.time() - start}
+
+    changes = []
+    for i, var in zip(indices, relax_vars):
+        a = activities[i]
+        value = var.X
+        if value < a['l'] - 1e-6 or value > a['u'] + 1e-6:
+            new_l = min(a['l'], math.floor(value + 1e-6))
+            new_u = max(a['u'], math.ceil(value - 1e-6))
+            changes.append({
+                'activity': i,
+                'type': a['type'],
+                'from': a['from'],
+                'to': a['to'],
+                'old': (a['l'], a['u']),
+                'new': (new_l, new_u),
+                'value': value
+            })
+
+    return {'status': 'relaxed', 'changes': changes, 'cost': relax.objVal,
+            'runtime': time.time() - start}
+
+
+# ============================================================
+# 4. Reporting
+# ============================================================
+def print_conflict(result, activities):
+    print("\n" + "=" * 60)
+    print(f"INFEASIBILITY DIAGNOSIS ({result['runtime'] * 1000:.1f} ms)")
+    print("=" * 60)
+    if 'reason' in result:
+        print(f"Reason: {result['reason']}")
+    print(f"Conflicting activities: {len(result['conflict'])}")
+    print(f"{'Idx':<5} {'Type':<13} {'From':<28} {'To':<28} {'[l, u]':<10}")
+    print("-" * 86)
+    for i in result['conflict']:
+        a = activities[i]
+        print(f"{i:<5} {a['type']:<13} {str(a['from']):<28} {str(a['to']):<28} [{a['l']}, {a['u']}]")
+    for event in result.get('fixed_conflict', []):
+        print(f"{'--':<5} {'fixed':<13} {str(event):<28}")
+    for name in result.get('other_constraints', []):
+        print(f"{'--':<5} {'constraint':<13} {name:<28}")
+
+
+def print_relaxation(result):
+    print("\n" + "-" * 60)
+    print("MINIMUM-COST RELAXATION OF ACTIVITY WINDOWS")
+    print("-" * 60)
+    if result['status'] != 'relaxed':
+        print("No relaxation of the relaxable activities restores feasibility")
+        return
+    print(f"Total weighted relaxation: {result['cost']:.1f} ({result['runtime']:.3f} s)")
+    for c in result['changes']:
+        print(f"  {c['type']:<13} {str(c['from']):<28} -> {str(c['to']):<28} "
+              f"[{c['old'][0]}, {c['old'][1]}] => [{c['new'][0]}, {c['new'][1]}]")
+
+
+# Full diagnosis of an infeasible model: IIS followed by the cheapest bound relaxation
+def diagnose(model, x, activities, weights=None):
+    iis = compute_iis(model, x, activities)
+    print_conflict(iis, activities)
+    relaxation = minimal_relaxation(model, x, activities, weights)
+    print_relaxation(relaxation)
+    return iis, relaxation
@@ -0,0 +1,216 @@
+"""
+Large Neighbourhood Search for PESP: re-optimise the events of a few lines or one station area
+Starting from any feasible timetable, a neighbourhood frees a subset of the event tuples
+(line, direction, station, type) and fixes all others at their current times. Only activities
+touching a freed event remain, so the sub-MIP is a small PESP instance for pesp.build_model.
+Each round evaluates several neighbourhoods in a process pool from the same incumbent, accepts
+the best improvement and updates adaptive selection weights from recent success
+"""
+
+import itertools
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pesp
+
+
+# ============================================================
+# 1. Neighbourhoods (sets of event tuples)
+# ============================================================
+# ('lines', (l1, l2)): both directions of the given lines; ('station', s): all events at s
+def neighbourhoods(instance, line_groups=2, min_station_events=4):
+    lines = sorted(instance['lines'])
+    result = []
+    for size in range(1, line_groups + 1):
+        result += [('lines', group) for group in itertools.combinations(lines, size)]
+    counts = {}
+    for e in instance['events']:
+        counts[e[2]] = counts.get(e[2], 0) + 1
+    result += [('station', s) for s in sorted(counts) if counts[s] >= min_station_events]
+    return result
+
+
+def free_events(instance, neighbourhood):
+    kind, key = neighbourhood
+    if kind == 'lines':
+        return {e for e in instance['events'] if e[0] in key}
+    if kind == 'station':
+        return {e for e in instance['events'] if e[2] == key}
+    raise ValueError(f"Unknown neighbourhood: {kind}")
+
+
+def describe(neighbourhood):
+    kind, key = neighbourhood
+    return f"lines {'+'.join(map(str, key))}" if kind == 'lines' else f"station {key}"
+
+
+# ============================================================
+# 2. Sub-Instance and Sub-MIP
+# ============================================================
+# Activities between two fixed events are constants; events adjacent to the freed set are kept
+# as fixed events at their current times
+def sub_instance(instance, times, free):
+    activities = [a for a in instance['activities'] if a['from'] in free or a['to'] in free]
+    events = set(free)
+    for a in activities:
+        events.update((a['from'], a['to']))
+    events = [e for e in instance['events'] if e in events]
+    fixed = {e: times[e] for e in events if e not in free}
+    fixed.update({e: v for e, v in instance['fixed'].items() if e in free})
+    return dict(instance, events=events, event_idx={e: k for k, e in enumerate(events)},
+                activities=activities, fixed=fixed)
+
+
+def solve_neighbourhood(instance, times, neighbourhood, time_limit=None):
+    start = time.time()
+    free = free_events(instance, neighbourhood)
+    sub = sub_instance(instance, times, free)
+    model, pi, x, p = pesp.build_model(sub, name="PESP_LNS")
+    model.setParam('Threads', 1)
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    for e in sub['events']:
+        pi[e].Start = times[e]
+    model.optimize()
+
+    result = {'neighbourhood': neighbourhood, 'status': model.status, 'times': None,
+              'objective': None, 'free': len(free), 'activities': len(sub['activities'])}
+    if model.SolCount > 0:
+        new_times = dict(times)
+        new_times.update(pesp.event_times(pi, instance['T']))
+        result['times'] = new_times
+        result['objective'] = pesp.objective_value(instance, new_times)
+    result['runtime'] = time.time() - start
+    return result
+
+
+# ============================================================
+# 3. Start Timetable
+# ============================================================
+# First feasible MIP solution (SolutionLimit 1): a cheap, usually poor start
+def initial_timetable(instance, time_limit=None):
+    model, pi, x, p = pesp.build_model(instance, name="PESP_LNS_Start")
+    model.setParam('SolutionLimit', 1)
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    model.optimize()
+    if model.SolCount == 0:
+        return None
+    return pesp.event_times(pi, instance['T'])
+
+
+def is_feasible(instance, times):
+    durations = pesp.activity_durations(instance, times)
+    return (all(d <= a['u'] for d, a in zip(durations, instance['activities'])) and
+            all(times[e] == v % instance['T'] for e, v in instance['fixed'].items()))
+
+
+# ============================================================
+# 4. Adaptive Selection
+# ============================================================
+# Roulette wheel without replacement on the weights; after a round each evaluated neighbourhood
+# moves towards its reward (2 if accepted, 1 if it improved, 0 otherwise) at rate `reaction`
+def select(weights, k, rng):
+    pool = list(weights)
+    chosen = []
+    for _ in range(min(k, len(pool))):
+        total = sum(weights[n] for n in pool)
+        r = rng.uniform(0, total)
+        for n in pool:
+            r -= weights[n]
+            if r <= 0:
+                break
+        chosen.append(n)
+        pool.remove(n)
+    return chosen
+
+
+def update_weights(weights, results, accepted, incumbent, reaction=0.3, min_weight=0.05):
+    for res in results:
+        n = res['neighbourhood']
+        if n == accepted:
+            reward = 2.0
+        elif res['objective'] is not None and res['objective'] < incumbent:
+            reward = 1.0
+        else:
+            reward = 0.0
+        weights[n] = max(min_weight, (1 - reaction) * weights[n] + reaction * reward)
+
+
+# ============================================================
+# 5. LNS Driver
+# ============================================================
+def lns(instance, times=None, workers=4, max_rounds=50, patience=5, time_limit=60,
+        sub_time_limit=10, line_groups=2, seed=0):
+    start = time.time()
+    rng = random.Random(seed)
+    if times is None:
+        times = initial_timetable(instance, time_limit)
+        if times is None:
+            return {'status': 'no start', 'runtime': time.time() - start}
+    if not is_feasible(instance, times):
+        raise ValueError("LNS needs a feasible start timetable")
+
+    weights = {n: 1.0 for n in neighbourhoods(instance, line_groups)}
+    objective = pesp.objective_value(instance, times)
+    history = [{'round': 0, 'objective': objective, 'accepted': None, 'time': time.time() - start}]
+    idle = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for round_ in range(1, max_rounds + 1):
+            remaining = time_limit - (time.time() - start)
+            if remaining <= 0 or idle >= patience:
+                break
+            batch = select(weights, workers, rng)
+            futures = [pool.submit(solve_neighbourhood, instance, times, n, min(sub_time_limit, remaining))
+                       for n in batch]
+            results = [f.result() for f in futures]
+
+            improving = [r for r in results if r['objective'] is not None and r['objective'] < objective]
+            best = min(improving, key=lambda r: r['objective']) if improving else None
+            update_weights(weights, results, best['neighbourhood'] if best else None, objective)
+            if best is not None:
+                times, objective = best['times'], best['objective']
+                idle = 0
+            else:
+                idle += 1
+            history.append({'round': round_, 'objective': objective,
+                            'accepted': best['neighbourhood'] if best else None,
+                            'evaluated': batch, 'time': time.time() - start})
+
+    return {
+        'status': 'feasible',
+        'objective': objective,
+        'times': times,
+        'history': history,
+        'weights': weights,
+        'runtime': time.time() - start
+    }
+
+
+def print_lns(result, top=6):
+    print(f"Objective {result['history'][0]['objective']} -> {result['objective']} in "
+          f"{len(result['history']) - 1} rounds, {result['runtime']:.2f} s")
+    for h in result['history'][1:]:
+        accepted = describe(h['accepted']) if h['accepted'] else '-'
+        print(f"  Round {h['round']:<3} {h['time']:7.2f} s  objective {h['objective']:<5} accepted {accepted}")
+    ranked = sorted(result['weights'].items(), key=lambda kv: -kv[1])[:top]
+    print("Highest weights: " + ", ".join(f"{describe(n)} {w:.2f}" for n, w in ranked))
+
+
+# ============================================================
+# 6. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    for variant in ['basic', 'extended']:
+        instance = pesp.build_instance(variant)
+        print("\n" + "=" * 60)
+        print(f"LNS: {variant} instance ({len(neighbourhoods(instance))} neighbourhoods)")
+        print("=" * 60)
+        result = lns(instance)
+        if result['status'] != 'feasible':
+            print(f"No start timetable. Status: {result['status']}")
+            continue
+        print_lns(result)
+        full = pesp.solve(instance)
+        print(f"Full MIP: objective {full['objective']:.0f} in {full['runtime']:.3f} s")
@@ -0,0 +1,242 @@
+"""
+PESP as SAT: order encoding of the event times mod T, solved incrementally with a local SAT
+solver (python-sat, optional dependency: pip install python-sat)
+v[e][k] <=> pi_e >= k. An activity forbids, for each value a of pi_i, the values of pi_j
+outside the cyclic window [a + l, a + u]; the slack of objective activities is order-encoded
+as well and summed with an incremental totalizer. The objective bound is tightened with
+assumptions on the totalizer outputs, so one solver keeps its learned clauses across steps
+"""
+
+import threading
+import time
+import pesp
+
+try:
+    from pysat.card import ITotalizer
+    from pysat.solvers import Solver
+except ImportError:
+    ITotalizer = Solver = None
+
+# Gurobi's status codes, so SAT and MIP results compare without importing gurobipy
+OPTIMAL, INFEASIBLE, TIME_LIMIT, SOLUTION_LIMIT = 2, 3, 9, 10
+
+
+# ============================================================
+# 1. Order Encoding
+# ============================================================
+# Literals are DIMACS integers or the constants True / False
+def neg(lit):
+    return (not lit) if isinstance(lit, bool) else -lit
+
+
+class OrderEncoding:
+    def __init__(self, instance):
+        self.T = instance['T']
+        self.clauses = []
+        self.top = 0
+        self.order = {e: [None] + [self.new_var() for _ in range(self.T - 1)] for e in instance['events']}
+        for lits in self.order.values():
+            for k in range(1, self.T - 1):
+                self.clauses.append([-lits[k + 1], lits[k]])  # pi >= k+1 -> pi >= k
+
+    def new_var(self):
+        self.top += 1
+        return self.top
+
+    # Literal for pi_e >= k (True / False for the constant ends)
+    def geq(self, e, k):
+        if k <= 0:
+            return True
+        if k >= self.T:
+            return False
+        return self.order[e][k]
+
+    # Literals whose disjunction says pi_e != a
+    def not_equal(self, e, a):
+        return [neg(self.geq(e, a)), self.geq(e, a + 1)]
+
+    def add(self, literals):
+        clause = []
+        for lit in literals:
+            if lit is True:
+                return
+            if lit is False:
+                continue
+            clause.append(lit)
+        self.clauses.append(clause)
+
+    # Disjunction stating pi_e lies in the cyclic interval [s, s + width] (mod T)
+    def in_window(self, e, s, width):
+        s %= self.T
+        end = s + width
+        if end < self.T:
+            return [[self.geq(e, s)], [neg(self.geq(e, end + 1))]]   # Both must hold
+        return [[self.geq(e, s), neg(self.geq(e, end - self.T + 1))]]  # Wraps: one must hold
+
+    def activity(self, a):
+        width = a['u'] - a['l']
+        if width >= self.T - 1:
+            return
+        for value in range(self.T):
+            guard = self.not_equal(a['from'], value)
+            for part in self.in_window(a['to'], value + a['l'], width):
+                self.add(guard + part)
+
+    # Unary slack w[k] <=> (pi_j - pi_i - l) mod T >= k; only the direction the bound needs
+    def slack(self, a):
+        width = min(a['u'] - a['l'], self.T - 1)
+        w = [None] + [self.new_var() for _ in range(width)]
+        for k in range(1, width):
+            self.clauses.append([-w[k + 1], w[k]])
+        for value in range(self.T):
+            guard = self.not_equal(a['from'], value)
+            for k in range(1, width + 1):
+                # pi_j in [value + l + k, value + u] -> w[k]
+                start = (value + a['l'] + k) % self.T
+                end = start + width - k
+                if end < self.T:
+                    self.add(guard + [neg(self.geq(a['to'], start)), self.geq(a['to'], end + 1), w[k]])
+                else:
+                    self.add(guard + [neg(self.geq(a['to'], start)), w[k]])
+                    self.add(guard + [self.geq(a['to'], end - self.T + 1), w[k]])
+        return w[1:]
+
+    def times(self, model):
+        true = {lit for lit in model if lit > 0}
+        return {e: sum(1 for lit in lits[1:] if lit in true) for e, lits in self.order.items()}
+
+
+# ============================================================
+# 2. Instance Encoding
+# ============================================================
+def encode(instance):
+    encoding = OrderEncoding(instance)
+    for a in instance['activities']:
+        encoding.activity(a)
+    for event, value in instance['fixed'].items():
+        encoding.add([encoding.geq(event, value)])
+        encoding.add([neg(encoding.geq(event, value + 1))])
+
+    slack = []
+    constant = 0
+    for a in instance['activities']:
+        if a['type'] in instance['objective']:
+            slack += encoding.slack(a)
+            constant += a['l']
+    return encoding, slack, constant
+
+
+# ============================================================
+# 3. Incremental Solve with Objective Bounds
+# ============================================================
+# Each SAT answer gives a timetable of cost C; the next call assumes sum(slack) <= C - 1 - constant
+# on the same solver. UNSAT under an assumption proves the last timetable optimal, UNSAT
+# without assumptions proves the instance infeasible. Glucose by default: CaDiCaL cannot be
+# interrupted, so time_limit would not apply
+def solve(instance, time_limit=None, solver_name='glucose4', optimize=True):
+    if Solver is None:
+        raise ImportError("pesp_sat needs python-sat: pip install python-sat")
+    start = time.time()
+    encoding, slack, constant = encode(instance)
+    totalizer = ITotalizer(lits=slack, ubound=len(slack), top_id=encoding.top) if slack else None
+
+    solver = Solver(name=solver_name, bootstrap_with=encoding.clauses)
+    if totalizer is not None:
+        solver.append_formula(totalizer.cnf.clauses)
+    timer = None
+    if time_limit is not None:
+        timer = threading.Timer(time_limit, solver.interrupt)
+        timer.start()
+
+    result = {'status': TIME_LIMIT, 'objective': None, 'times': None, 'steps': [],
+              'variables': solver.nof_vars(), 'clauses': solver.nof_clauses()}
+    assumptions = []
+    try:
+        while True:
+            answer = solver.solve_limited(assumptions=assumptions, expect_interrupt=True)
+            if answer is None:
+                break
+            if not answer:
+                result['status'] = OPTIMAL if result['times'] is not None else INFEASIBLE
+                break
+            times = encoding.times(solver.get_model())
+            result['times'] = times
+            result['objective'] = pesp.objective_value(instance, times)
+            result['steps'].append((time.time() - start, result['objective']))
+            bound = result['objective'] - constant - 1
+            if not optimize or bound < 0:
+                result['status'] = OPTIMAL if bound < 0 else SOLUTION_LIMIT
+                break
+            assumptions = [-totalizer.rhs[bound]]
+    finally:
+        if timer is not None:
+            timer.cancel()
+        solver.delete()
+        if totalizer is not None:
+            totalizer.delete()
+    result['runtime'] = time.time() - start
+    return result
+
+
+# ============================================================
+# 4. Benchmark against the MIP
+# ============================================================
+STATUS = {OPTIMAL: 'optimal', INFEASIBLE: 'infeasible', TIME_LIMIT: 'time limit',
+          SOLUTION_LIMIT: 'feasible'}
+
+
+# Tighter headways at all headway activities (feasibility stress test)
+def with_headway(instance, h):
+    activities = [dict(a, l=h, u=instance['T'] - h) if a['type'] == 'headway' else a
+                  for a in instance['activities']]
+    return dict(instance, activities=activities, name=f"{instance['name']}_h{h}")
+
+
+def benchmark(instances, time_limit=60):
+    rows = []
+    for instance in instances:
+        for mode in ['mip', 'sat']:
+            for optimize in [False, True]:
+                if mode == 'mip':
+                    model, pi, x, p = pesp.build_model(instance)
+                    model.setParam('TimeLimit', time_limit)
+                    if not optimize:
+                        model.setParam('SolutionLimit', 1)
+                    start = time.time()
+                    model.optimize()
+                    runtime = time.time() - start
+                    status = model.status
+                    objective = model.objVal if model.SolCount > 0 else None
+                else:
+                    result = solve(instance, time_limit, optimize=optimize)
+                    runtime, status, objective = result['runtime'], result['status'], result['objective']
+                rows.append({'instance': instance['name'], 'mode': mode,
+                             'task': 'optimize' if optimize else 'feasibility',
+                             'status': STATUS.get(status, status), 'objective': objective, 'runtime': runtime})
+    return rows
+
+
+def print_benchmark(rows):
+    print(f"\n{'Instance':<14} {'Task':<12} {'Mode':<5} {'Status':<11} {'Objective':>9} {'Time (s)':>9}")
+    for r in rows:
+        objective = '-' if r['objective'] is None else f"{r['objective']:.0f}"
+        print(f"{r['instance']:<14} {r['task']:<12} {r['mode']:<5} {r['status']:<11} {objective:>9} {r['runtime']:>9.3f}")
+
+
+# ============================================================
+# 5. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    basic = pesp.build_instance('basic')
+    extended = pesp.build_instance('extended')
+    instances = [basic, extended] + [with_headway(basic, h) for h in (5, 6, 7)]
+
+    result = solve(basic)
+    print("=" * 60)
+    print(f"PESP AS SAT: basic instance ({result['variables']} variables, {result['clauses']} clauses)")
+    print("=" * 60)
+    for elapsed, objective in result['steps']:
+        print(f"  {elapsed:7.3f} s  objective {objective}")
+    print(f"Status: {STATUS.get(result['status'])}, {result['runtime']:.3f} s")
+
+    print_benchmark(benchmark(instances))
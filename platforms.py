@@ -0,0 +1,219 @@
+"""
+Platform Occupation at Hubs: periodic occupation intervals per station, platform assignment
+by a sweep line, conflict report and optional feedback of conflicting pairs as PESP activities
+"""
+
+import heapq
+import time
+import pesp
+
+# Platforms per station; stations not listed get DEFAULT_PLATFORMS
+PLATFORMS = {'Ut': 4, 'Asd': 3, 'Ehv': 3}
+DEFAULT_PLATFORMS = 2
+
+
+# ============================================================
+# 1. Periodic Occupation Intervals
+# ============================================================
+# Interval = train standing at a platform: arrival -> departure at intermediate stops,
+# terminal_dwell minutes before the first departure / after the last arrival at terminals.
+# Start/end are (event, offset) so conflicting pairs can be turned into PESP activities.
+def occupation_intervals(instance, times, terminal_dwell=5, stations=None):
+    T = instance['T']
+    intervals = {}
+    for line in instance['lines']:
+        for direction in pesp.DIRECTIONS:
+            route = pesp.route_of(instance['lines'], line, direction)
+            for k, station in enumerate(route):
+                if stations is not None and station not in stations:
+                    continue
+                arr = (line, direction, station, 'arr')
+                dep = (line, direction, station, 'dep')
+                if k == 0:
+                    start, end = (dep, -terminal_dwell), (dep, 0)
+                elif k == len(route) - 1:
+                    start, end = (arr, 0), (arr, terminal_dwell)
+                else:
+                    start, end = (arr, 0), (dep, 0)
+                t_start = (times[start[0]] + start[1]) % T
+                t_end = times[end[0]] + end[1]
+                length = (t_end - times[start[0]] - start[1]) % T
+                intervals.setdefault(station, []).append({
+                    'label': (line, direction, station),
+                    'start_event': start,
+                    'end_event': end,
+                    'start': t_start,
+                    'length': length
+                })
+    return intervals
+
+
+# ============================================================
+# 2. Sweep-Line Platform Assignment
+# ============================================================
+# Cut the circle where the fewest intervals are open, give the intervals across the cut their
+# own platform, and assign the rest greedily by start time (interval partitioning); O(n log n)
+def assign_platforms(intervals, n_platforms, T, clearance=0):
+    n = len(intervals)
+    if n == 0:
+        return [], []
+    occupied = [min(T, max(1, iv['length'] + clearance)) for iv in intervals]
+
+    # Open intervals at each start point via a circular sweep
+    points = []
+    for k, iv in enumerate(intervals):
+        points.append((iv['start'], 1))
+        points.append(((iv['start'] + occupied[k]) % T, -1))
+    points.sort(key=lambda p: (p[0], p[1]))
+    wrapping = sum(1 for k, iv in enumerate(intervals) if iv['start'] + occupied[k] >= T)
+    load, best_load, cut = wrapping, None, 0
+    for t, change in points:
+        load += change
+        if change == 1 and (best_load is None or load - 1 < best_load):
+            best_load, cut = load - 1, t  # Intervals open just before this start
+
+    # Linearize from the cut
+    order = []
+    for k, iv in enumerate(intervals):
+        s = (iv['start'] - cut) % T
+        order.append((s, s + occupied[k], k))
+    order.sort()
+
+    assignment = [None] * n
+    conflicts = []
+    free = []       # (free from, platform, must be empty again at)
+    busy = {}       # platform -> interval currently standing there
+    n_used = 0
+    for s, e, k in order:
+        if e > T:   # Across the cut: needs its own platform for the whole sweep
+            if n_used < n_platforms:
+                assignment[k] = n_used
+                heapq.heappush(free, (e - T, n_used, s))
+                busy[n_used] = k
+                n_used += 1
+            else:
+                conflicts.append((k, list(busy.values())))
+    for s, e, k in order:
+        if e > T:
+            continue
+        # Free platforms whose next occupation (across the cut) leaves room for this interval
+        skipped = []
+        chosen = None
+        while free and free[0][0] <= s:
+            item = heapq.heappop(free)
+            if e <= item[2]:
+                chosen = item
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(free, item)
+
+        if chosen is not None:
+            platform = chosen[1]
+            heapq.heappush(free, (e, platform, chosen[2]))
+        elif n_used < n_platforms:
+            platform = n_used
+            n_used += 1
+            heapq.heappush(free, (e, platform, T))
+        else:
+            blocking = [busy[f[1]] for f in free if f[0] > s and f[1] in busy]
+            conflicts.append((k, blocking))
+            continue
+        assignment[k] = platform
+        busy[platform] = k
+    return assignment, conflicts
+
+
+def check_stations(instance, times, platforms=None, terminal_dwell=5, clearance=0, hubs_only=True):
+    platforms = platforms if platforms is not None else PLATFORMS
+    start = time.time()
+    intervals = occupation_intervals(instance, times, terminal_dwell)
+    report = {}
+    for station, ivs in intervals.items():
+        if hubs_only and len({iv['label'][0] for iv in ivs}) < 2:
+            continue
+        n_platforms = platforms.get(station, DEFAULT_PLATFORMS)
+        assignment, conflicts = assign_platforms(ivs, n_platforms, instance['T'], clearance)
+        report[station] = {
+            'intervals': ivs,
+            'platforms': n_platforms,
+            'assignment': assignment,
+            'conflicts': [(ivs[k], [ivs[b] for b in blocking]) for k, blocking in conflicts]
+        }
+    return report, time.time() - start
+
+
+# ============================================================
+# 3. Feedback as PESP Activities
+# ============================================================
+# Disjoint platform use of A then B: B starts at least `clearance` after A ends and A
+# starts again (one period later) at least `clearance` after B ends
+def separation_activity(a, b, T, clearance=0):
+    (a_end, a_off), (b_start, b_off) = a['end_event'], b['start_event']
+    l = clearance + a_off - b_off
+    u = T - a['length'] - b['length'] - clearance + a_off - b_off
+    if u < l:
+        return None
+    return {'type': 'platform', 'from': a_end, 'to': b_start, 'l': l, 'u': u}
+
+
+def platform_activities(report, T, clearance=0):
+    activities = []
+    for station, r in report.items():
+        for iv, blocking in r['conflicts']:
+            for other in blocking:
+                a = separation_activity(other, iv, T, clearance)
+                if a is not None:
+                    activities.append(a)
+                    break
+    return activities
+
+
+# Re-solve the PESP with separation activities until every hub fits its platforms
+def solve_with_platforms(instance, platforms=None, max_rounds=10, terminal_dwell=5, clearance=0):
+    instance = dict(instance, activities=list(instance['activities']))
+    history = []
+    for round_ in range(max_rounds):
+        result = pesp.solve(instance)
+        if result['times'] is None:
+            return {'status': result['status'], 'instance': instance, 'history': history}
+        report, check_time = check_stations(instance, result['times'], platforms,
+                                            terminal_dwell, clearance)
+        n_conflicts = sum(len(r['conflicts']) for r in report.values())
+        history.append({'round': round_, 'objective': result['objective'],
+                        'conflicts': n_conflicts, 'check_time': check_time})
+        if n_conflicts == 0:
+            return {'status': 'ok', 'times': result['times'], 'report': report,
+                    'instance': instance, 'history': history}
+        added = platform_activities(report, instance['T'], clearance)
+        if not added:
+            break
+        instance['activities'] += added
+    return {'status': 'conflicts_remain', 'instance': instance, 'history': history}
+
+
+def print_report(report):
+    for station, r in sorted(report.items()):
+        used = len({p for p in r['assignment'] if p is not None})
+        print(f"\n{station}: {len(r['intervals'])} occupations, {used}/{r['platforms']} platforms, "
+              f"{len(r['conflicts'])} conflicts")
+        for iv, p in sorted(zip(r['intervals'], r['assignment']), key=lambda z: z[0]['start']):
+            line, direction, _ = iv['label']
+            platform = '--' if p is None else p + 1
+            print(f"  {line:<6} {direction:<6} {iv['start']:>3} +{iv['length']:<3} platform {platform}")
+
+
+# ============================================================
+# 4. Run on the A2 Instance
+# ============================================================
+if __name__ == "__main__":
+    instance = pesp.build_instance('basic')
+    result = solve_with_platforms(instance, platforms={'Ut': 2, 'Asd': 2, 'Ehv': 2})
+    print("\n" + "=" * 60)
+    print(f"PLATFORM CHECK: {result['status']}")
+    print("=" * 60)
+    for h in result['history']:
+        print(f"  Round {h['round']}: objective {h['objective']:.0f}, conflicts {h['conflicts']}, "
+              f"check {h['check_time'] * 1000:.2f} ms")
+    if 'report' in result:
+        print_report(result['report'])
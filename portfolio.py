@@ -0,0 +1,339 @@
+"""
+Concurrent Solver Portfolio: race MIP formulations and heuristics in separate processes
+Improving incumbents are collected by a coordinator and passed to every other strategy
+(injected into running MIPs as solutions); all stop at the target gap or the time limit
+"""
+
+import multiprocessing as mp
+import queue
+import time
+from gurobipy import GRB
+import pesp
+import pesp_cuts
+import pesp_diagnosis
+import rolling_stock as rs
+import rolling_stock_lagrangian as lagrangian
+
+PESP_STRATEGIES = ['mip', 'mip_cuts', 'mip_feasibility', 'local_search']
+ROLLING_STOCK_STRATEGIES = ['basic', 'composition', 'lagrangian']
+
+
+# ============================================================
+# 1. Solution Conversion (timetable / composition per train <-> model variables)
+# ============================================================
+def pesp_solution_values(instance, times, pi, x, p):
+    T = instance['T']
+    durations = pesp.activity_durations(instance, times)
+    values = {pi[e]: times[e] for e in instance['events']}
+    for i, a in enumerate(instance['activities']):
+        values[x[i]] = durations[i]
+        values[p[i]] = (durations[i] - times[a['to']] + times[a['from']]) // T
+    return values
+
+
+def rolling_stock_solution_values(assignment, N=None, X=None, train_compositions=None):
+    values = {}
+    for t, (n3, n4) in assignment.items():
+        if N is not None:
+            values[N['PL3', t]] = n3
+            values[N['PL4', t]] = n4
+        else:
+            for p in train_compositions[t]:
+                values[X[t, p['id']]] = 1 if (p['n_PL3'], p['n_PL4']) == (n3, n4) else 0
+    return values
+
+
+# ============================================================
+# 2. MIP Strategies with Incumbent Exchange
+# ============================================================
+# Callback: report own incumbents and bounds, inject better incumbents from the pool, obey stop
+def exchange_callback(name, outbox, inbox, stop, to_values, from_model):
+    state = {'best': float('inf'), 'pending': None, 'last_bound': 0.0}
+
+    def callback(model, where):
+        if stop.is_set():
+            model.terminate()
+            return
+        if where == GRB.Callback.MIPSOL:
+            obj = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+            if obj < state['best'] - 1e-9:
+                state['best'] = obj
+                outbox.put(('incumbent', name, obj, from_model(model)))
+        elif where == GRB.Callback.MIP:
+            now = time.time()
+            if now - state['last_bound'] > 0.2:
+                state['last_bound'] = now
+                outbox.put(('bound', name, model.cbGet(GRB.Callback.MIP_OBJBND)))
+        elif where == GRB.Callback.MIPNODE:
+            while True:
+                try:
+                    obj, solution = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if obj < state['best'] - 1e-9:
+                    state['best'] = obj
+                    state['pending'] = solution
+            if state['pending'] is not None:
+                values = to_values(state['pending'])
+                model.cbSetSolution(list(values), list(values.values()))
+                model.cbUseSolution()
+                state['pending'] = None
+
+    return callback
+
+
+def run_pesp_mip(strategy, instance, outbox, inbox, stop, time_limit):
+    model, pi, x, p = pesp.build_model(instance, name=f"PESP_{strategy}")
+    model.setParam('TimeLimit', time_limit)
+    model.setParam('Threads', 1)
+    if strategy == 'mip_feasibility':
+        model.setParam('MIPFocus', 1)
+
+    def to_values(times):
+        return pesp_solution_values(instance, times, pi, x, p)
+
+    def from_model(m):
+        values = m.cbGetSolution([pi[e] for e in instance['events']])
+        return {e: int(round(v)) % instance['T'] for e, v in zip(instance['events'], values)}
+
+    exchange = exchange_callback(strategy, outbox, inbox, stop, to_values, from_model)
+    if strategy == 'mip_cuts':
+        model.setParam('PreCrush', 1)
+        stats = {'cuts': {}, 'rounds': 0, 'separation_time': 0.0, 'root_bound': None}
+        separation = pesp_cuts.make_callback(instance, x, p, stats)
+
+        def callback(m, where):
+            exchange(m, where)
+            separation(m, where)
+    else:
+        callback = exchange
+
+    model.optimize(callback)
+    outbox.put(('bound', strategy, model.ObjBound))
+    return model.status
+
+
+def run_rolling_stock_mip(strategy, trains, train_info, outbox, inbox, stop, time_limit):
+    if strategy == 'basic':
+        model, N = rs.build_basic_model(trains, train_info)
+        X = train_compositions = None
+    else:
+        model, X, train_compositions = rs.build_composition_model(trains, train_info)
+        N = None
+    model.setParam('TimeLimit', time_limit)
+    model.setParam('Threads', 1)
+
+    def to_values(assignment):
+        return rolling_stock_solution_values(assignment, N, X, train_compositions)
+
+    def from_model(m):
+        assignment = {}
+        for t in trains:
+            if N is not None:
+                n3, n4 = m.cbGetSolution([N['PL3', t], N['PL4', t]])
+                assignment[t] = (int(round(n3)), int(round(n4)))
+            else:
+                values = m.cbGetSolution([X[t, p['id']] for p in train_compositions[t]])
+                for p, v in zip(train_compositions[t], values):
+                    if v > 0.5:
+                        assignment[t] = (p['n_PL3'], p['n_PL4'])
+        return assignment
+
+    model.optimize(exchange_callback(strategy, outbox, inbox, stop, to_values, from_model))
+    outbox.put(('bound', strategy, model.ObjBound))
+    return model.status
+
+
+# ============================================================
+# 3. Heuristic Strategies
+# ============================================================
+# Local search on a PESP timetable: shift a whole line/direction, or the remainder of a trip
+# from one departure onwards (changes one dwell), by every delta in 1..T-1
+def pesp_moves(instance):
+    moves = []
+    fixed = set(instance['fixed'])
+    for line in instance['lines']:
+        for direction in pesp.DIRECTIONS:
+            route = pesp.route_of(instance['lines'], line, direction)
+            trip = [e for e in instance['events'] if e[0] == line and e[1] == direction]
+            trip.sort(key=lambda e: (route.index(e[2]), e[3] == 'dep'))
+            for k, e in enumerate(trip):
+                if k == 0 or e[3] == 'dep':
+                    block = trip[k:]
+                    if not fixed.intersection(block):
+                        moves.append(block)
+    return moves
+
+
+def local_search(instance, times, stop=None, max_passes=50):
+    T = instance['T']
+    activities = instance['activities']
+    incident = {e: [] for e in instance['events']}
+    for i, a in enumerate(activities):
+        incident[a['from']].append(i)
+        incident[a['to']].append(i)
+
+    def cost(i, t):
+        a = activities[i]
+        d = a['l'] + (t[a['to']] - t[a['from']] - a['l']) % T
+        if d > a['u']:
+            return None
+        return d if a['type'] in instance['objective'] else 0
+
+    times = dict(times)
+    moves = pesp_moves(instance)
+    for _ in range(max_passes):
+        improved = False
+        for block in moves:
+            if stop is not None and stop.is_set():
+                return times
+            touched = {i for e in block for i in incident[e]}
+            current = sum(cost(i, times) for i in touched)
+            best_delta, best_cost = None, current
+            for delta in range(1, T):
+                trial = dict(times)
+                for e in block:
+                    trial[e] = (times[e] + delta) % T
+                costs = [cost(i, trial) for i in touched]
+                if None not in costs and sum(costs) < best_cost:
+                    best_delta, best_cost = delta, sum(costs)
+            if best_delta is not None:
+                for e in block:
+                    times[e] = (times[e] + best_delta) % T
+                improved = True
+        if not improved:
+            break
+    return times
+
+
+def run_pesp_local_search(instance, outbox, inbox, stop):
+    best = float('inf')
+    check = pesp_diagnosis.quick_check(instance['events'], instance['activities'],
+                                       instance['T'], instance['fixed'])
+    start_times = check.get('potentials') if check['status'] == 'feasible' else None
+    while not stop.is_set():
+        if start_times is None:
+            try:
+                obj, start_times = inbox.get(timeout=0.1)
+                if obj >= best:
+                    start_times = None
+                    continue
+            except queue.Empty:
+                continue
+        times = local_search(instance, {e: int(round(t)) % instance['T'] for e, t in start_times.items()},
+                             stop)
+        obj = pesp.objective_value(instance, times)
+        if obj < best:
+            best = obj
+            outbox.put(('incumbent', 'local_search', obj, times))
+        start_times = None
+    return 'stopped'
+
+
+def run_lagrangian(trains, train_info, outbox):
+    result = lagrangian.solve_lagrangian(trains, train_info)
+    if result['status'] == 'feasible':
+        outbox.put(('incumbent', 'lagrangian', result['upper_bound'], result['assignment']))
+        outbox.put(('bound', 'lagrangian', result['lower_bound']))
+    return result['status']
+
+
+# ============================================================
+# 4. Worker Processes and Coordinator
+# ============================================================
+def worker(problem, strategy, data, outbox, inbox, stop, time_limit):
+    start = time.time()
+    try:
+        if problem == 'pesp' and strategy == 'local_search':
+            status = run_pesp_local_search(data, outbox, inbox, stop)
+        elif problem == 'pesp':
+            status = run_pesp_mip(strategy, data, outbox, inbox, stop, time_limit)
+        elif strategy == 'lagrangian':
+            status = run_lagrangian(data[0], data[1], outbox)
+        else:
+            status = run_rolling_stock_mip(strategy, data[0], data[1], outbox, inbox, stop, time_limit)
+    except Exception as exc:
+        status = f"error: {exc}"
+    outbox.put(('done', strategy, status, time.time() - start))
+
+
+# problem: 'pesp' (data = instance) or 'rolling_stock' (data = (trains, train_info))
+def run_portfolio(problem, data, strategies=None, time_limit=60, target_gap=1e-4):
+    strategies = strategies or (PESP_STRATEGIES if problem == 'pesp' else ROLLING_STOCK_STRATEGIES)
+    ctx = mp.get_context('spawn')
+    outbox = ctx.Queue()
+    stop = ctx.Event()
+    inboxes = {s: ctx.Queue() for s in strategies}
+    processes = [ctx.Process(target=worker, args=(problem, s, data, outbox, inboxes[s], stop, time_limit))
+                 for s in strategies]
+
+    start = time.time()
+    for proc in processes:
+        proc.start()
+
+    best = {'objective': float('inf'), 'solution': None, 'strategy': None, 'time': None}
+    bound = -float('inf')
+    trace = []
+    running = set(strategies)
+    while running and time.time() - start < time_limit:
+        try:
+            message = outbox.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        kind, name = message[0], message[1]
+        if kind == 'incumbent' and message[2] < best['objective'] - 1e-9:
+            best = {'objective': message[2], 'solution': message[3], 'strategy': name,
+                    'time': time.time() - start}
+            trace.append((best['time'], name, best['objective']))
+            for other, inbox in inboxes.items():
+                if other != name:
+                    inbox.put((message[2], message[3]))
+        elif kind == 'bound':
+            bound = max(bound, message[2])
+        elif kind == 'done':
+            running.discard(name)
+            trace.append((time.time() - start, name, message[2]))
+
+        if best['solution'] is not None and best['objective'] - bound <= target_gap * abs(best['objective']):
+            break
+
+    stop.set()
+    for proc in processes:
+        proc.join(timeout=5)
+        if proc.is_alive():
+            proc.terminate()
+
+    gap = (best['objective'] - bound) / abs(best['objective']) if best['solution'] is not None else None
+    return {
+        'objective': best['objective'] if best['solution'] is not None else None,
+        'solution': best['solution'],
+        'winner': best['strategy'],
+        'time_to_best': best['time'],
+        'bound': bound,
+        'gap': gap,
+        'trace': trace,
+        'runtime': time.time() - start
+    }
+
+
+def print_portfolio(title, result):
+    print("\n" + "=" * 60)
+    print(f"PORTFOLIO: {title}")
+    print("=" * 60)
+    print(f"Best objective: {result['objective']} by {result['winner']} after {result['time_to_best']}")
+    print(f"Bound: {result['bound']}, gap: {result['gap']}, runtime: {result['runtime']:.3f} s")
+    for t, name, value in result['trace']:
+        print(f"  {t:8.3f} s  {name:<16} {value}")
+
+
+# ============================================================
+# 5. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    instance = pesp.build_instance('basic')
+    print_portfolio("PESP (basic)", run_portfolio('pesp', instance, time_limit=30))
+
+    trains, train_info = rs.create_trains(rs.scale_cross_section(rs.cross_section, 20),
+                                          rs.read_seat_demand())
+    print_portfolio("Rolling stock (x20)", run_portfolio('rolling_stock', (trains, train_info),
+                                                         time_limit=30))
@@ -0,0 +1,305 @@
+"""
+Rolling Stock Scheduling: shared data and model builders (N_u,t and X_t,p formulations)
+Same parameters and models as Exercise 2.1c / 2.2c, importable as functions
+"""
+
+import time
+
+T = 30  # Period time
+
+# Rolling stock types
+U = ['PL3', 'PL4']
+
+# Unit parameters
+cost = {'PL3': 315000, 'PL4': 385000}  # Annual fixed cost (€)
+capacity = {'PL3': 400, 'PL4': 600}    # Seat capacity
+length = {'PL3': 80, 'PL4': 110}       # Length (m)
+
+lines_info = {
+    800: {'South': ['Amr', 'Asd', 'Ut', 'Ehv', 'Std', 'Mt'],
+          'North': ['Mt', 'Std', 'Ehv', 'Ut', 'Asd', 'Amr']},
+    3000: {'South': ['Hdr', 'Amr', 'Asd', 'Ut', 'Nm'],
+           'North': ['Nm', 'Ut', 'Asd', 'Amr', 'Hdr']},
+    3100: {'South': ['Shl', 'Ut', 'Nm'],
+           'North': ['Nm', 'Ut', 'Shl']},
+    3500: {'South': ['Shl', 'Ut', 'Ehv', 'Vl'],
+           'North': ['Vl', 'Ehv', 'Ut', 'Shl']},
+    3900: {'South': ['Ehv', 'Std', 'Hrl'],
+           'North': ['Hrl', 'Std', 'Ehv']}
+}
+
+# Trip durations from the reference (Table 7)
+durations = {
+    (800, 'South'): 181, (800, 'North'): 178,
+    (3000, 'South'): 159, (3000, 'North'): 156,
+    (3100, 'South'): 84, (3100, 'North'): 87,
+    (3500, 'South'): 121, (3500, 'North'): 124,
+    (3900, 'South'): 64, (3900, 'North'): 64,
+}
+
+# Cross-section trains from the reference (Table 7)
+cross_section = {
+    (800, 'South'): 6, (800, 'North'): 6,
+    (3000, 'South'): 6, (3000, 'North'): 5,
+    (3100, 'South'): 3, (3100, 'North'): 3,
+    (3500, 'South'): 4, (3500, 'North'): 4,
+    (3900, 'South'): 2, (3900, 'North'): 3,
+}
+
+
+# ============================================================
+# 1. Read Data
+# ============================================================
+# pandas and gurobipy are imported where used: trains and compositions need neither
+def read_seat_demand(path='a2_part2.xlsx'):
+    import pandas as pd
+    seats_df = pd.read_excel(path, sheet_name='Seats')
+    seats_df.columns = ['Line', 'Southbound', 'Northbound']
+    seats_df = seats_df.iloc[1:].reset_index(drop=True)  # Skip header row
+    seat_demand = {}
+    for _, row in seats_df.iterrows():
+        seat_demand[(int(row['Line']), 'South')] = int(row['Southbound'])
+        seat_demand[(int(row['Line']), 'North')] = int(row['Northbound'])
+    return seat_demand
+
+
+def read_timetable(path='a2_part2.xlsx'):
+    import pandas as pd
+    timetable_df = pd.read_excel(path, sheet_name='Timetable')
+    # Some cells carry trailing spaces (e.g. 'arr ')
+    timetable_df['Station'] = timetable_df['Station'].str.strip()
+    timetable_df['Type'] = timetable_df['Type'].str.strip()
+    return timetable_df
+
+
+# Departure minute (mod T) of each line/direction at its first station
+def first_departures(timetable_df):
+    first_dep = {}
+    for (line, direction), route in iter_routes():
+        rows = timetable_df[(timetable_df['Line'] == line) &
+                            (timetable_df['Direction'] == direction) &
+                            (timetable_df['Station'] == route[0]) &
+                            (timetable_df['Type'] == 'dep')]
+        if len(rows) > 0:
+            first_dep[(line, direction)] = int(rows.iloc[0]['Time']) % T
+    return first_dep
+
+
+def iter_routes():
+    for line, routes in lines_info.items():
+        for direction in ['South', 'North']:
+            yield (line, direction), routes[direction]
+
+
+def max_length(line):
+    return 200 if line == 3900 else 300
+
+
+# ============================================================
+# 2. Cross-Section Train Set
+# ============================================================
+# Each cross-section train is identified by (line, direction, index)
+def create_trains(cross_section, seat_demand):
+    trains = []
+    train_info = {}
+    for (line, direction), num_trains in cross_section.items():
+        for i in range(num_trains):
+            train_id = f"{line}_{direction}_{i+1}"
+            trains.append(train_id)
+            train_info[train_id] = {
+                'line': line,
+                'direction': direction,
+                'seat_demand': seat_demand[(line, direction)],
+                'max_length': max_length(line)
+            }
+    return trains, train_info
+
+
+# ============================================================
+# 3. Compositions
+# ============================================================
+# Compositions satisfying both the length limit and the seat requirement
+def generate_compositions(max_len, min_seats=0, max_pl3=4, max_pl4=3):
+    compositions = []
+    for n_pl3 in range(max_pl3 + 1):
+        for n_pl4 in range(max_pl4 + 1):
+            if n_pl3 == 0 and n_pl4 == 0:
+                continue
+            total_length = n_pl3 * length['PL3'] + n_pl4 * length['PL4']
+            total_capacity = n_pl3 * capacity['PL3'] + n_pl4 * capacity['PL4']
+            total_cost = n_pl3 * cost['PL3'] + n_pl4 * cost['PL4']
+            if total_length <= max_len and total_capacity >= min_seats:
+                compositions.append({
+                    'id': f"{n_pl3}PL3_{n_pl4}PL4",
+                    'n_PL3': n_pl3,
+                    'n_PL4': n_pl4,
+                    'length': total_length,
+                    'capacity': total_capacity,
+                    'cost': total_cost
+                })
+    return compositions
+
+
+def train_compositions_for(trains, train_info):
+    return {t: generate_compositions(train_info[t]['max_length'], train_info[t]['seat_demand'])
+            for t in trains}
+
+
+# ============================================================
+# 4. Model Builders
+# ============================================================
+# Basic model (N_u,t formulation); balance=None drops the fleet balance constraint
+def build_basic_model(trains, train_info, balance=1.25, name="RollingStock_Basic", env=None):
+    from gurobipy import Model, GRB, quicksum
+    model = Model(name, env=env)
+    model.setParam('OutputFlag', 0)
+
+    N = {}
+    for u in U:
+        for t in trains:
+            N[u, t] = model.addVar(vtype=GRB.INTEGER, lb=0, name=f"N_{u}_{t}")
+    model.update()
+
+    model.setObjective(quicksum(cost[u] * N[u, t] for u in U for t in trains), GRB.MINIMIZE)
+
+    for t in trains:
+        model.addConstr(
+            quicksum(capacity[u] * N[u, t] for u in U) >= train_info[t]['seat_demand'],
+            name=f"seats_{t}"
+        )
+        model.addConstr(
+            quicksum(length[u] * N[u, t] for u in U) <= train_info[t]['max_length'],
+            name=f"length_{t}"
+        )
+
+    if balance is not None:
+        total_PL3 = quicksum(N['PL3', t] for t in trains)
+        total_PL4 = quicksum(N['PL4', t] for t in trains)
+        model.addConstr(total_PL3 <= balance * total_PL4, name="balance_PL3")
+        model.addConstr(total_PL4 <= balance * total_PL3, name="balance_PL4")
+
+    return model, N
+
+
+# Trains the model cannot tell apart (same demand and length limit, hence the same P_t)
+def symmetry_classes(trains, train_info):
+    classes = {}
+    for t in trains:
+        key = (train_info[t]['seat_demand'], train_info[t]['max_length'])
+        classes.setdefault(key, []).append(t)
+    return list(classes.values())
+
+
+# Composition model (X_t,p formulation); seats and length are handled by preprocessing P_t
+# symmetry: None, 'lex' (ordered composition index within each class of identical trains),
+# 'aggregate' (one integer count per class and composition, i.e. one variable per orbit)
+# or 'orbital' (leave the model as is and let Gurobi apply aggressive orbital fixing)
+def build_composition_model(trains, train_info, balance=1.25, symmetry=None,
+                            name="RollingStock_Composition"):
+    from gurobipy import Model, GRB, quicksum
+    train_compositions = train_compositions_for(trains, train_info)
+
+    model = Model(name)
+    model.setParam('OutputFlag', 0)
+
+    if symmetry == 'aggregate':
+        # X[c,p] = number of trains of class c (keyed by its first train) using composition p
+        classes = symmetry_classes(trains, train_info)
+        members = {c[0]: c for c in classes}
+        X = {}
+        for rep, cls in members.items():
+            for p in train_compositions[rep]:
+                X[rep, p['id']] = model.addVar(vtype=GRB.INTEGER, lb=0, ub=len(cls),
+                                               name=f"X_{rep}_{p['id']}")
+        model.update()
+        for rep, cls in members.items():
+            model.addConstr(
+                quicksum(X[rep, p['id']] for p in train_compositions[rep]) == len(cls),
+                name=f"one_comp_{rep}"
+            )
+        model._orbits = members
+        decision_trains = list(members)
+    else:
+        X = {}
+        for t in trains:
+            for p in train_compositions[t]:
+                X[t, p['id']] = model.addVar(vtype=GRB.BINARY, name=f"X_{t}_{p['id']}")
+        model.update()
+        for t in trains:
+            model.addConstr(
+                quicksum(X[t, p['id']] for p in train_compositions[t]) == 1,
+                name=f"one_comp_{t}"
+            )
+        decision_trains = trains
+
+    model.setObjective(
+        quicksum(p['cost'] * X[t, p['id']] for t in decision_trains for p in train_compositions[t]),
+        GRB.MINIMIZE
+    )
+
+    if balance is not None:
+        total_PL3 = quicksum(p['n_PL3'] * X[t, p['id']]
+                             for t in decision_trains for p in train_compositions[t])
+        total_PL4 = quicksum(p['n_PL4'] * X[t, p['id']]
+                             for t in decision_trains for p in train_compositions[t])
+        model.addConstr(total_PL3 <= balance * total_PL4, name="balance_PL3")
+        model.addConstr(total_PL4 <= balance * total_PL3, name="balance_PL4")
+
+    if symmetry == 'lex':
+        # Identical trains share the same ordered P_t, so their chosen indices can be sorted
+        for cls in symmetry_classes(trains, train_info):
+            for t1, t2 in zip(cls, cls[1:]):
+                model.addConstr(
+                    quicksum(k * X[t1, p['id']] for k, p in enumerate(train_compositions[t1])) <=
+                    quicksum(k * X[t2, p['id']] for k, p in enumerate(train_compositions[t2])),
+                    name=f"lex_{t1}"
+                )
+    elif symmetry == 'orbital':
+        model.setParam('Symmetry', 2)
+
+    return model, X, train_compositions
+
+
+# Chosen (n_PL3, n_PL4) per train from a solved composition model
+def chosen_compositions(X, trains, train_compositions, orbits=None):
+    chosen = {}
+    if orbits is not None:
+        # Hand out the per-class counts to the identical trains of each class
+        for rep, cls in orbits.items():
+            assigned = []
+            for p in train_compositions[rep]:
+                assigned += [(p['n_PL3'], p['n_PL4'])] * int(round(X[rep, p['id']].X))
+            for t, comp in zip(cls, assigned):
+                chosen[t] = comp
+        return chosen
+
+    for t in trains:
+        for p in train_compositions[t]:
+            if X[t, p['id']].X > 0.5:
+                chosen[t] = (p['n_PL3'], p['n_PL4'])
+    return chosen
+
+
+# Multiply the number of cross-section trains to benchmark larger instances
+def scale_cross_section(cross_section, factor):
+    return {key: num_trains * factor for key, num_trains in cross_section.items()}
+
+
+# ============================================================
+# 5. Symmetry-Breaking Benchmark on Scaled Instances
+# ============================================================
+if __name__ == "__main__":
+    from gurobipy import GRB
+    seat_demand = read_seat_demand()
+    print(f"{'Scale':<8} {'Symmetry':<12} {'Trains':<8} {'Cost':<16} {'Runtime (s)':<12}")
+    print("-" * 60)
+    for factor in [1, 10, 50]:
+        trains, train_info = create_trains(scale_cross_section(cross_section, factor), seat_demand)
+        for symmetry in [None, 'lex', 'aggregate', 'orbital']:
+            start = time.time()
+            model, X, train_compositions = build_composition_model(trains, train_info,
+                                                                   symmetry=symmetry)
+            model.optimize()
+            runtime = time.time() - start
+            cost_str = f"€{model.objVal:,.0f}" if model.status == GRB.OPTIMAL else str(model.status)
+            print(f"{factor:<8} {str(symmetry):<12} {len(trains):<8} {cost_str:<16} {runtime:<12.4f}")
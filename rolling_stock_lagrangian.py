@@ -0,0 +1,197 @@
+"""
+Rolling Stock Lagrangian Decomposition: dualise the two fleet balance constraints
+Without them the composition model splits into one small choice per train; identical
+trains share the subproblem, so each iteration is a single vectorized argmin over classes
+"""
+
+import time
+import numpy as np
+import rolling_stock as rs
+
+
+# ============================================================
+# 1. Class-Level Composition Arrays
+# ============================================================
+# cost/n3/n4 have one row per class of identical trains, padded with inf cost
+def class_arrays(trains, train_info):
+    classes = rs.symmetry_classes(trains, train_info)
+    compositions = [rs.generate_compositions(train_info[cls[0]]['max_length'],
+                                             train_info[cls[0]]['seat_demand'])
+                    for cls in classes]
+    n_classes = len(classes)
+    n_comps = max(len(comps) for comps in compositions)
+
+    cost = np.full((n_classes, n_comps), np.inf)
+    n3 = np.zeros((n_classes, n_comps))
+    n4 = np.zeros((n_classes, n_comps))
+    for c, comps in enumerate(compositions):
+        for k, p in enumerate(comps):
+            cost[c, k] = p['cost']
+            n3[c, k] = p['n_PL3']
+            n4[c, k] = p['n_PL4']
+
+    return {
+        'classes': classes,
+        'compositions': compositions,
+        'size': np.array([len(cls) for cls in classes], dtype=float),
+        'cost': cost,
+        'n3': n3,
+        'n4': n4
+    }
+
+
+# Balance slacks: g = (PL3 - r * PL4, PL4 - r * PL3), feasible when both are <= 0
+def balance_terms(data, counts, ratio):
+    total_3 = (counts * data['n3']).sum()
+    total_4 = (counts * data['n4']).sum()
+    return np.array([total_3 - ratio * total_4, total_4 - ratio * total_3])
+
+
+def total_cost(data, counts):
+    mask = counts > 0
+    return float((counts[mask] * data['cost'][mask]).sum())
+
+
+# ============================================================
+# 2. Repair to a Feasible Integer Solution
+# ============================================================
+# Greedily move trains between compositions with the cheapest cost per unit of
+# balance violation removed, until both balance constraints hold
+def repair(data, counts, ratio, max_moves=100000):
+    counts = counts.copy()
+    cost, n3, n4 = data['cost'], data['n3'], data['n4']
+    finite = np.isfinite(cost)
+
+    for _ in range(max_moves):
+        g = balance_terms(data, counts, ratio)
+        violation = np.maximum(g, 0).sum()
+        if violation <= 1e-9:
+            return counts
+
+        # Moving one train of class c from composition p to q (arrays of shape C x P x P)
+        d3 = n3[:, None, :] - n3[:, :, None]
+        d4 = n4[:, None, :] - n4[:, :, None]
+        new_g0 = g[0] + d3 - ratio * d4
+        new_g1 = g[1] + d4 - ratio * d3
+        reduction = violation - (np.maximum(new_g0, 0) + np.maximum(new_g1, 0))
+        with np.errstate(invalid='ignore'):
+            delta_cost = cost[:, None, :] - cost[:, :, None]
+        valid = (counts[:, :, None] > 0) & finite[:, None, :] & (reduction > 1e-9)
+        if not valid.any():
+            return None
+
+        score = np.where(valid, delta_cost / np.where(valid, reduction, 1), np.inf)
+        c, p, q = np.unravel_index(np.argmin(score), score.shape)
+        moves = min(int(counts[c, p]), max(1, int(violation // reduction[c, p, q])))
+        counts[c, p] -= moves
+        counts[c, q] += moves
+        if moves > 1 and np.maximum(balance_terms(data, counts, ratio), 0).sum() >= violation:
+            # Overshot past the other balance constraint: fall back to a single move
+            counts[c, p] += moves - 1
+            counts[c, q] -= moves - 1
+    return None
+
+
+# ============================================================
+# 3. Subgradient Optimisation of the Multipliers
+# ============================================================
+def solve_lagrangian(trains, train_info, ratio=1.25, max_iter=500, gap_tol=1e-4,
+                     theta=2.0, patience=10, repair_every=5):
+    start = time.time()
+    data = class_arrays(trains, train_info)
+    if not np.isfinite(data['cost']).any(axis=1).all():
+        return {'status': 'infeasible', 'runtime': time.time() - start}
+
+    n_classes = len(data['classes'])
+    rows = np.arange(n_classes)
+    multipliers = np.zeros(2)
+    lower_bound = -np.inf
+    upper_bound = np.inf
+    best_counts = None
+    no_improvement = 0
+    history = []
+
+    for iteration in range(max_iter):
+        # Per-class subproblem: cheapest composition at the current multiplier prices
+        reduced = (data['cost'] +
+                   multipliers[0] * (data['n3'] - ratio * data['n4']) +
+                   multipliers[1] * (data['n4'] - ratio * data['n3']))
+        choice = np.argmin(reduced, axis=1)
+        value = float((data['size'] * reduced[rows, choice]).sum())
+
+        if value > lower_bound + 1e-9:
+            lower_bound = value
+            no_improvement = 0
+        else:
+            no_improvement += 1
+            if no_improvement >= patience:
+                theta /= 2
+                no_improvement = 0
+
+        counts = np.zeros_like(data['cost'])
+        counts[rows, choice] = data['size']
+        g = balance_terms(data, counts, ratio)
+
+        if iteration % repair_every == 0 or (g <= 0).all():
+            repaired = repair(data, counts, ratio)
+            if repaired is not None:
+                repaired_cost = total_cost(data, repaired)
+                if repaired_cost < upper_bound:
+                    upper_bound = repaired_cost
+                    best_counts = repaired
+
+        history.append((iteration, value, upper_bound))
+        if upper_bound - lower_bound <= gap_tol * abs(upper_bound):
+            break
+        norm = float(g @ g)
+        if norm == 0:
+            break
+
+        target = upper_bound if np.isfinite(upper_bound) else lower_bound + 0.05 * abs(lower_bound) + 1
+        step = theta * (target - value) / norm
+        multipliers = np.maximum(0, multipliers + step * g)
+
+    gap = (upper_bound - lower_bound) / abs(upper_bound) if best_counts is not None else None
+    return {
+        'status': 'feasible' if best_counts is not None else 'no_feasible_solution',
+        'lower_bound': lower_bound,
+        'upper_bound': upper_bound,
+        'gap': gap,
+        'multipliers': multipliers,
+        'iterations': len(history),
+        'history': history,
+        'assignment': disaggregate(data, best_counts) if best_counts is not None else None,
+        'runtime': time.time() - start
+    }
+
+
+# Composition (n_PL3, n_PL4) for every train from the class counts
+def disaggregate(data, counts):
+    assignment = {}
+    for c, cls in enumerate(data['classes']):
+        chosen = []
+        for k, p in enumerate(data['compositions'][c]):
+            chosen += [(p['n_PL3'], p['n_PL4'])] * int(round(counts[c, k]))
+        for t, comp in zip(cls, chosen):
+            assignment[t] = comp
+    return assignment
+
+
+# ============================================================
+# 4. Run on Scaled A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    seat_demand = rs.read_seat_demand()
+    print(f"{'Scale':<8} {'Trains':<10} {'Lower bound':<16} {'Upper bound':<16} {'Gap':<10} "
+          f"{'Iter':<6} {'Runtime (s)':<12}")
+    print("-" * 80)
+    for factor in [1, 100, 1000]:
+        trains, train_info = rs.create_trains(rs.scale_cross_section(rs.cross_section, factor),
+                                              seat_demand)
+        result = solve_lagrangian(trains, train_info)
+        if result['status'] != 'feasible':
+            print(f"{factor:<8} {len(trains):<10} {result['status']}")
+            continue
+        print(f"{factor:<8} {len(trains):<10} €{result['lower_bound']:<15,.0f} "
+              f"€{result['upper_bound']:<15,.0f} {result['gap'] * 100:<9.3f}% "
+              f"{result['iterations']:<6} {result['runtime']:<12.4f}")
@@ -0,0 +1,194 @@
+"""
+Stochastic Rolling Stock Sizing: composition choice under uncertain seat demand (SAA)
+Seat demand per line/direction is a sample of scenarios (drawn from a distribution or given).
+Each composition is evaluated against all scenarios in one NumPy pass, giving its expected
+seat shortage and shortage probability per line/direction; the MIP only sees these numbers,
+so its size (one integer per line/direction and composition) does not depend on the sample.
+Modes: 'penalty' (annual cost + shortage_cost * expected missing seats) or 'chance' (every
+train short in at most a fraction epsilon of the scenarios)
+"""
+
+import time
+import numpy as np
+import rolling_stock as rs
+
+
+# ============================================================
+# 1. Demand Scenarios
+# ============================================================
+# The seat table gives planning values, read here as a high quantile: scenario demand is
+# lognormal with mean mean_factor * table value and coefficient of variation cv
+def sample_scenarios(seat_demand, n_scenarios=5000, mean_factor=0.85, cv=0.15, seed=0):
+    keys = sorted(seat_demand)
+    rng = np.random.default_rng(seed)
+    sigma = np.sqrt(np.log(1 + cv ** 2))
+    mean = mean_factor * np.array([seat_demand[k] for k in keys], dtype=float)
+    mu = np.log(mean) - sigma ** 2 / 2
+    return keys, rng.lognormal(mu, sigma, size=(n_scenarios, len(keys)))
+
+
+def scenarios_from_samples(samples):
+    keys = sorted(samples)
+    return keys, np.column_stack([np.asarray(samples[k], dtype=float) for k in keys])
+
+
+# ============================================================
+# 2. Vectorized Composition Evaluation
+# ============================================================
+# All compositions up to the longest length limit; per line/direction the ones that fit
+def candidate_compositions(keys):
+    compositions = rs.generate_compositions(max(rs.max_length(k[0]) for k in keys))
+    fits = np.array([[p['length'] <= rs.max_length(k[0]) for p in compositions] for k in keys])
+    return compositions, fits
+
+
+# shortage[k, c] = E[max(0, D_k - cap_c)], short_prob[k, c] = P(D_k > cap_c); scenarios are
+# broadcast in blocks of `chunk` to bound the (scenarios, keys, compositions) array
+def evaluate(demand, compositions, chunk=20000):
+    cap = np.array([p['capacity'] for p in compositions], dtype=float)
+    shortage = np.zeros((demand.shape[1], len(cap)))
+    short = np.zeros((demand.shape[1], len(cap)))
+    for s in range(0, len(demand), chunk):
+        gap = demand[s:s + chunk, :, None] - cap[None, None, :]
+        shortage += np.maximum(gap, 0).sum(axis=0)
+        short += (gap > 0).sum(axis=0)
+    return shortage / len(demand), short / len(demand)
+
+
+# ============================================================
+# 3. SAA Model (aggregated over identical trains)
+# ============================================================
+# Y[k, c] = number of trains of line/direction k running composition c
+def build_stochastic_model(keys, counts, compositions, fits, shortage, short_prob, mode='penalty',
+                           shortage_cost=10000, epsilon=0.05, balance=1.25):
+    from gurobipy import Model, GRB, quicksum
+    model = Model("RollingStock_Stochastic")
+    model.setParam('OutputFlag', 0)
+
+    Y = {}
+    for k, key in enumerate(keys):
+        for c, p in enumerate(compositions):
+            if not fits[k, c] or (mode == 'chance' and short_prob[k, c] > epsilon):
+                continue
+            Y[k, c] = model.addVar(vtype=GRB.INTEGER, lb=0, ub=counts[key], name=f"Y_{key[0]}_{key[1]}_{p['id']}")
+    model.update()
+    for k, key in enumerate(keys):
+        model.addConstr(quicksum(Y[kk, c] for kk, c in Y if kk == k) == counts[key],
+                        name=f"trains_{key[0]}_{key[1]}")
+
+    fleet_cost = quicksum(compositions[c]['cost'] * y for (k, c), y in Y.items())
+    if mode == 'penalty':
+        model.setObjective(fleet_cost + quicksum(shortage_cost * shortage[k, c] * y for (k, c), y in Y.items()),
+                           GRB.MINIMIZE)
+    else:
+        model.setObjective(fleet_cost, GRB.MINIMIZE)
+
+    if balance is not None:
+        total_PL3 = quicksum(compositions[c]['n_PL3'] * y for (k, c), y in Y.items())
+        total_PL4 = quicksum(compositions[c]['n_PL4'] * y for (k, c), y in Y.items())
+        model.addConstr(total_PL3 <= balance * total_PL4, name="balance_PL3")
+        model.addConstr(total_PL4 <= balance * total_PL3, name="balance_PL4")
+    return model, Y
+
+
+# ============================================================
+# 4. Solve and Evaluate
+# ============================================================
+# Counts per line/direction and composition index; evaluation on any (possibly fresh) sample
+def plan_metrics(plan, keys, counts, compositions, demand):
+    shortage, short_prob = evaluate(demand, compositions)
+    n_trains = sum(counts[key] for key in keys)
+    fleet = sum(compositions[c]['cost'] * n for (k, c), n in plan.items())
+    missing = sum(shortage[k, c] * n for (k, c), n in plan.items())
+    return {
+        'fleet_cost': fleet,
+        'expected_missing_seats': missing,
+        'short_train_share': sum(short_prob[k, c] * n for (k, c), n in plan.items()) / n_trains,
+        'worst_short_prob': max(short_prob[k, c] for k, c in plan),
+        'units': {u: sum(compositions[c][f'n_{u}'] * n for (k, c), n in plan.items()) for u in rs.U},
+    }
+
+
+def solve_stochastic(seat_demand, cross_section=None, scenarios=None, mode='penalty', shortage_cost=10000,
+                     epsilon=0.05, balance=1.25, time_limit=None, **sampling):
+    start = time.time()
+    cross_section = cross_section if cross_section is not None else rs.cross_section
+    keys, demand = scenarios if scenarios is not None else sample_scenarios(seat_demand, **sampling)
+    compositions, fits = candidate_compositions(keys)
+    shortage, short_prob = evaluate(demand, compositions)
+    eval_time = time.time() - start
+
+    model, Y = build_stochastic_model(keys, cross_section, compositions, fits, shortage, short_prob,
+                                      mode, shortage_cost, epsilon, balance)
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    model.optimize()
+    result = {'status': model.status, 'mode': mode, 'scenarios': len(demand), 'variables': model.NumVars,
+              'eval_time': eval_time, 'keys': keys, 'compositions': compositions}
+    if model.SolCount > 0:
+        result['plan'] = {kc: int(round(y.X)) for kc, y in Y.items() if y.X > 0.5}
+        result['objective'] = model.objVal
+        result.update(plan_metrics(result['plan'], keys, cross_section, compositions, demand))
+    result['runtime'] = time.time() - start
+    return result
+
+
+# Deterministic plan (capacity >= table value for every train) in the same representation
+def deterministic_plan(seat_demand, keys, compositions, cross_section=None, balance=1.25):
+    cross_section = cross_section if cross_section is not None else rs.cross_section
+    trains, train_info = rs.create_trains(cross_section, seat_demand)
+    model, X, train_compositions = rs.build_composition_model(trains, train_info, balance, symmetry='aggregate')
+    model.optimize()
+    index = {p['id']: c for c, p in enumerate(compositions)}
+    plan = {}
+    for rep in model._orbits:
+        k = keys.index((train_info[rep]['line'], train_info[rep]['direction']))
+        for p in train_compositions[rep]:
+            n = int(round(X[rep, p['id']].X))
+            if n > 0:
+                plan[k, index[p['id']]] = plan.get((k, index[p['id']]), 0) + n
+    return plan
+
+
+def print_plan(title, metrics, keys, compositions, plan):
+    print(f"\n{title}")
+    print(f"  Fleet cost €{metrics['fleet_cost']:,.0f}, units {metrics['units']}, "
+          f"expected missing seats {metrics['expected_missing_seats']:,.1f}, "
+          f"short trains {metrics['short_train_share']:.1%} (worst {metrics['worst_short_prob']:.1%})")
+    for (k, c), n in sorted(plan.items()):
+        line, direction = keys[k]
+        print(f"    {line:<5} {direction:<6} {n} x {compositions[c]['id']:<10} ({compositions[c]['capacity']} seats)")
+
+
+# ============================================================
+# 5. Run on the A2 Instance
+# ============================================================
+if __name__ == "__main__":
+    seat_demand = rs.read_seat_demand()
+    out_of_sample = sample_scenarios(seat_demand, n_scenarios=100000, seed=1)
+    keys, demand = out_of_sample
+
+    print("=" * 60)
+    print("STOCHASTIC ROLLING STOCK SIZING (SAA)")
+    print("=" * 60)
+    compositions, _ = candidate_compositions(keys)
+    plan = deterministic_plan(seat_demand, keys, compositions)
+    print_plan("Deterministic (capacity >= table demand), out of sample:",
+               plan_metrics(plan, keys, rs.cross_section, compositions, demand), keys, compositions, plan)
+
+    for mode, options in [('penalty', {'shortage_cost': 10000}), ('penalty', {'shortage_cost': 50000}),
+                          ('chance', {'epsilon': 0.05})]:
+        result = solve_stochastic(seat_demand, mode=mode, n_scenarios=5000, **options)
+        if 'plan' not in result:
+            print(f"\n{mode}: no plan. Status: {result['status']}")
+            continue
+        metrics = plan_metrics(result['plan'], keys, rs.cross_section, result['compositions'], demand)
+        print_plan(f"{mode} {options}: {result['scenarios']} scenarios, {result['variables']} variables, "
+                   f"evaluation {result['eval_time'] * 1000:.1f} ms, total {result['runtime']:.3f} s; out of sample:",
+                   metrics, keys, result['compositions'], result['plan'])
+
+    print("\nModel size vs. scenarios (penalty mode):")
+    for n in [1000, 10000, 100000]:
+        result = solve_stochastic(seat_demand, n_scenarios=n)
+        print(f"  {n:>7} scenarios: {result['variables']} variables, evaluation {result['eval_time'] * 1000:7.1f} ms, "
+              f"total {result['runtime']:.3f} s, objective €{result['objective']:,.0f}")
@@ -0,0 +1,126 @@
+"""
+Rolling Stock Pareto Sweep: annual cost vs. fleet balance (and optional seat-demand scaling)
+One N_u,t model per worker is re-solved with updated coefficients/RHS and warm starts
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from gurobipy import GRB, quicksum
+import rolling_stock as rs
+
+
+# ============================================================
+# 1. Parametric Model
+# ============================================================
+# Basic model with the fleet totals as variables, so a new balance ratio only changes two
+# coefficients (balance_PL3: tot_PL3 - r * tot_PL4 <= 0, balance_PL4: tot_PL4 - r * tot_PL3 <= 0)
+def build_sweep_model(trains, train_info, ratio=1.25, env=None):
+    model, N = rs.build_basic_model(trains, train_info, balance=None, name="RollingStock_Sweep", env=env)
+    tot = {u: model.addVar(lb=0, name=f"tot_{u}") for u in rs.U}
+    for u in rs.U:
+        model.addConstr(tot[u] == quicksum(N[u, t] for t in trains), name=f"total_{u}")
+    balance = {
+        'PL3': model.addConstr(tot['PL3'] - ratio * tot['PL4'] <= 0, name="balance_PL3"),
+        'PL4': model.addConstr(tot['PL4'] - ratio * tot['PL3'] <= 0, name="balance_PL4")
+    }
+    model.update()
+    seats = {t: model.getConstrByName(f"seats_{t}") for t in trains}
+    return model, N, tot, balance, seats
+
+
+def set_ratio(model, tot, balance, ratio):
+    model.chgCoeff(balance['PL3'], tot['PL4'], -ratio)
+    model.chgCoeff(balance['PL4'], tot['PL3'], -ratio)
+
+
+def set_demand_scale(seats, train_info, scale):
+    for t, constr in seats.items():
+        constr.RHS = train_info[t]['seat_demand'] * scale
+
+
+# ============================================================
+# 2. Sweep
+# ============================================================
+# Solves the ratios of one demand scale in ascending order: a looser balance keeps the
+# previous optimum feasible, so it is passed on as MIP start
+def solve_chunk(args):
+    trains, train_info, scale, ratios, threads = args
+    model, N, tot, balance, seats = build_sweep_model(trains, train_info, ratios[0])
+    model.setParam('Threads', threads)
+    set_demand_scale(seats, train_info, scale)
+
+    points = []
+    previous = None
+    for ratio in sorted(ratios):
+        set_ratio(model, tot, balance, ratio)
+        if previous is not None:
+            for key, value in previous.items():
+                N[key].Start = value
+        start = time.time()
+        model.optimize()
+        runtime = time.time() - start
+
+        point = {'ratio': ratio, 'demand_scale': scale, 'status': model.status,
+                 'cost': None, 'PL3': None, 'PL4': None, 'runtime': runtime}
+        if model.status == GRB.OPTIMAL:
+            point['cost'] = model.objVal
+            point['PL3'] = tot['PL3'].X
+            point['PL4'] = tot['PL4'].X
+            previous = {key: var.X for key, var in N.items()}
+        points.append(point)
+    return points
+
+
+def sweep(trains, train_info, ratios, demand_scales=(1.0,), workers=None, threads=1):
+    # Independent demand scales run in parallel; long ratio lists are split into chunks too
+    workers = workers or 1
+    ratios = sorted(ratios)
+    chunks = []
+    per_chunk = max(1, -(-len(ratios) * len(demand_scales) // workers))
+    for scale in demand_scales:
+        for k in range(0, len(ratios), per_chunk):
+            chunks.append((trains, train_info, scale, ratios[k:k + per_chunk], threads))
+
+    start = time.time()
+    if workers == 1:
+        results = [solve_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(solve_chunk, chunks))
+    points = [p for chunk in results for p in chunk]
+    return sorted(points, key=lambda p: (p['demand_scale'], p['ratio'])), time.time() - start
+
+
+# Keep only points where allowing more imbalance actually lowers the cost
+def pareto_frontier(points):
+    frontier = []
+    for scale in sorted({p['demand_scale'] for p in points}):
+        best = None
+        for p in sorted((q for q in points if q['demand_scale'] == scale and q['cost'] is not None),
+                        key=lambda q: q['ratio']):
+            if best is None or p['cost'] < best - 1e-6:
+                frontier.append(p)
+                best = p['cost']
+    return frontier
+
+
+# ============================================================
+# 3. Run on the A2 Instance
+# ============================================================
+if __name__ == "__main__":
+    seat_demand = rs.read_seat_demand()
+    trains, train_info = rs.create_trains(rs.cross_section, seat_demand)
+
+    ratios = [1.0 + 0.01 * k for k in range(50)]
+    points, runtime = sweep(trains, train_info, ratios, workers=os.cpu_count())
+
+    print("\n" + "=" * 70)
+    print("COST FRONTIER: BALANCE RATIO vs. ANNUAL COST")
+    print("=" * 70)
+    print(f"Sweep points: {len(points)}, total runtime: {runtime:.4f} seconds")
+    print(f"{'Ratio':<8} {'Imbalance':<11} {'Scale':<7} {'Cost':<16} {'PL3':<6} {'PL4':<6}")
+    print("-" * 70)
+    for p in pareto_frontier(points):
+        print(f"{p['ratio']:<8.2f} {(p['ratio'] - 1) * 100:<10.0f}% {p['demand_scale']:<7.2f} "
+              f"€{p['cost']:<15,.0f} {p['PL3']:<6.0f} {p['PL4']:<6.0f}")
@@ -0,0 +1,168 @@
+"""
+Periodic-to-Full-Day Rollout: expand the periodic timetable (pi mod T) into all trips of a day
+Each line/direction becomes a pattern of event offsets from its first departure (so multi-period
+trips such as the 181-minute line 800 are exact); all trips are produced with array operations
+into a columnar table (one numpy array per column)
+"""
+
+import time
+import numpy as np
+import pesp
+
+ARR, DEP = 0, 1
+DIRECTION_CODE = {'South': 0, 'North': 1}
+
+
+# ============================================================
+# 1. Trip Patterns from the Periodic Timetable
+# ============================================================
+# Pattern: first departure (mod T), stations, event types and offsets along one trip
+def trip_patterns(instance, times):
+    durations = pesp.activity_durations(instance, times)
+    activity_of = {}
+    for i, a in enumerate(instance['activities']):
+        if a['type'] in ['driving', 'dwell']:
+            activity_of[(a['from'], a['to'])] = i
+
+    patterns = []
+    for line in instance['lines']:
+        for direction in pesp.DIRECTIONS:
+            route = pesp.route_of(instance['lines'], line, direction)
+            stations, kinds, offsets = [route[0]], [DEP], [0]
+            for k in range(1, len(route)):
+                prev_dep = (line, direction, route[k - 1], 'dep')
+                arr = (line, direction, route[k], 'arr')
+                stations.append(route[k])
+                kinds.append(ARR)
+                offsets.append(offsets[-1] + durations[activity_of[(prev_dep, arr)]])
+                if k < len(route) - 1:
+                    dep = (line, direction, route[k], 'dep')
+                    stations.append(route[k])
+                    kinds.append(DEP)
+                    offsets.append(offsets[-1] + durations[activity_of[(arr, dep)]])
+            patterns.append({
+                'line': line,
+                'direction': direction,
+                'first_dep': times[(line, direction, route[0], 'dep')],
+                'stations': stations,
+                'kinds': kinds,
+                'offsets': offsets
+            })
+    return patterns
+
+
+# ============================================================
+# 2. Vectorized Expansion
+# ============================================================
+# Trips departing in [start_hour, end_hour); include_running adds trips that departed
+# earlier but are still running at start_hour
+def rollout_patterns(patterns, T, start_hour=6, end_hour=24, include_running=False):
+    station_names = sorted({s for p in patterns for s in p['stations']})
+    station_code = {s: k for k, s in enumerate(station_names)}
+
+    n_patterns = len(patterns)
+    lengths = np.array([len(p['offsets']) for p in patterns], dtype=np.int64)
+    durations = np.array([p['offsets'][-1] for p in patterns], dtype=np.int64)
+    first_dep = np.array([p['first_dep'] for p in patterns], dtype=np.int64)
+    flat_offsets = np.concatenate([np.asarray(p['offsets'], dtype=np.int32) for p in patterns])
+    flat_stations = np.concatenate([np.array([station_code[s] for s in p['stations']], dtype=np.int16)
+                                    for p in patterns])
+    flat_kinds = np.concatenate([np.asarray(p['kinds'], dtype=np.int8) for p in patterns])
+    pattern_start = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    # Trips per pattern: departures first + k*T inside the window
+    start, end = start_hour * 60, end_hour * 60
+    earliest = start - durations if include_running else np.full(n_patterns, start)
+    first = earliest + (first_dep - earliest) % T
+    counts = np.maximum(0, -(-(end - first) // T))
+
+    trip_pattern = np.repeat(np.arange(n_patterns), counts)
+    trip_rank = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    trip_dep = (first[trip_pattern] + T * trip_rank).astype(np.int32)
+    if include_running:
+        keep = trip_dep + durations[trip_pattern] > start
+        trip_pattern, trip_dep = trip_pattern[keep], trip_dep[keep]
+
+    # Events: every trip repeats the events of its pattern
+    trip_lengths = lengths[trip_pattern]
+    event_trip = np.repeat(np.arange(len(trip_pattern)), trip_lengths)
+    event_pos = np.arange(trip_lengths.sum()) - np.repeat(np.cumsum(trip_lengths) - trip_lengths,
+                                                          trip_lengths)
+    flat_index = pattern_start[trip_pattern][event_trip] + event_pos
+
+    lines = np.array([p['line'] for p in patterns], dtype=np.int32)
+    directions = np.array([DIRECTION_CODE[p['direction']] for p in patterns], dtype=np.int8)
+    return {
+        'stations': station_names,
+        'trips': {
+            'pattern': trip_pattern.astype(np.int32),
+            'line': lines[trip_pattern],
+            'direction': directions[trip_pattern],
+            'dep': trip_dep,
+            'arr': (trip_dep + durations[trip_pattern]).astype(np.int32),
+            'origin': flat_stations[pattern_start[trip_pattern]],
+            'destination': flat_stations[pattern_start[trip_pattern] + lengths[trip_pattern] - 1]
+        },
+        'events': {
+            'trip': event_trip.astype(np.int32),
+            'station': flat_stations[flat_index],
+            'kind': flat_kinds[flat_index],
+            'time': (trip_dep[event_trip] + flat_offsets[flat_index]).astype(np.int32)
+        }
+    }
+
+
+def rollout(instance, times, start_hour=6, end_hour=24, include_running=False):
+    return rollout_patterns(trip_patterns(instance, times), instance['T'],
+                            start_hour, end_hour, include_running)
+
+
+# ============================================================
+# 3. Queries on the Trip Table
+# ============================================================
+# Trips of each line/direction on the road at minute t (the cross-section at t)
+def trips_in_service(table, t):
+    trips = table['trips']
+    running = (trips['dep'] <= t) & (trips['arr'] > t)
+    counts = {}
+    for line, direction in zip(trips['line'][running], trips['direction'][running]):
+        key = (int(line), pesp.DIRECTIONS[direction])
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def to_frame(table):
+    import pandas as pd
+    events = pd.DataFrame(table['events'])
+    events['station'] = np.asarray(table['stations'])[events['station']]
+    events['kind'] = np.where(events['kind'] == DEP, 'dep', 'arr')
+    return events
+
+
+def format_time(minutes):
+    return f"{(minutes // 60) % 24:02d}:{minutes % 60:02d}"
+
+
+# ============================================================
+# 4. Run on the A2 Instance
+# ============================================================
+if __name__ == "__main__":
+    instance = pesp.build_instance('basic')
+    result = pesp.solve(instance)
+    if result['times'] is None:
+        print(f"No timetable to roll out. Status: {result['status']}")
+    else:
+        patterns = trip_patterns(instance, result['times'])
+        start = time.time()
+        table = rollout_patterns(patterns, instance['T'])
+        runtime = time.time() - start
+        print(f"Trips: {len(table['trips']['dep'])}, events: {len(table['events']['time'])}, "
+              f"rollout time: {runtime * 1000:.2f} ms")
+        print(f"Cross-section at 12:00: {trips_in_service(table, 12 * 60)}")
+
+        # Scaled network: 100x the A2 lines over an 18-hour day
+        start = time.time()
+        table = rollout_patterns(patterns * 100, instance['T'], 6, 24)
+        runtime = time.time() - start
+        print(f"Scaled (x100): {len(table['trips']['dep'])} trips, "
+              f"{len(table['events']['time'])} events in {runtime * 1000:.2f} ms")
@@ -0,0 +1,366 @@
+"""
+Run Archive: append-only columnar store of solved timetables and rolling-stock assignments
+Every table is a set of column files (raw little-endian arrays, appended in place); events,
+trains and names are interned to integer ids in JSON-lines dictionaries. Rows are written in
+run order, so the rows of one run are a contiguous slice found by binary search, and diffs are
+dense-array joins on the interned ids. A run counts once its row in the runs table is written
+(last), so a crash mid-append leaves no half run: torn column rows and a torn last dictionary
+line are dropped when the archive is opened. Runs without a fingerprint never count as the
+same instance
+"""
+
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+SCHEMA = {
+    'runs': {'label': np.int32, 'fingerprint': np.int32, 'created': np.float64},
+    'pi': {'run': np.int32, 'event': np.int32, 'time': np.int16},
+    'stock': {'run': np.int32, 'train': np.int32, 'n_PL3': np.int8, 'n_PL4': np.int8},
+    'metrics': {'run': np.int32, 'name': np.int32, 'value': np.float64},
+}
+DICTIONARIES = ['events', 'trains', 'names']
+
+
+# ============================================================
+# 1. Instance Fingerprint
+# ============================================================
+def digest(content):
+    return hashlib.sha1(json.dumps(content, default=str).encode()).hexdigest()[:16]
+
+
+# Hash of everything that defines the PESP instance (not of its name or line numbering order)
+def fingerprint(instance):
+    return digest({
+        'T': instance['T'],
+        'events': sorted(map(list, instance['events'])),
+        'activities': sorted([a['type'], list(a['from']), list(a['to']), a['l'], a['u']]
+                             for a in instance['activities']),
+        'fixed': sorted([list(e), v] for e, v in instance['fixed'].items()),
+        'objective': sorted(instance.get('objective', [])),
+    })
+
+
+# Rolling-stock instance: seat demand and length limit per train plus the fleet balance ratio
+def rolling_stock_fingerprint(train_info, balance=None):
+    return digest({
+        'trains': sorted([t, info['seat_demand'], info['max_length']] for t, info in train_info.items()),
+        'balance': balance,
+    })
+
+
+# ============================================================
+# 2. Archive
+# ============================================================
+class RunArchive:
+    def __init__(self, path='runs'):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.ids = {}
+        self.keys = {}
+        for name in DICTIONARIES:
+            self.keys[name] = self.read_dictionary(name)
+            self.ids[name] = {key: k for k, key in enumerate(self.keys[name])}
+        self.chunks = {table: {col: [self.read(table, col, dtype)] for col, dtype in columns.items()}
+                       for table, columns in SCHEMA.items()}
+        self.cache = {}
+        self.trim()
+        self.count = len(self.column('runs', 'label'))
+
+    def file(self, name, ext='bin'):
+        return os.path.join(self.path, f"{name}.{ext}")
+
+    # A last line without newline or that does not parse is a torn write: the run that wrote it
+    # was never committed, so it is cut off the file
+    def read_dictionary(self, name):
+        file = self.file(name, 'jsonl')
+        if not os.path.exists(file):
+            return []
+        with open(file, 'rb') as f:
+            data = f.read()
+        keys, pos = [], 0
+        while pos < len(data):
+            end = data.find(b'\n', pos)
+            try:
+                if end < 0:
+                    raise ValueError("no newline")
+                key = json.loads(data[pos:end])
+            except ValueError:
+                if end >= 0 and end + 1 < len(data):
+                    raise ValueError(f"{file}: corrupt line {len(keys) + 1}")
+                os.truncate(file, pos)
+                break
+            keys.append(tuple(key) if isinstance(key, list) else key)
+            pos = end + 1
+        return keys
+
+    def read(self, table, col, dtype):
+        file = self.file(f"{table}.{col}")
+        return np.fromfile(file, dtype=dtype) if os.path.exists(file) else np.empty(0, dtype=dtype)
+
+    # Drop rows of an interrupted append: runs columns cut to the shortest, row tables to
+    # the committed runs
+    def trim(self):
+        n_runs = min(len(self.column('runs', col)) for col in SCHEMA['runs'])
+        for col in SCHEMA['runs']:
+            self.chunks['runs'][col] = [self.column('runs', col)[:n_runs]]
+        for table in ['pi', 'stock', 'metrics']:
+            n_rows = min(len(self.column(table, col)) for col in SCHEMA[table])
+            n_rows = min(n_rows, int(np.searchsorted(self.column(table, 'run')[:n_rows], n_runs)))
+            for col in SCHEMA[table]:
+                self.chunks[table][col] = [self.column(table, col)[:n_rows]]
+        self.cache = {}
+        for table, columns in SCHEMA.items():
+            for col, dtype in columns.items():
+                file = self.file(f"{table}.{col}")
+                size = len(self.column(table, col)) * np.dtype(dtype).itemsize
+                if os.path.exists(file) and os.path.getsize(file) > size:
+                    os.truncate(file, size)
+
+    def column(self, table, col):
+        if (table, col) not in self.cache:
+            chunks = self.chunks[table][col]
+            self.cache[table, col] = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+            self.chunks[table][col] = [self.cache[table, col]]
+        return self.cache[table, col]
+
+    def intern(self, name, key, new):
+        if key not in self.ids[name]:
+            self.ids[name][key] = len(self.keys[name])
+            self.keys[name].append(key)
+            new.append((name, key))
+        return self.ids[name][key]
+
+    def write(self, table, columns):
+        for col, dtype in SCHEMA[table].items():
+            values = np.asarray(columns[col], dtype=dtype)
+            with open(self.file(f"{table}.{col}"), 'ab') as f:
+                values.tofile(f)
+            self.chunks[table][col].append(values)
+            self.cache.pop((table, col), None)
+
+    @property
+    def n_runs(self):
+        return self.count
+
+    # ============================================================
+    # 3. Append
+    # ============================================================
+    # times: {event: minute}, assignment: {train: (n_PL3, n_PL4)}, metrics: {name: value}
+    def append(self, label, fingerprint=None, times=None, assignment=None, metrics=None):
+        run = self.n_runs
+        new = []
+        times, assignment, metrics = times or {}, assignment or {}, metrics or {}
+        label_id = self.intern('names', label, new)
+        fingerprint_id = self.intern('names', fingerprint, new) if fingerprint else -1
+        events = [self.intern('events', e, new) for e in times]
+        trains = [self.intern('trains', t, new) for t in assignment]
+        names = [self.intern('names', m, new) for m in metrics]
+
+        for name in DICTIONARIES:
+            rows = [key for table, key in new if table == name]
+            if rows:
+                with open(self.file(name, 'jsonl'), 'a') as f:
+                    for key in rows:
+                        f.write(json.dumps(list(key) if isinstance(key, tuple) else key) + "\n")
+        self.write('pi', {'run': [run] * len(events), 'event': events, 'time': list(times.values())})
+        self.write('stock', {'run': [run] * len(trains), 'train': trains,
+                             'n_PL3': [c[0] for c in assignment.values()],
+                             'n_PL4': [c[1] for c in assignment.values()]})
+        self.write('metrics', {'run': [run] * len(names), 'name': names, 'value': list(metrics.values())})
+        self.write('runs', {'label': [label_id], 'fingerprint': [fingerprint_id], 'created': [time.time()]})
+        self.count += 1
+        return run
+
+    # ============================================================
+    # 4. Queries
+    # ============================================================
+    def rows(self, table, run):
+        runs = self.column(table, 'run')
+        return slice(int(np.searchsorted(runs, run, 'left')), int(np.searchsorted(runs, run, 'right')))
+
+    # Fingerprint ids with -1 for unknown (none given; '' in archives written before)
+    def fingerprints(self):
+        ids = self.column('runs', 'fingerprint').copy()
+        empty = self.ids['names'].get('')
+        if empty is not None:
+            ids[ids == empty] = -1
+        return ids
+
+    def run_info(self, run):
+        fp = self.fingerprints()[run]
+        return {'run': run,
+                'label': self.keys['names'][self.column('runs', 'label')[run]],
+                'fingerprint': self.keys['names'][fp] if fp >= 0 else None,
+                'created': float(self.column('runs', 'created')[run]),
+                'metrics': self.metrics(run)}
+
+    def latest(self, label, fingerprint=None):
+        mask = self.column('runs', 'label') == self.ids['names'].get(label, -1)
+        if fingerprint is not None:
+            mask &= self.column('runs', 'fingerprint') == self.ids['names'].get(fingerprint, -2)
+        found = np.nonzero(mask)[0]
+        return int(found[-1]) if len(found) else None
+
+    def timetable(self, run):
+        rows = self.rows('pi', run)
+        return {self.keys['events'][e]: int(t)
+                for e, t in zip(self.column('pi', 'event')[rows], self.column('pi', 'time')[rows])}
+
+    def assignment(self, run):
+        rows = self.rows('stock', run)
+        return {self.keys['trains'][t]: (int(a), int(b)) for t, a, b in
+                zip(self.column('stock', 'train')[rows], self.column('stock', 'n_PL3')[rows],
+                    self.column('stock', 'n_PL4')[rows])}
+
+    def metrics(self, run):
+        rows = self.rows('metrics', run)
+        return {self.keys['names'][m]: float(v)
+                for m, v in zip(self.column('metrics', 'name')[rows], self.column('metrics', 'value')[rows])}
+
+    # One metric for all runs (NaN where a run did not record it)
+    def metric(self, name):
+        values = np.full(self.n_runs, np.nan)
+        mask = self.column('metrics', 'name') == self.ids['names'].get(name, -1)
+        values[self.column('metrics', 'run')[mask]] = self.column('metrics', 'value')[mask]
+        return values
+
+    # ============================================================
+    # 5. Diffs (dense joins on interned ids, -1 = not in the run)
+    # ============================================================
+    def dense(self, table, run, key, value, size):
+        rows = self.rows(table, run)
+        array = np.full(size, -1, dtype=np.int32)
+        array[self.column(table, key)[rows]] = self.column(table, value)[rows]
+        return array
+
+    def departure_mask(self):
+        return np.array([e[-1] == 'dep' for e in self.keys['events']], dtype=bool)
+
+    def diff(self, a, b):
+        n_events, n_trains = len(self.keys['events']), len(self.keys['trains'])
+        ta = self.dense('pi', a, 'event', 'time', n_events)
+        tb = self.dense('pi', b, 'event', 'time', n_events)
+        both = (ta >= 0) & (tb >= 0)
+        changed = both & (ta != tb)
+        departures = np.nonzero(changed & self.departure_mask())[0]
+
+        train_a = self.dense('stock', a, 'train', 'n_PL3', n_trains), self.dense('stock', a, 'train', 'n_PL4', n_trains)
+        train_b = self.dense('stock', b, 'train', 'n_PL3', n_trains), self.dense('stock', b, 'train', 'n_PL4', n_trains)
+        in_both = (train_a[0] >= 0) & (train_b[0] >= 0)
+        recomposed = np.nonzero(in_both & ((train_a[0] != train_b[0]) | (train_a[1] != train_b[1])))[0]
+
+        metrics_a, metrics_b = self.metrics(a), self.metrics(b)
+        fingerprints = self.fingerprints()
+        return {
+            'runs': (a, b),
+            'same_instance': bool(fingerprints[a] >= 0 and fingerprints[a] == fingerprints[b]),
+            'changed_events': int(changed.sum()),
+            'only_a': int(((ta >= 0) & (tb < 0)).sum()),
+            'only_b': int(((ta < 0) & (tb >= 0)).sum()),
+            'departures': [(self.keys['events'][e], int(ta[e]), int(tb[e])) for e in departures],
+            'compositions': [(self.keys['trains'][t], (int(train_a[0][t]), int(train_a[1][t])),
+                              (int(train_b[0][t]), int(train_b[1][t]))) for t in recomposed],
+            'metrics': {m: (metrics_a.get(m), metrics_b.get(m),
+                            metrics_b[m] - metrics_a[m] if m in metrics_a and m in metrics_b else None)
+                        for m in sorted(set(metrics_a) | set(metrics_b))},
+        }
+
+    # Changed departures and objective delta of every archived run against one reference run,
+    # in one pass over the pi column
+    def compare_all(self, ref, metric='objective'):
+        ref_times = self.dense('pi', ref, 'event', 'time', len(self.keys['events']))
+        events, times, runs = self.column('pi', 'event'), self.column('pi', 'time'), self.column('pi', 'run')
+        ref_at = ref_times[events]
+        changed = (ref_at >= 0) & (times != ref_at) & self.departure_mask()[events]
+        values = self.metric(metric)
+        fingerprints = self.fingerprints()
+        return {
+            'changed_departures': np.bincount(runs, weights=changed, minlength=self.n_runs).astype(np.int32),
+            'delta': values - values[ref],
+            'same_instance': (fingerprints == fingerprints[ref]) & (fingerprints >= 0),
+        }
+
+
+def format_value(v, sign=''):
+    return '-' if v is None else f"{v:{sign}g}"
+
+
+def print_diff(archive, d, max_rows=10):
+    a, b = d['runs']
+    print(f"Run {a} ({archive.run_info(a)['label']}) -> run {b} ({archive.run_info(b)['label']}), "
+          f"{'same' if d['same_instance'] else 'different'} instance")
+    for m, (va, vb, delta) in d['metrics'].items():
+        print(f"  {m:<12} {format_value(va):>12} -> {format_value(vb):<12} ({format_value(delta, '+')})")
+    print(f"  Events: {d['changed_events']} changed, {d['only_a']} only in {a}, {d['only_b']} only in {b}")
+    print(f"  Changed departures: {len(d['departures'])}")
+    for e, ta, tb in d['departures'][:max_rows]:
+        print(f"    {e[0]} {e[1]:<5} {e[2]:<4} {ta:02d} -> {tb:02d}")
+    print(f"  Changed compositions: {len(d['compositions'])}")
+    for t, ca, cb in d['compositions'][:max_rows]:
+        print(f"    {t:<14} {ca[0]}xPL3+{ca[1]}xPL4 -> {cb[0]}xPL3+{cb[1]}xPL4")
+
+
+# ============================================================
+# 6. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    import tempfile
+    import pesp
+    import rolling_stock as rs
+
+    archive = RunArchive(tempfile.mkdtemp(prefix="runs_"))
+    runs = {}
+    for variant in ['basic', 'extended']:
+        instance = pesp.build_instance(variant)
+        result = pesp.solve(instance)
+        runs[variant] = archive.append(f"pesp_{variant}", fingerprint(instance), result['times'],
+                                       metrics={'objective': result['objective'], 'runtime': result['runtime']})
+
+    trains, train_info = rs.create_trains(rs.cross_section, rs.read_seat_demand())
+    for balance in [1.25, None]:
+        model, X, train_compositions = rs.build_composition_model(trains, train_info, balance=balance)
+        model.optimize()
+        runs[balance] = archive.append(f"rolling_stock_balance_{balance}",
+                                       rolling_stock_fingerprint(train_info, balance),
+                                       assignment=rs.chosen_compositions(X, trains, train_compositions),
+                                       metrics={'objective': model.objVal, 'runtime': model.Runtime})
+
+    print("=" * 60)
+    print("RUN ARCHIVE: diffs")
+    print("=" * 60)
+    print_diff(archive, archive.diff(runs['basic'], runs['extended']))
+    print_diff(archive, archive.diff(runs[1.25], runs[None]))
+
+    # Scale test: perturbed copies of the basic timetable
+    n_runs = 20000
+    rng = np.random.default_rng(0)
+    base = archive.timetable(runs['basic'])
+    events = list(base)
+    start = time.time()
+    for k in range(n_runs):
+        shift = rng.integers(0, 2, size=len(events)) * rng.integers(-2, 3, size=len(events))
+        times = {e: (base[e] + int(s)) % pesp.T for e, s in zip(events, shift)}
+        archive.append("perturbed", archive.run_info(runs['basic'])['fingerprint'], times,
+                       metrics={'objective': 60 + float(np.abs(shift).sum())})
+    append_time = time.time() - start
+
+    start = time.time()
+    reopened = RunArchive(archive.path)
+    load_time = time.time() - start
+    start = time.time()
+    summary = reopened.compare_all(runs['basic'])
+    compare_time = time.time() - start
+    start = time.time()
+    d = reopened.diff(runs['basic'], reopened.n_runs - 1)
+    diff_time = time.time() - start
+
+    print(f"\nScale test: {reopened.n_runs} runs, {len(reopened.column('pi', 'run')):,} timetable rows")
+    print(f"  Append {append_time / n_runs * 1000:.3f} ms/run, reopen {load_time * 1000:.1f} ms, "
+          f"compare all {compare_time * 1000:.1f} ms, one diff {diff_time * 1000:.2f} ms")
+    same = summary['same_instance']
+    print(f"  Same instance as basic: {int(same.sum())} runs, mean changed departures "
+          f"{summary['changed_departures'][same].mean():.1f}, best objective delta "
+          f"{np.nanmin(summary['delta'][same][1:]):+.0f}")
@@ -0,0 +1,265 @@
+"""
+Timetable Sensitivity: marginal cost and valid range of every activity bound from one LP
+With the optimal periods p fixed, PESP is an LP in pi: l - T*p <= pi_j - pi_i <= u - T*p.
+The dual of each bound is the change in dwell/transfer minutes per minute of l or u (travel
+times: l = u, one equality), and RHS ranging gives the interval where that rate holds.
+Answers are upper bounds on the new optimum (p stays feasible). Only a tightening the LP
+prices at zero is exact; every other answer is flagged, since the MIP may switch periods p,
+and all flagged questions are confirmed together in one multi-scenario MIP solve
+"""
+
+import time
+from gurobipy import Model, GRB, quicksum
+import pesp
+
+
+# ============================================================
+# 1. Fixed-Period LP
+# ============================================================
+def optimal_periods(instance, time_limit=None):
+    model, pi, x, p = pesp.build_model(instance, name="PESP_Sensitivity_MIP")
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    model.optimize()
+    if model.SolCount == 0:
+        return None, model, x
+    return {i: int(round(var.X)) for i, var in p.items()}, model, x
+
+
+def fixed_period_lp(instance, periods):
+    T = instance['T']
+    model = Model("PESP_Fixed_Periods")
+    model.setParam('OutputFlag', 0)
+    pi = {e: model.addVar(lb=0, ub=T, name=f"pi_{e}") for e in instance['events']}
+
+    lower, upper, equal = {}, {}, {}
+    constant = 0
+    objective = []
+    for i, a in enumerate(instance['activities']):
+        tension = pi[a['to']] - pi[a['from']]
+        shift = T * periods[i]
+        if a['l'] == a['u']:
+            equal[i] = model.addConstr(tension == a['l'] - shift, name=f"equal_{i}")
+        else:
+            lower[i] = model.addConstr(tension >= a['l'] - shift, name=f"lower_{i}")
+            upper[i] = model.addConstr(tension <= a['u'] - shift, name=f"upper_{i}")
+        if a['type'] in instance['objective']:
+            objective.append(tension)
+            constant += shift
+    for event, value in instance['fixed'].items():
+        model.addConstr(pi[event] == value, name=f"fixed_{event[0]}_{event[2]}")
+
+    model.setObjective(quicksum(objective) + constant, GRB.MINIMIZE)
+    return model, lower, upper, equal
+
+
+# ============================================================
+# 2. Duals and Ranging (one pass)
+# ============================================================
+def bound_info(constr, shift):
+    return {'marginal': constr.Pi, 'range': (constr.SARHSLow + shift, constr.SARHSUp + shift)}
+
+
+def analyse(instance, time_limit=None):
+    start = time.time()
+    T = instance['T']
+    periods, mip, x = optimal_periods(instance, time_limit)
+    if periods is None:
+        return {'status': mip.status, 'runtime': time.time() - start}
+
+    model, lower, upper, equal = fixed_period_lp(instance, periods)
+    model.optimize()
+    if model.status != GRB.OPTIMAL:
+        return {'status': model.status, 'runtime': time.time() - start}
+
+    durations = [x[i].X for i in range(len(instance['activities']))]
+    rows = []
+    for i, a in enumerate(instance['activities']):
+        shift = T * periods[i]
+        row = {'index': i, 'type': a['type'], 'from': a['from'], 'to': a['to'],
+               'l': a['l'], 'u': a['u'], 'duration': int(round(durations[i]))}
+        if i in equal:
+            row['l_info'] = row['u_info'] = bound_info(equal[i], shift)
+            row['fixed'] = True
+        else:
+            row['l_info'] = bound_info(lower[i], shift)
+            row['u_info'] = bound_info(upper[i], shift)
+            row['fixed'] = False
+        rows.append(row)
+
+    return {
+        'status': 'optimal',
+        'objective': model.objVal,
+        'mip_objective': mip.objVal,
+        'periods': periods,
+        'activities': rows,
+        'mip': mip,
+        'x': x,
+        'runtime': time.time() - start
+    }
+
+
+# ============================================================
+# 3. Questions
+# ============================================================
+# Question: {'activity': i, 'bound': 'l', 'u' or 'both' (shift the window / travel time), 'delta': minutes}
+def standard_questions(instance):
+    questions = []
+    for i, a in enumerate(instance['activities']):
+        if a['type'] == 'driving':
+            questions += [{'activity': i, 'bound': 'both', 'delta': d} for d in (-1, 1)]
+        elif a['type'] == 'dwell':
+            questions.append({'activity': i, 'bound': 'l', 'delta': 1})
+        elif a['type'] in ['sync', 'relaxed_sync']:
+            questions += [{'activity': i, 'bound': 'l', 'delta': -1}, {'activity': i, 'bound': 'u', 'delta': 1}]
+    return questions
+
+
+def new_bounds(a, bound, delta):
+    l, u = a['l'], a['u']
+    if bound in ['l', 'both']:
+        l += delta
+    if bound in ['u', 'both']:
+        u += delta
+    return l, u
+
+
+# Predicted objective from the duals; 'exact' when the change only tightens and costs nothing
+# (the optimum cannot improve and p stays optimal), otherwise an upper bound. Relaxations and
+# shifted windows are flagged even at zero change: another p may then become cheaper
+def answer(report, question, min_change=1e-6):
+    row = report['activities'][question['activity']]
+    delta = question['delta']
+    if row['fixed'] or question['bound'] != 'both':
+        bounds = ['l'] if row['fixed'] or question['bound'] == 'l' else ['u']
+    else:
+        bounds = ['l', 'u']
+
+    change, in_range = 0.0, True
+    for b in bounds:
+        info = row[f'{b}_info']
+        value = row[b] + delta
+        change += info['marginal'] * delta
+        in_range &= info['range'][0] - 1e-9 <= value <= info['range'][1] + 1e-9
+    if row['fixed'] and question['bound'] != 'both':
+        # One side of an equality moves out: the row may stay where it is, so only the
+        # improving side of its dual counts, ranged at the moved bound
+        info = row[f"{question['bound']}_info"]
+        value = row[question['bound']] + delta
+        change = min(0.0, info['marginal'] * delta)
+        in_range = change == 0 or info['range'][0] - 1e-9 <= value <= info['range'][1] + 1e-9
+
+    if question['bound'] == 'both':
+        tightening = False
+    else:
+        tightening = (question['bound'] == 'l') == (delta > 0)
+    exact = in_range and tightening and abs(change) < min_change
+    return {
+        'question': question,
+        'predicted': report['objective'] + change if in_range else None,
+        'change': change if in_range else None,
+        'in_range': in_range,
+        'exact': exact,
+        'flagged': not exact
+    }
+
+
+# ============================================================
+# 4. MIP Confirmation
+# ============================================================
+# Always on a copy: report['mip'] keeps the base optimum for later answers and runs
+def confirm(report, instance, question, time_limit=None):
+    mip = report['mip'].copy()
+    a = instance['activities'][question['activity']]
+    var = mip.getVarByName(report['x'][question['activity']].VarName)
+    var.LB, var.UB = new_bounds(a, question['bound'], question['delta'])
+    if time_limit is not None:
+        mip.setParam('TimeLimit', time_limit)
+    mip.optimize()
+    return (mip.objVal if mip.SolCount > 0 else None), mip.status
+
+
+# One multi-scenario solve: scenario s changes the bounds of question s's activity. Returns
+# (value, status) per question; value None when the scenario has no solution
+def confirm_all(report, instance, questions, time_limit=None):
+    if not questions:
+        return []
+    mip = report['mip'].copy()
+    mip.NumScenarios = len(questions)
+    for s, q in enumerate(questions):
+        mip.setParam('ScenarioNumber', s)
+        var = mip.getVarByName(report['x'][q['activity']].VarName)
+        var.ScenNLB, var.ScenNUB = new_bounds(instance['activities'][q['activity']], q['bound'], q['delta'])
+    if time_limit is not None:
+        mip.setParam('TimeLimit', time_limit)
+    mip.optimize()
+    results = []
+    for s in range(len(questions)):
+        mip.setParam('ScenarioNumber', s)
+        value = mip.ScenNObjVal if mip.SolCount > 0 else GRB.INFINITY
+        results.append((value if value < GRB.INFINITY else None, mip.status))
+    return results
+
+
+def run_questions(instance, questions=None, confirm_flagged=True, time_limit=None):
+    report = analyse(instance, time_limit)
+    if report['status'] != 'optimal':
+        return report, []
+    questions = questions if questions is not None else standard_questions(instance)
+    start = time.time()
+    answers = [answer(report, q) for q in questions]
+    report['answer_time'] = time.time() - start
+    if confirm_flagged:
+        start = time.time()
+        flagged = [ans for ans in answers if ans['flagged']]
+        confirmed = confirm_all(report, instance, [ans['question'] for ans in flagged], time_limit)
+        for ans, (value, status) in zip(flagged, confirmed):
+            ans['confirmed'], ans['confirm_status'] = value, status
+        report['confirm_time'] = time.time() - start
+    return report, answers
+
+
+def describe(a):
+    return f"{a['type']:<13} {a['from'][0]} {a['from'][1][0]} {a['from'][2]}-{a['to'][2]}"
+
+
+def print_report(report, answers):
+    print(f"Objective {report['objective']:.0f} (MIP {report['mip_objective']:.0f}), "
+          f"analysis {report['runtime']:.3f} s, {len(answers)} questions in {report['answer_time'] * 1000:.2f} ms")
+    print(f"\n{'Activity':<32} {'Dur':>4} {'dObj/dl':>8} {'l range':>14} {'dObj/du':>8} {'u range':>14}")
+    for row in report['activities']:
+        if row['l_info']['marginal'] == 0 and row['u_info']['marginal'] == 0:
+            continue
+        lr, ur = row['l_info']['range'], row['u_info']['range']
+        print(f"{describe(row):<32} {row['duration']:>4} {row['l_info']['marginal']:>8.2f} "
+              f"{lr[0]:>6.0f}..{lr[1]:<6.0f} {row['u_info']['marginal']:>8.2f} {ur[0]:>6.0f}..{ur[1]:<6.0f}")
+
+    flagged = [a for a in answers if a['flagged']]
+    print(f"\nFlagged for MIP confirmation: {len(flagged)} of {len(answers)}"
+          + (f" (one multi-scenario solve, {report['confirm_time']:.3f} s)" if 'confirm_time' in report else ""))
+    moved = [a for a in flagged if a.get('confirmed') is not None and
+             (a['predicted'] is None or abs(a['confirmed'] - a['predicted']) > 1e-6)]
+    print(f"MIP differs from the LP prediction (other periods p): {len(moved)}")
+    for ans in moved:
+        q = ans['question']
+        row = report['activities'][q['activity']]
+        predicted = '-' if ans['predicted'] is None else f"{ans['predicted']:.0f}"
+        confirmed = ans.get('confirmed')
+        confirmed = '-' if confirmed is None else f"{confirmed:.0f}"
+        print(f"  {describe(row):<32} {q['bound']:<4} {q['delta']:+d}: predicted {predicted:>4}, MIP {confirmed:>4}")
+
+
+# ============================================================
+# 5. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    for variant in ['basic', 'extended']:
+        instance = pesp.build_instance(variant)
+        print("\n" + "=" * 60)
+        print(f"SENSITIVITY: {variant} instance")
+        print("=" * 60)
+        report, answers = run_questions(instance)
+        if report['status'] != 'optimal':
+            print(f"No optimal timetable. Status: {report['status']}")
+        else:
+            print_report(report, answers)
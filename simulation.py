@@ -0,0 +1,222 @@
+"""
+Discrete-Event Microsimulation: play the rolled-out timetable of a day with stochastic running
+and dwell times, headways on the track sections between stations and no early departures
+Trains keep their planned order on every section, so an event time is the maximum of its
+planned time, its train's previous event plus the (disturbed) minimum step and the previous
+train on the section plus the headway. These dependencies form a fixed DAG; its levels are
+computed once per schedule, and each level is one array step over all events of the level
+and all runs of a batch, so the Python work per day no longer grows with the network size
+"""
+
+import math
+import time
+import numpy as np
+import pesp
+import rollout
+
+DEP, ARR = rollout.DEP, rollout.ARR
+
+
+# ============================================================
+# 1. Schedule (planned event times per train, minimum step durations per pattern)
+# ============================================================
+def train_patterns(instance, times):
+    patterns = rollout.trip_patterns(instance, times)
+    minimum = {(a['from'], a['to']): a['l'] for a in instance['activities']
+               if a['type'] in ['driving', 'dwell']}
+    for pattern in patterns:
+        events = [(pattern['line'], pattern['direction'], s, 'dep' if k == DEP else 'arr')
+                  for s, k in zip(pattern['stations'], pattern['kinds'])]
+        pattern['min_steps'] = [minimum[(events[k], events[k + 1])] for k in range(len(events) - 1)]
+    return patterns
+
+
+# Section = directed pair of consecutive stations; shared sections are used by several lines.
+# Events are flat arrays in trip order; train_pred / section_pred point to the previous event
+# of the train and to the same event of the previous train on the section (n_events = none)
+def build_schedule(patterns, T, start_hour=6, end_hour=24):
+    table = rollout.rollout_patterns(patterns, T, start_hour, end_hour)
+    trips, events = table['trips'], table['events']
+
+    section_index = {}
+    section_lines = {}
+    flat_section, flat_step = [], []
+    for p in patterns:
+        previous = -1
+        for k in range(len(p['stations'])):
+            if k < len(p['stations']) - 1 and p['kinds'][k] == DEP:
+                key = (p['stations'][k], p['stations'][k + 1])
+                section_index.setdefault(key, len(section_index))
+                section_lines.setdefault(key, set()).add(p['line'])
+                previous = section_index[key]
+            flat_section.append(previous)  # An arrival belongs to the section it ends
+            flat_step.append(p['min_steps'][k - 1] if k > 0 else 0)
+    lengths = np.array([len(p['stations']) for p in patterns])
+    pattern_start = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    trip = events['trip'].astype(np.int64)
+    n = len(trip)
+    counts = np.bincount(trip, minlength=len(trips['dep']))
+    first_event = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = np.arange(n) - first_event[trip]
+    flat = pattern_start[trips['pattern'][trip]] + position
+    kind = events['kind']
+    section = np.asarray(flat_section)[flat]
+    step = np.asarray(flat_step, dtype=float)[flat]
+    planned = events['time'].astype(float)
+    first = position == 0
+    last = position == counts[trip] - 1
+
+    train_pred = np.where(first, n, np.arange(n) - 1)
+    section_pred = np.full(n, n)
+    deps = np.flatnonzero(kind == DEP)
+    deps = deps[np.lexsort((trip[deps], planned[deps], section[deps]))]
+    same = section[deps[1:]] == section[deps[:-1]]
+    section_pred[deps[1:][same]] = deps[:-1][same]
+    arrs = np.flatnonzero((kind == ARR) & ~first)  # Exit order = entry order (no overtaking)
+    entry_pred = section_pred[arrs - 1]
+    section_pred[arrs] = np.where(entry_pred < n, entry_pred + 1, n)
+
+    # Level = longest dependency chain ending at the event
+    level = np.zeros(n + 1, dtype=np.int64)
+    level[n] = -1
+    while True:
+        new = np.maximum(level[train_pred], level[section_pred]) + 1
+        if np.array_equal(new, level[:n]):
+            break
+        level[:n] = new
+    order = np.argsort(level[:n], kind='stable')
+    levels = np.split(order, np.cumsum(np.bincount(level[:n]))[:-1])
+
+    entries = np.bincount(section[kind == DEP], minlength=len(section_index))
+    return {
+        'T': T,
+        'hours': end_hour - start_hour,
+        'trains': len(counts),
+        'planned': planned,
+        'kind': kind,
+        'step': step,
+        'first': first,
+        'last': last,
+        'train_pred': train_pred,
+        'section_pred': section_pred,
+        'levels': levels,
+        'entries': entries,
+        'sections': sorted(section_index, key=section_index.get),
+        'shared': {section_index[key] for key, lines in section_lines.items() if len(lines) > 1}
+    }
+
+
+# ============================================================
+# 2. Batched Simulation Runs
+# ============================================================
+# Disturbances (minutes): exponential extra running time per section and extra dwell per stop,
+# and with probability origin_prob an exponential departure delay at the origin. Returns one
+# value per run for each measure
+def simulate_batch(schedule, runs, rng, run_mean=0.5, dwell_mean=0.3, origin_prob=0.1, origin_mean=3.0,
+                   headway=3, threshold=3):
+    planned, kind, first = schedule['planned'], schedule['kind'], schedule['first']
+    train_pred, section_pred = schedule['train_pred'], schedule['section_pred']
+    n = len(planned)
+    arrival = kind == ARR
+    dwell = (kind == DEP) & ~first
+
+    extra = np.zeros((runs, n))
+    if run_mean > 0:
+        extra[:, arrival] = rng.exponential(run_mean, (runs, int(arrival.sum())))
+    if dwell_mean > 0:
+        extra[:, dwell] = rng.exponential(dwell_mean, (runs, int(dwell.sum())))
+    step = schedule['step'] + extra
+    base = np.where(kind == DEP, planned, -math.inf) * np.ones((runs, 1))  # No early departures
+    if origin_prob > 0:
+        origin = np.flatnonzero(first)
+        delayed = rng.random((runs, len(origin))) < origin_prob
+        base[:, origin] += delayed * rng.exponential(origin_mean, (runs, len(origin)))
+
+    t = np.full((runs, n + 1), -math.inf)
+    knock_on = np.zeros(runs)
+    for idx in schedule['levels']:
+        ready = np.maximum(base[:, idx], t[:, train_pred[idx]] + step[:, idx])
+        clear = t[:, section_pred[idx]] + headway  # Section blocked by the previous train
+        t[:, idx] = np.maximum(ready, clear)
+        knock_on += np.maximum(clear - ready, 0).sum(axis=1)
+
+    delay = t[:, :n][:, arrival] - planned[arrival]
+    final = t[:, :n][:, schedule['last']] - planned[schedule['last']]
+    return {
+        'punctuality': (delay <= threshold).mean(axis=1),
+        'mean_delay': np.maximum(delay, 0).mean(axis=1),
+        'final_punctuality': (final <= threshold).mean(axis=1),
+        'max_delay': final.max(axis=1),
+        'knock_on': knock_on
+    }
+
+
+def throughput(schedule):
+    return {schedule['sections'][s]: schedule['entries'][s] / schedule['hours'] for s in schedule['shared']}
+
+
+def simulate(schedule, seed=None, **params):
+    values = simulate_batch(schedule, 1, np.random.default_rng(seed), **params)
+    result = {key: float(v[0]) for key, v in values.items()}
+    result.update(trains=schedule['trains'], throughput=throughput(schedule))
+    return result
+
+
+# ============================================================
+# 3. Batch Runs
+# ============================================================
+# Runs are simulated together in batches of at most max_cells (runs x events) array entries
+def simulate_many(schedule, runs=100, seed=0, max_cells=4000000, **params):
+    start = time.time()
+    rng = np.random.default_rng(seed)
+    batch = max(1, max_cells // (len(schedule['planned']) + 1))
+    parts = [simulate_batch(schedule, min(batch, runs - r), rng, **params) for r in range(0, runs, batch)]
+    values = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    runtime = time.time() - start
+
+    def stats(v):
+        return {'mean': v.mean(), 'p5': np.percentile(v, 5), 'p95': np.percentile(v, 95)}
+
+    return {
+        'runs': runs,
+        'punctuality': stats(values['punctuality']),
+        'final_punctuality': stats(values['final_punctuality']),
+        'mean_delay': stats(values['mean_delay']),
+        'knock_on': stats(values['knock_on']),
+        'throughput': throughput(schedule),
+        'runtime': runtime,
+        'runs_per_second': runs / runtime if runtime > 0 else math.inf
+    }
+
+
+def print_summary(title, summary, max_sections=12):
+    print("\n" + "=" * 60)
+    print(f"SIMULATION: {title}")
+    print("=" * 60)
+    print(f"{summary['runs']} runs in {summary['runtime']:.3f} s ({summary['runs_per_second']:.1f} runs/s)")
+    for key in ['punctuality', 'final_punctuality', 'mean_delay', 'knock_on']:
+        s = summary[key]
+        print(f"  {key:<18} mean {s['mean']:8.3f}   p5 {s['p5']:8.3f}   p95 {s['p95']:8.3f}")
+    busiest = sorted(summary['throughput'].items(), key=lambda z: (-z[1], z[0]))[:max_sections]
+    for (a, b), value in busiest:
+        print(f"  Shared section {a}-{b}: {value:.1f} trains/hour")
+
+
+# ============================================================
+# 4. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    for variant in ['basic', 'extended']:
+        instance = pesp.build_instance(variant)
+        result = pesp.solve(instance)
+        if result['times'] is None:
+            print(f"{variant}: no timetable. Status: {result['status']}")
+            continue
+        patterns = train_patterns(instance, result['times'])
+        schedule = build_schedule(patterns, instance['T'])
+        print_summary(f"{variant} timetable, full day", simulate_many(schedule, runs=200))
+
+        # Large network: 50 disjoint copies of the corridor
+        copies = [dict(p, stations=[f"{s}_{c}" for s in p['stations']]) for c in range(50) for p in patterns]
+        print_summary(f"{variant} x50 corridors", simulate_many(build_schedule(copies, instance['T']), runs=50))
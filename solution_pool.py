@@ -0,0 +1,172 @@
+"""
+K-Best Timetables: enumerate optimal and near-optimal PESP solutions with the Gurobi solution pool
+Pool solutions are read into one (solutions x events) integer array, normalized against the
+shift of every connected component of the activity graph (times relative to one reference event
+per component), deduplicated and filtered for diversity with a periodic distance on the pi vectors
+"""
+
+import time
+import numpy as np
+import pesp
+
+
+# ============================================================
+# 1. Pool Search
+# ============================================================
+# pool_gap: relative gap to the optimum for near-optimal timetables; the pool is oversampled
+# because solutions that differ only in p (pi = 0 vs pi = T) or by a shift collapse later
+def solve_pool(instance, k=10, pool_gap=0.0, oversample=5, time_limit=None):
+    model, pi, x, p = pesp.build_model(instance, name="PESP_Pool")
+    model.setParam('PoolSearchMode', 2)
+    model.setParam('PoolSolutions', k * oversample)
+    model.setParam('PoolGap', pool_gap)
+    if time_limit is not None:
+        model.setParam('TimeLimit', time_limit)
+    model.optimize()
+
+    events = instance['events']
+    variables = [pi[e] for e in events]
+    n = model.SolCount
+    times = np.empty((n, len(events)), dtype=np.int16)
+    objective = np.empty(n)
+    for s in range(n):
+        model.setParam('SolutionNumber', s)
+        times[s] = np.rint(model.getAttr('Xn', variables)).astype(np.int64) % instance['T']
+        objective[s] = model.PoolObjVal
+    return events, times, objective, model.status
+
+
+# ============================================================
+# 2. Shift Normalization and Deduplication
+# ============================================================
+# Every connected component of the activity graph (e.g. the South and North trains when no
+# activity links them) can be shifted on its own. Reference per event: the component's fixed
+# event if it has one (that shift is already pinned), otherwise its first event
+def component_references(instance):
+    idx = instance['event_idx']
+    parent = list(range(len(instance['events'])))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a in instance['activities']:
+        parent[find(idx[a['from']])] = find(idx[a['to']])
+    ref = {}
+    for e in instance['fixed']:
+        ref.setdefault(find(idx[e]), idx[e])
+    for i in range(len(parent)):
+        ref.setdefault(find(i), i)
+    return np.array([ref[find(i)] for i in range(len(parent))])
+
+
+def normalize(times, refs, T):
+    return (times - times[:, refs]) % T
+
+
+def deduplicate(times, objective, refs, T):
+    order = np.argsort(objective, kind='stable')
+    canonical = normalize(times[order], refs, T)
+    _, first = np.unique(canonical, axis=0, return_index=True)
+    keep = order[np.sort(first)]
+    return keep
+
+
+# ============================================================
+# 3. Diversity Filter
+# ============================================================
+# Periodic distance between timetables: sum over events of the circular difference ('l1')
+# or the number of events at a different time ('hamming')
+def distances(candidate, selected, T, metric='l1'):
+    d = np.abs(selected.astype(np.int32) - candidate.astype(np.int32))
+    if metric == 'hamming':
+        return (d != 0).sum(axis=1)
+    return np.minimum(d, T - d).sum(axis=1)
+
+
+def distance_matrix(times, T, metric='l1'):
+    d = np.abs(times[:, None, :].astype(np.int32) - times[None, :, :].astype(np.int32))
+    if metric == 'hamming':
+        return (d != 0).sum(axis=2)
+    return np.minimum(d, T - d).sum(axis=2)
+
+
+# Greedy in objective order: accept a timetable if it is far enough from all accepted ones
+def diverse_subset(times, order, k, T, min_distance=1, metric='l1'):
+    selected = []
+    for s in order:
+        if selected and distances(times[s], times[selected], T, metric).min() < min_distance:
+            continue
+        selected.append(s)
+        if len(selected) == k:
+            break
+    return selected
+
+
+# ============================================================
+# 4. Pool Interface
+# ============================================================
+def k_best(instance, k=10, pool_gap=0.0, min_distance=1, metric='l1', oversample=5, time_limit=None):
+    start = time.time()
+    T = instance['T']
+    events, times, objective, status = solve_pool(instance, k, pool_gap, oversample, time_limit)
+    refs = component_references(instance)
+    keep = deduplicate(times, objective, refs, T) if len(times) else []
+    selected = diverse_subset(normalize(times, refs, T), keep, k, T, min_distance, metric)
+    return {
+        'events': events,
+        'times': times[selected],
+        'canonical': normalize(times[selected], refs, T),
+        'objective': objective[selected],
+        'status': status,
+        'pool_size': len(times),
+        'distinct': len(keep),
+        'components': len(set(refs)),
+        'runtime': time.time() - start
+    }
+
+
+# Pairs of timetables that are the same up to a shift of each component (should be none)
+def shift_duplicates(times, refs, T):
+    canonical = normalize(times, refs, T)
+    _, counts = np.unique(canonical, axis=0, return_counts=True)
+    return int((counts * (counts - 1) // 2).sum())
+
+
+def pool_times(pool, s):
+    return {e: int(t) for e, t in zip(pool['events'], pool['times'][s])}
+
+
+# Events whose time differs between the best and the s-th timetable (after component shifts)
+def differences(pool, s, T):
+    canonical = pool['canonical']
+    d = distances(canonical[s], canonical[:1], T)[0]
+    changed = np.nonzero(canonical[s] != canonical[0])[0]
+    return d, [(pool['events'][i], int(pool['times'][0][i]), int(pool['times'][s][i])) for i in changed]
+
+
+# ============================================================
+# 5. Run on the A2 Instances
+# ============================================================
+if __name__ == "__main__":
+    for variant in ['basic', 'extended']:
+        instance = pesp.build_instance(variant)
+        pool = k_best(instance, k=10, pool_gap=0.05, min_distance=4)
+        print("\n" + "=" * 60)
+        print(f"K-BEST TIMETABLES: {variant} instance")
+        print("=" * 60)
+        duplicates = shift_duplicates(pool['times'], component_references(instance), instance['T'])
+        print(f"Pool: {pool['pool_size']} solutions, {pool['distinct']} distinct up to shifts of "
+              f"{pool['components']} components, {len(pool['objective'])} diverse ({pool['runtime']:.3f} s), "
+              f"{duplicates} shifted duplicates")
+        if len(pool['objective']) == 0:
+            print(f"No timetables. Status: {pool['status']}")
+            continue
+        print(f"Array: {pool['times'].shape} {pool['times'].dtype}, {pool['times'].nbytes} bytes")
+        for s, obj in enumerate(pool['objective']):
+            d, changed = differences(pool, s, instance['T'])
+            print(f"  #{s + 1}: objective {obj:.0f}, distance to best {d}, {len(changed)} events changed")
+        print("\nPairwise distances:")
+        print(distance_matrix(pool['canonical'], instance['T']))
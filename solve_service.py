@@ -0,0 +1,316 @@
+"""
+Local Solve Service: long-running asyncio HTTP server (TCP or Unix socket) with warm models
+Instances are parsed once; every worker keeps its own built PESP / rolling stock models and
+only applies the job's what-if changes before re-solving, so a request costs the solve time
+
+Start:   python solve_service.py --port 8765 --workers 2
+Request: python solve_service.py --request '{"kind": "timetable", "variant": "basic"}'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from gurobipy import Env, GRB
+import pesp
+import pesp_diagnosis
+import rolling_stock as rs
+import rolling_stock_sweep as sweep
+
+MAX_BODY = 1 << 20  # 1 MB request limit
+
+
+# ============================================================
+# 1. Warm Models (one cache and Gurobi environment per worker, nothing shared between threads)
+# ============================================================
+def load_data():
+    travel_time = pesp.read_travel_times()
+    return {
+        'instances': {v: pesp.build_instance(v, travel_time) for v in ['basic', 'extended']},
+        'seat_demand': rs.read_seat_demand()
+    }
+
+
+def worker_env(cache):
+    if 'env' not in cache:
+        env = Env(empty=True)
+        env.setParam('OutputFlag', 0)
+        env.start()
+        cache['env'] = env
+    return cache['env']
+
+
+def warm_timetable_model(cache, data, variant):
+    if ('timetable', variant) not in cache:
+        instance = data['instances'][variant]
+        model, pi, x, p = pesp.build_model(instance, name=f"PESP_{variant}", env=worker_env(cache))
+        cache[('timetable', variant)] = {'instance': instance, 'model': model, 'pi': pi, 'x': x}
+    return cache[('timetable', variant)]
+
+
+def warm_rolling_stock_model(cache, data):
+    if ('rolling_stock',) not in cache:
+        trains, train_info = rs.create_trains(rs.cross_section, data['seat_demand'])
+        model, N, tot, balance, seats = sweep.build_sweep_model(trains, train_info, env=worker_env(cache))
+        cache[('rolling_stock',)] = {'train_info': train_info, 'model': model, 'N': N,
+                                     'tot': tot, 'balance': balance, 'seats': seats}
+    return cache[('rolling_stock',)]
+
+
+# ============================================================
+# 2. Jobs
+# ============================================================
+# overrides: [{'activity': i, 'l': ..., 'u': ...}] applied to the warm model and undone afterwards
+def run_timetable(cache, data, job):
+    warm = warm_timetable_model(cache, data, job.get('variant', 'basic'))
+    model, x, activities = warm['model'], warm['x'], warm['instance']['activities']
+    model.setParam('TimeLimit', job.get('time_limit', GRB.INFINITY))
+
+    changed = set()
+    try:
+        for o in job.get('overrides', []):
+            i = o['activity']
+            changed.add(i)
+            x[i].LB = o.get('l', activities[i]['l'])
+            x[i].UB = o.get('u', activities[i]['u'])
+        model.optimize()
+        result = {'status': model.status, 'objective': None, 'timetable': None}
+        if model.SolCount > 0:
+            times = pesp.event_times(warm['pi'], warm['instance']['T'])
+            result['objective'] = model.objVal
+            result['timetable'] = [list(e) + [t] for e, t in times.items()]
+    finally:
+        # Restore from the instance: attribute reads before update() return stale values
+        for i in changed:
+            x[i].LB = activities[i]['l']
+            x[i].UB = activities[i]['u']
+        model.update()
+    return result
+
+
+def run_rolling_stock(cache, data, job):
+    warm = warm_rolling_stock_model(cache, data)
+    sweep.set_ratio(warm['model'], warm['tot'], warm['balance'], job.get('balance', 1.25))
+    sweep.set_demand_scale(warm['seats'], warm['train_info'], job.get('demand_scale', 1.0))
+    warm['model'].setParam('TimeLimit', job.get('time_limit', GRB.INFINITY))
+    warm['model'].optimize()
+    result = {'status': warm['model'].status, 'cost': None}
+    if warm['model'].SolCount > 0:
+        result['cost'] = warm['model'].objVal
+        result['PL3'] = warm['tot']['PL3'].X
+        result['PL4'] = warm['tot']['PL4'].X
+    return result
+
+
+def run_diagnose(cache, data, job):
+    instance = data['instances'][job.get('variant', 'basic')]
+    activities = [dict(a) for a in instance['activities']]
+    for o in job.get('overrides', []):
+        activities[o['activity']].update({k: o[k] for k in ['l', 'u'] if k in o})
+    check = pesp_diagnosis.quick_check(instance['events'], activities, instance['T'], instance['fixed'])
+    check.pop('potentials', None)
+    check['fixed_conflict'] = [list(e) for e in check['fixed_conflict']]
+    return check
+
+
+JOBS = {
+    'timetable': run_timetable,
+    'rolling_stock': run_rolling_stock,
+    'diagnose': run_diagnose
+}
+
+
+# Error message for a job the workers cannot run, None if it is valid
+def job_error(data, job):
+    if job['kind'] == 'rolling_stock':
+        return None
+    variant = job.get('variant', 'basic')
+    if variant not in data['instances']:
+        return f"Unknown variant: {variant!r}, use one of {sorted(data['instances'])}"
+    activities = data['instances'][variant]['activities']
+    overrides = job.get('overrides', [])
+    if not isinstance(overrides, list):
+        return "overrides must be a list"
+    for o in overrides:
+        if not isinstance(o, dict):
+            return f"Override must be a JSON object, got {type(o).__name__}"
+        i = o.get('activity')
+        if not isinstance(i, int) or isinstance(i, bool) or not 0 <= i < len(activities):
+            return f"Override activity must be an index in 0..{len(activities) - 1}, got {i!r}"
+        bounds = {k: o.get(k, activities[i][k]) for k in ['l', 'u']}
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in bounds.values()):
+            return f"Override bounds of activity {i} must be numbers"
+        if bounds['l'] > bounds['u']:
+            return f"Override of activity {i}: l = {bounds['l']} > u = {bounds['u']}"
+    return None
+
+
+# ============================================================
+# 3. Service
+# ============================================================
+class SolveService:
+    def __init__(self, workers=2, queue_size=32):
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.caches = [{} for _ in range(workers)]
+        self.data = None
+        self.stats = {'done': 0, 'failed': 0, 'rejected': 0, 'solve_time': 0.0}
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        start = time.time()
+        self.data = await loop.run_in_executor(self.executor, load_data)
+        print(f"Data loaded in {time.time() - start:.3f} s")
+        self.tasks = [asyncio.create_task(self.worker(k)) for k in range(self.workers)]
+
+    async def worker(self, k):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, future, queued_at = await self.queue.get()
+            started = time.time()
+            try:
+                result = await loop.run_in_executor(self.executor, JOBS[job['kind']],
+                                                    self.caches[k], self.data, job)
+                self.stats['done'] += 1
+                ok = True
+            except Exception as exc:
+                result = {'error': str(exc)}
+                self.stats['failed'] += 1
+                ok = False
+            finished = time.time()
+            self.stats['solve_time'] += finished - started
+            result['timing'] = {'queue_wait': started - queued_at, 'solve': finished - started,
+                                'worker': k}
+            if not future.cancelled():
+                future.set_result((200 if ok else 500, result))
+            self.queue.task_done()
+
+    async def submit(self, job):
+        if not isinstance(job, dict):
+            return 400, {'error': f"Job must be a JSON object, got {type(job).__name__}"}
+        if job.get('kind') not in JOBS:
+            return 400, {'error': f"Unknown job kind: {job.get('kind')}", 'kinds': list(JOBS)}
+        error = job_error(self.data, job)
+        if error is not None:
+            return 400, {'error': error}
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((job, future, time.time()))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return 503, {'error': 'Queue full'}
+        return await future
+
+    def status(self):
+        return {'queued': self.queue.qsize(), 'workers': self.workers, 'stats': self.stats}
+
+    # Minimal HTTP/1.1: POST /solve with a JSON job, GET /status
+    async def handle(self, reader, writer):
+        received = time.time()
+        try:
+            request_line = (await reader.readline()).decode().split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            body = b''
+            content_length = int(headers.get('content-length', 0))
+            if content_length > MAX_BODY:
+                code, result = 413, {'error': 'Request too large'}
+            else:
+                if content_length:
+                    try:
+                        body = await reader.readexactly(content_length)
+                    except asyncio.IncompleteReadError:
+                        writer.close()  # Client left mid-body: nobody to answer
+                        return
+                if request_line[:2] == ['GET', '/status']:
+                    code, result = 200, self.status()
+                elif request_line[:2] == ['POST', '/solve']:
+                    code, result = await self.submit(json.loads(body or b'{}'))
+                else:
+                    code, result = 404, {'error': 'Use POST /solve or GET /status'}
+        except (ValueError, IndexError) as exc:
+            code, result = 400, {'error': f"Bad request: {exc}"}
+
+        result.setdefault('timing', {})['total'] = time.time() - received
+        payload = json.dumps(result).encode()
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+                  500: 'Internal Server Error', 503: 'Service Unavailable'}[code]
+        writer.write(f"HTTP/1.1 {code} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=8765, unix_socket=None, workers=2, queue_size=32):
+    service = SolveService(workers, queue_size)
+    await service.start()
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle, path=unix_socket)
+        print(f"Serving on {unix_socket}")
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+        print(f"Serving on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+# ============================================================
+# 4. Local Client
+# ============================================================
+def request(job=None, host='127.0.0.1', port=8765, unix_socket=None, timeout=None):
+    if unix_socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(unix_socket)
+    else:
+        sock = socket.create_connection((host, port), timeout=timeout)
+
+    start = time.time()
+    if job is None:
+        message = b"GET /status HTTP/1.1\r\nHost: localhost\r\n\r\n"
+    else:
+        body = json.dumps(job).encode()
+        message = (f"POST /solve HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                   f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+    with sock:
+        sock.sendall(message)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    response = b''.join(chunks)
+    head, _, payload = response.partition(b'\r\n\r\n')
+    result = json.loads(payload)
+    result.setdefault('timing', {})['round_trip'] = time.time() - start
+    result['http_status'] = int(head.split()[1])
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local PESP / rolling stock solve service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', default=None)
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--queue', type=int, default=32)
+    parser.add_argument('--request', default=None,
+                        help="send a JSON job to a running service ('status' for the queue status)")
+    args = parser.parse_args()
+
+    if args.request is not None:
+        job = None if args.request == 'status' else json.loads(args.request)
+        print(json.dumps(request(job, args.host, args.port, args.unix_socket), indent=2))
+    else:
+        asyncio.run(serve(args.host, args.port, args.unix_socket, args.workers, args.queue))